@@ -1,91 +1,158 @@
-import spacy
+import json
+import os
+import platform
+import statistics
+import subprocess
 import time
-import matplotlib.pyplot as plt
-import re
-
-nlp = spacy.load('en_core_web_sm')
-
-pos_tag_translations = {
-    'ADJ': 'adjective',
-    'ADP': 'adposition',
-    'ADV': 'adverb',
-    'AUX': 'auxiliary',
-    'CCONJ': 'coordinating conjunction',
-    'DET': 'determiner',
-    'INTJ': 'interjection',
-    'NOUN': 'noun',
-    'NUM': 'numeral',
-    'PART': 'particle',
-    'PRON': 'pronoun',
-    'PROPN': 'proper noun',
-    'PUNCT': 'punctuation',
-    'SCONJ': 'subordinating conjunction',
-    'SYM': 'symbol',
-    'VERB': 'verb',
-    'X': 'other',
-}
-
-
-def get_morphological_info(word):
-    doc = nlp(word)
-    for token in doc:
-        morphological_info = {
-            'text': token.text,
-            'lemma': token.lemma_,
-            'pos': pos_tag_translations[token.pos_],
-        }
-        return morphological_info
-    return None
-
-
-def analyze_file(filepath):
-    text_lengths = []
-    processing_times = []
-    word_counts = [i for i in range(100, 2000, 100)]
-    for word_count in word_counts:
-
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                text = f.read().lower()
-                text = re.sub(r'{\\.*?}', '', text)
-                text = re.sub(r'\\[a-z]+(?:-?\d+)? ?', '', text)
-
-                text = re.sub(r'\s+', ' ', text).strip()
-            tokens = text.split()[:word_count]
-        except Exception as e:
-            print(f"Error reading file: {e}")
-            return None, None
-
-        start_time = time.time()
-        for word in tokens:
-            word = word.strip(".").strip(",").strip('"').strip("'").strip("`").strip(":").strip("?").strip("!").strip(
-                '(').strip(')').strip('[').strip(']').strip('{').strip('}').strip('@').strip('#').strip('№').strip(
-                '$').strip(';').strip('<').strip('>').strip('/').strip('*').strip('%').strip('^').strip('&').strip('*')
-            get_morphological_info(word)
-
-        end_time = time.time()
-        processing_time = end_time - start_time
-
-        text_lengths.append(word_count)
-        processing_times.append(processing_time)
-        print(f"File: {filepath}, Word Count: {word_count}, Time: {processing_time}")
-
-    return text_lengths, processing_times
-
-
-filepath_txt = 'example.txt'
-filepath_rtf = 'example.rtf'
-
-text_lengths_txt, processing_times_txt = analyze_file(filepath_txt)
-text_lengths_rtf, processing_times_rtf = analyze_file(filepath_rtf)
-
-if text_lengths_txt and processing_times_txt:
-    plt.plot(text_lengths_txt, processing_times_txt, label='TXT File')
-if text_lengths_rtf and processing_times_rtf:
-    plt.plot(text_lengths_rtf, processing_times_rtf, label='RTF File')
-
-plt.xlabel('Number of words')
-plt.ylabel('Processing time (с)')
-plt.title('Text Word Count vs Processing Time')
-plt.legend()
-plt.show()
+from datetime import datetime
+
+from striprtf.striprtf import rtf_to_text
+
+try:
+    import matplotlib.pyplot as plt
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+    print("Warning: matplotlib not found, plots will not be generated.")
+
+# The same analysis functions and spaCy pipeline as the application
+from main import BATCH_SIZE, NLP_PROFILE, get_morphological_info, get_morphological_info_batch, strip_word
+
+# --- Benchmark Configuration ---
+FILES = ['example.txt', 'example.rtf']
+WORD_COUNTS = [100, 250, 500, 1000, 2000]
+WARMUP_RUNS = 1            # Untimed runs before the measured trials
+TRIALS = 5                 # Measured runs per (file, stage, word count)
+RESULTS_PATH = "benchmark_results.json"
+SHOW_PLOT = True
+# ---
+
+
+def load_stage(filepath):
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def normalize_stage(raw, filepath):
+    """Turns raw file content into the list of words the application would analyze."""
+    text = rtf_to_text(raw) if filepath.endswith(".rtf") else raw
+    tokens = text.replace("\n", " ").lower().split(" ")
+    words = [strip_word(token) for token in tokens if token]
+    return [word for word in words if word]
+
+
+def analyze_per_word(words):
+    for word in words:
+        get_morphological_info(word)
+
+
+def analyze_batched(words):
+    get_morphological_info_batch(words, BATCH_SIZE)
+
+
+def measure(fn, *args):
+    """Runs fn WARMUP_RUNS times untimed, then TRIALS times timed. Returns the durations."""
+    for _ in range(WARMUP_RUNS):
+        fn(*args)
+    durations = []
+    for _ in range(TRIALS):
+        start_time = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - start_time)
+    return durations
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(durations, word_count):
+    """
+    Throughput statistics in words/sec. p95 is computed from the 95th percentile duration,
+    so it describes the slow tail of the trials.
+    """
+    rates = [word_count / d for d in durations if d > 0]
+    return {
+        "words": word_count,
+        "trials": len(durations),
+        "durations": durations,
+        "mean_words_per_sec": statistics.mean(rates) if rates else 0,
+        "median_words_per_sec": statistics.median(rates) if rates else 0,
+        "p95_words_per_sec": word_count / percentile(durations, 95) if durations else 0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_file(filepath):
+    load_durations = measure(load_stage, filepath)
+    raw = load_stage(filepath)
+    normalize_durations = measure(normalize_stage, raw, filepath)
+    words = normalize_stage(raw, filepath)
+
+    result = {
+        "file": filepath,
+        "bytes": os.path.getsize(filepath),
+        "total_words": len(words),
+        "load": summarize(load_durations, len(words)),
+        "normalize": summarize(normalize_durations, len(words)),
+        "analyze": {"per_word": [], "batched": []},
+    }
+
+    for word_count in WORD_COUNTS:
+        if word_count > len(words):
+            break
+        sample = words[:word_count]
+        for mode, fn in (("per_word", analyze_per_word), ("batched", analyze_batched)):
+            stats = summarize(measure(fn, sample), word_count)
+            result["analyze"][mode].append(stats)
+            print(f"{filepath:12} {mode:9} {word_count:5} words: "
+                  f"mean {stats['mean_words_per_sec']:9.1f}, median {stats['median_words_per_sec']:9.1f}, "
+                  f"p95 {stats['p95_words_per_sec']:9.1f} words/sec")
+    return result
+
+
+def plot_results(results):
+    for result in results:
+        for mode, stats in result["analyze"].items():
+            plt.plot([s["words"] for s in stats], [s["median_words_per_sec"] for s in stats],
+                     marker='o', label=f"{result['file']} ({mode})")
+    plt.xlabel('Number of words')
+    plt.ylabel('Median throughput (words/sec)')
+    plt.title('Per-word vs batched analysis')
+    plt.legend()
+    plt.show()
+
+
+if __name__ == "__main__":
+    results = []
+    for filepath in FILES:
+        if not os.path.exists(filepath):
+            print(f"Skipping missing file: {filepath}")
+            continue
+        results.append(benchmark_file(filepath))
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "nlp_profile": NLP_PROFILE,
+        "batch_size": BATCH_SIZE,
+        "warmup_runs": WARMUP_RUNS,
+        "trials": TRIALS,
+        "results": results,
+    }
+    with open(RESULTS_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {RESULTS_PATH}")
+
+    if SHOW_PLOT and MATPLOTLIB_AVAILABLE and results:
+        plot_results(results)
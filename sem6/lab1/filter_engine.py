@@ -0,0 +1,155 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+NGRAM_SIZE = 3
+
+# Text fields of a row that can be filtered by substring: word, lexeme (lemma) and morphologic info
+FIELDS = ("word", "lemma", "info")
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def all_ngrams(text):
+    grams = set()
+    for n in range(1, NGRAM_SIZE + 1):
+        grams |= ngrams(text, n)
+    return grams
+
+
+class FilterEngine:
+    """
+    Index over the word table used by the filter entries.
+    Substring filters go through a character n-gram index per field, the occurrence range
+    goes through a sorted (occurrences, word) array, and a query that only extends the
+    previous one narrows the previous result instead of searching the whole database.
+    """
+
+    def __init__(self):
+        self.texts = {}
+        self.occurrences = {}
+        self.index = {field: defaultdict(set) for field in FIELDS}
+        self.sorted_occurrences = []
+        self.last_query = None
+        self.last_result = None
+
+    def build(self, db, cache):
+        self.__init__()
+        for word, value in db.items():
+            lemma, info_str = cache.get(word, value[1])
+            self._add(word, value[0], lemma, info_str)
+
+    def update(self, word, occurrences, lemma, info_str):
+        """Adds a word or replaces its indexed values after an analysis or an edit."""
+        if word in self.texts:
+            self._remove(word)
+        self._add(word, occurrences, lemma, info_str)
+        self.last_query = None
+
+    def update_occurrences(self, word, occurrences):
+        old = self.occurrences[word]
+        if old == occurrences:
+            return
+        self.sorted_occurrences.pop(bisect_left(self.sorted_occurrences, (old, word)))
+        insort(self.sorted_occurrences, (occurrences, word))
+        self.occurrences[word] = occurrences
+        self.last_query = None
+
+    def remove(self, word):
+        if word in self.texts:
+            self._remove(word)
+        self.last_query = None
+
+    def filter(self, word_filter="", lexeme_filter="", info_filter="", low_occ=None, high_occ=None):
+        """Returns the set of words matching all non-empty filters."""
+        query = (word_filter, lexeme_filter, info_filter, low_occ, high_occ)
+        if self.last_query is not None and self._narrows(self.last_query, query):
+            candidates = self.last_result
+        else:
+            candidates = self._candidates(query)
+
+        result = set()
+        for word in candidates:
+            if self._matches(word, query):
+                result.add(word)
+
+        self.last_query = query
+        self.last_result = result
+        return result
+
+    def _add(self, word, occurrences, lemma, info_str):
+        texts = (word, lemma or "", info_str or "")
+        self.texts[word] = texts
+        self.occurrences[word] = occurrences
+        for field, text in zip(FIELDS, texts):
+            for gram in all_ngrams(text):
+                self.index[field][gram].add(word)
+        insort(self.sorted_occurrences, (occurrences, word))
+
+    def _remove(self, word):
+        for field, text in zip(FIELDS, self.texts.pop(word)):
+            postings = self.index[field]
+            for gram in all_ngrams(text):
+                postings[gram].discard(word)
+                if not postings[gram]:
+                    del postings[gram]
+        occurrences = self.occurrences.pop(word)
+        self.sorted_occurrences.pop(bisect_left(self.sorted_occurrences, (occurrences, word)))
+
+    def _candidates(self, query):
+        """Intersects the smallest posting lists that can contain the answer."""
+        sets = []
+        for field, text in zip(FIELDS, query[:3]):
+            if not text:
+                continue
+            postings = self.index[field]
+            grams = ngrams(text, min(len(text), NGRAM_SIZE))
+            for gram in grams:
+                sets.append(postings.get(gram, set()))
+
+        low_occ, high_occ = query[3], query[4]
+        if low_occ is not None or high_occ is not None:
+            start = 0 if low_occ is None else bisect_left(self.sorted_occurrences, (low_occ,))
+            end = len(self.sorted_occurrences) if high_occ is None \
+                else bisect_left(self.sorted_occurrences, (high_occ + 1,))
+            sets.append({word for _, word in self.sorted_occurrences[start:end]})
+
+        if not sets:
+            return self.texts.keys()
+        sets.sort(key=len)
+        candidates = set(sets[0])
+        for postings in sets[1:]:
+            if not candidates:
+                break
+            candidates &= postings
+        return candidates
+
+    def _matches(self, word, query):
+        texts = self.texts.get(word)
+        if texts is None:
+            return False
+        for text, text_filter in zip(texts, query[:3]):
+            if text_filter not in text:
+                return False
+        occurrences = self.occurrences[word]
+        low_occ, high_occ = query[3], query[4]
+        if low_occ is not None and occurrences < low_occ:
+            return False
+        if high_occ is not None and occurrences > high_occ:
+            return False
+        return True
+
+    @staticmethod
+    def _narrows(previous, query):
+        """True if every row matching query also matched the previous query."""
+        for old, new in zip(previous[:3], query[:3]):
+            if old not in new:
+                return False
+        old_low, old_high = previous[3], previous[4]
+        new_low, new_high = query[3], query[4]
+        if old_low is not None and (new_low is None or new_low < old_low):
+            return False
+        if old_high is not None and (new_high is None or new_high > old_high):
+            return False
+        return True
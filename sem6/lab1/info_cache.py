@@ -0,0 +1,68 @@
+import json
+import os
+from collections import OrderedDict
+
+MAX_CACHE_SIZE = 100000
+
+
+class InfoCache:
+    """
+    LRU cache of (lemma, formatted morphological info) for the words of the database.
+    Both come from the stored morphological info, so filtering and repainting the table never call spaCy.
+    """
+
+    def __init__(self, format_fn, path=None, max_size=MAX_CACHE_SIZE):
+        self.format_fn = format_fn
+        self.path = path
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def load(self, db=None):
+        """
+        Loads cached entries from disk, dropping words that are no longer in the database and entries
+        that no longer match their stored info: the cache is saved only on exit, edits are journaled at once.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                raw = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not load cache {self.path}: {e}")
+            return
+        for word, (lemma, info_str) in raw.items():
+            if db is None:
+                self.entries[word] = (lemma, info_str)
+            elif word in db:
+                info = db[word][1]
+                if lemma == info['lemma'] and info_str == self.format_fn(info):
+                    self.entries[word] = (lemma, info_str)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump({word: list(entry) for word, entry in self.entries.items()}, file, ensure_ascii=False)
+
+    def get(self, word, info):
+        """Returns (lemma, formatted info) for the word, computing and storing it on a miss."""
+        entry = self.entries.get(word)
+        if entry is not None:
+            self.entries.move_to_end(word)
+            return entry
+        entry = (info['lemma'], self.format_fn(info))
+        self.entries[word] = entry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def put(self, word, lemma, info_str):
+        self.entries[word] = (lemma, info_str)
+        self.entries.move_to_end(word)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, word):
+        self.entries.pop(word, None)
@@ -0,0 +1,146 @@
+import codecs
+import io
+import os
+import re
+import sys
+import tempfile
+from collections import Counter
+from striprtf.striprtf import rtf_to_text
+
+CHUNK_SIZE = 1 << 20  # bytes read from the file at once
+CHECK_CHUNK_SIZES = [1, 2, 3, 7, 64, 4096]  # Chunk sizes compared against reading the whole file
+
+# Escaped characters and control symbols (\x) or group braces, enough to track RTF group depth
+RTF_EVENT_PATTERN = re.compile(r"\\.|[{}]", re.S)
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, encoding="utf-8"):
+    """
+    Yields (decoded text, bytes consumed so far) for a file read in fixed-size binary chunks.
+    CRLF and CR line endings are translated to LF as in text mode, also when a CRLF is cut by a chunk boundary.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(errors="replace"), translate=True)
+    consumed = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            consumed += len(data)
+            if not data:
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield tail, consumed
+                return
+            yield decoder.decode(data), consumed
+
+
+def find_rtf_cut(buffer, depth):
+    """
+    Finds the last position in buffer where the RTF can be split: either right after a group
+    closes back to the document level, or after whitespace at the document level.
+    Returns (position, depth at position, depth at the end of buffer); position 0 means no cut.
+    """
+    cut, cut_depth = 0, depth
+    region_start = 0
+    for match in RTF_EVENT_PATTERN.finditer(buffer):
+        if depth == 1:
+            ws = max(buffer.rfind(" ", region_start, match.start()), buffer.rfind("\n", region_start, match.start()))
+            if ws != -1:
+                cut, cut_depth = ws + 1, 1
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 1:
+                cut, cut_depth = match.end(), 1
+        region_start = match.end()
+    if depth == 1:
+        ws = max(buffer.rfind(" ", region_start), buffer.rfind("\n", region_start))
+        if ws != -1:
+            cut, cut_depth = ws + 1, 1
+    return cut, cut_depth, depth
+
+
+def iter_rtf_text(path, chunk_size=CHUNK_SIZE):
+    """
+    Converts an RTF file to plain text piece by piece. The file is split only at the document
+    level, and every piece is re-wrapped in braces so rtf_to_text sees a balanced group.
+    """
+    buffer = ""
+    depth = 0
+    consumed = 0
+    for chunk, consumed in read_chunks(path, chunk_size):
+        buffer += chunk
+        cut, cut_depth, _ = find_rtf_cut(buffer, depth)
+        if cut:
+            yield rtf_to_text("{" * depth + buffer[:cut] + "}" * cut_depth), consumed
+            buffer = buffer[cut:]
+            depth = cut_depth
+    if buffer.strip():
+        _, _, end_depth = find_rtf_cut(buffer, depth)
+        yield rtf_to_text("{" * depth + buffer + "}" * max(end_depth, 0)), consumed
+
+
+def iter_token_counts(path, chunk_size=CHUNK_SIZE):
+    """
+    Yields (Counter of lowercased space-separated tokens, bytes consumed so far) chunk by chunk.
+    A token cut by a chunk boundary is carried over to the next chunk, so the counts add up
+    to the same result as splitting the whole file at once.
+    """
+    source = iter_rtf_text(path, chunk_size) if path.endswith(".rtf") else read_chunks(path, chunk_size)
+    carry = ""
+    consumed = 0
+    for text, consumed in source:
+        text = carry + text.replace("\n", " ").lower()
+        cut = text.rfind(" ")
+        if cut == -1:
+            carry = text
+            continue
+        carry = text[cut + 1:]
+        counter = Counter(text[:cut].split(" "))
+        counter.pop("", None)
+        yield counter, consumed
+    if carry:
+        yield Counter([carry]), consumed
+
+
+class ChunkBoundaryError(Exception):
+    """Chunked token counts differ from splitting the whole file."""
+
+
+def whole_file_counts(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if path.endswith(".rtf"):
+        text = rtf_to_text(text)
+    counter = Counter(text.replace("\n", " ").lower().split(" "))
+    counter.pop("", None)
+    return counter
+
+
+def check_chunk_boundaries(path, chunk_sizes=CHECK_CHUNK_SIZES):
+    """
+    Checks that iter_token_counts gives the same counts as splitting the whole file, for every
+    chunk size, on the file as is and on a copy with CRLF line endings. Raises ChunkBoundaryError.
+    """
+    expected = whole_file_counts(path)
+    with open(path, "rb") as f:
+        crlf = f.read().replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+    with tempfile.TemporaryDirectory() as directory:
+        crlf_path = os.path.join(directory, "crlf_" + os.path.basename(path))
+        with open(crlf_path, "wb") as f:
+            f.write(crlf)
+        for checked_path in (path, crlf_path):
+            for chunk_size in chunk_sizes:
+                counts = Counter()
+                for counter, _ in iter_token_counts(checked_path, chunk_size):
+                    counts.update(counter)
+                if counts != expected:
+                    raise ChunkBoundaryError(f"{checked_path}: chunk size {chunk_size} gives different token counts")
+
+
+if __name__ == "__main__":
+    # python ingest.py example.txt example.rtf - regression check of the chunked reader
+    for path in sys.argv[1:] or ["example.txt", "example.rtf"]:
+        check_chunk_boundaries(path)
+        print(f"{path}: chunked token counts match the whole file")
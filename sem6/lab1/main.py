@@ -1,16 +1,31 @@
 import re
 import tkinter as tk
-from collections import Counter
 from tkinter import filedialog
 from tkinter import ttk
 import tkinter.messagebox as messagebox
-import spacy
 import os
 import json
+import time
 from idlelib.tooltip import Hovertip
-from striprtf.striprtf import rtf_to_text
-
-nlp = spacy.load('en_core_web_sm')
+from info_cache import InfoCache
+from filter_engine import FilterEngine
+from storage import JournalStorage
+from ingest import CHUNK_SIZE, iter_token_counts
+from nlp_profiles import load_pipeline
+from worker import BackgroundWorker
+
+# Only lemma, POS and morphology are used here, so the parser and NER are not loaded
+NLP_PROFILE = "morph"
+nlp = load_pipeline(NLP_PROFILE)
+
+# Batched analysis feeds all new words through nlp.pipe at once instead of one nlp(word) call per word
+USE_BATCHED_ANALYSIS = True
+BATCH_SIZE = 1000
+
+# UI timings in milliseconds: worker results polling, filter debounce, and rows inserted per table repaint step
+POLL_INTERVAL = 50
+FILTER_DEBOUNCE = 200
+POPULATE_STEP = 500
 
 pos_tag_translations = {
     'ADJ': 'adjective',
@@ -38,17 +53,7 @@ def validate_numeric_input(input):
     return re.match(pattern, input) is not None
 
 
-def get_lemma(word):
-    doc = nlp(word)
-    lemma = None
-    for token in doc:
-        lemma = token.lemma_
-    return lemma
-
-
-def get_morphological_info(word):
-    doc = nlp(word)
-    morphological_info = None
+def morphological_info_from_doc(doc, word):
     for token in doc:
         morphological_info = {
             'lemma': token.lemma_,
@@ -59,15 +64,52 @@ def get_morphological_info(word):
     return {'lemma': word, 'pos': 'unknown', 'morph': None} # Handle unrecognized words
 
 
+def get_morphological_info(word):
+    return morphological_info_from_doc(nlp(word), word)
+
+
+def get_morphological_info_batch(words, batch_size=BATCH_SIZE):
+    """Analyzes a list of words with a single nlp.pipe run, returns {word: morphological_info}."""
+    infos = {}
+    for word, doc in zip(words, nlp.pipe(words, batch_size=batch_size)):
+        infos[word] = morphological_info_from_doc(doc, word)
+    return infos
+
+
+def analyze_words(words, batched=USE_BATCHED_ANALYSIS, batch_size=BATCH_SIZE):
+    """Returns {word: morphological_info}, one spaCy run per word or one nlp.pipe run for all."""
+    docs = nlp.pipe(words, batch_size=batch_size) if batched else (nlp(word) for word in words)
+    return {word: morphological_info_from_doc(doc, word) for word, doc in zip(words, docs)}
+
+
+def strip_word(word):
+    return word.strip(".").strip(",").strip('"').strip("'").strip("`").strip(":").strip("?").strip("!").strip(
+        '(').strip(')').strip('[').strip(']').strip('{').strip('}').strip('@').strip('#').strip('№').strip(
+        '$').strip(';').strip('<').strip('>').strip('/').strip('*').strip('%').strip('^').strip('&').strip('*')
+
+
 def beautiful(data: dict):
     morph_string = ", ".join([f"{k}: {v}" for k, v in data['morph'].items()]) if data['morph'] else "None"
     return f"Lemma: {data['lemma']}, Pos: {data['pos']}, Morph: {morph_string}"
 
 
 class MyApp:
-    def __init__(self, root, db):
+    def __init__(self, root, db, cache=None, storage=None):
         self.db = db
+        self.storage = storage
         self.show = db
+        self.cache = cache if cache is not None else InfoCache(beautiful)
+        self.filter_engine = FilterEngine()
+        self.filter_engine.build(self.db, self.cache)
+
+        # Analysis and filtering run on their own threads; the filter thread is the only one touching filter_engine
+        self.analysis_worker = BackgroundWorker("analysis")
+        self.filter_worker = BackgroundWorker("filter")
+        self.filter_generation = 0
+        self.filter_after_id = None
+        self.populate_after_id = None
+        self.populate_words = []
+        self.analysis_started = None
         self.root = root
         self.columns = ("Word", "Lexeme", "Morphologic Info", "Occurrences")
         self.root.title("Text Analyzer")
@@ -95,6 +137,10 @@ class MyApp:
         Hovertip(self.analyze_button,
                  "Press this button in order to start the process of analyzing the text file specified higher.\nYou will see the results lower in the table.")
 
+        self.progress = ttk.Progressbar(root, orient="horizontal", length=400, mode="determinate", maximum=100)
+        self.progress.pack(pady=5)
+        Hovertip(self.progress, "Shows how much of the selected file has been analyzed.")
+
         container = tk.Frame(root)
         container.pack()
 
@@ -191,10 +237,8 @@ class MyApp:
                 Hovertip(entry, "This field shows morphologic information that you're editing right now.")
             self.edit_entries.append(entry)
 
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
         self.populate_tree()
+        self.root.after(POLL_INTERVAL, self.poll_workers)
 
         if len(self.db) == 0:
             messagebox.showinfo("Your first time", "Congratulations on the first time using our application.\n\
@@ -213,14 +257,62 @@ class MyApp:
 
 
     def populate_tree(self):
+        """Repaints the table from self.show, inserting rows in steps so the window stays responsive."""
+        if self.populate_after_id:
+            self.root.after_cancel(self.populate_after_id)
+            self.populate_after_id = None
+        self.tree.delete(*self.tree.get_children())
+
         # Sort the words alphabetically
-        sorted_words = sorted(self.show.keys())
+        self.populate_words = sorted(self.show.keys())
+        self.populate_step(0)
+
+    def populate_step(self, position):
+        for word in self.populate_words[position:position + POPULATE_STEP]:
+            info = self.show.get(word)
+            if info is None:
+                continue
+            lemma, info_str = self.cache.get(word, info[1])
+            self.tree.insert("", "end", values=(word, lemma, info_str, info[0]))
+
+        position += POPULATE_STEP
+        if position < len(self.populate_words):
+            self.populate_after_id = self.root.after(1, self.populate_step, position)
+        else:
+            self.populate_after_id = None
 
-        for word in sorted_words:
-            info = self.show[word]
-            self.tree.insert("", "end", values=(word, get_lemma(word), beautiful(info[1]), info[0]))
+    def poll_workers(self):
+        handlers = {
+            "filter": self.show_filter_result,
+            "analysis_chunk": self.apply_analysis_chunk,
+            "analysis_done": self.finish_analysis,
+        }
+        for worker in (self.filter_worker, self.analysis_worker):
+            for tag, payload in worker.poll():
+                if tag == "error":
+                    self.show_worker_error(worker, payload)
+                else:
+                    handlers[tag](payload)
+        self.root.after(POLL_INTERVAL, self.poll_workers)
+
+    def show_worker_error(self, worker, error):
+        # Only a failed analysis ends the analysis, a filter error leaves it running
+        if worker is self.analysis_worker:
+            self.finish_analysis()
+        messagebox.showerror("Error", f"Background task failed: {error}")
+
+    def update_filter_engine(self, method, *args):
+        """Queues a filter_engine update on the filter thread, keeping its order with filter requests."""
+        self.filter_worker.submit(lambda emit: getattr(self.filter_engine, method)(*args))
 
     def on_entry_change(self, *args):
+        # Debounce: only the last change within FILTER_DEBOUNCE ms starts filtering
+        if self.filter_after_id:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(FILTER_DEBOUNCE, self.request_filter)
+
+    def request_filter(self):
+        self.filter_after_id = None
         word_filter = self.word_var.get()
         lexeme_filter = self.lexeme_var.get()
         info_filter = self.info_var.get()
@@ -229,27 +321,21 @@ class MyApp:
         high_occ = self.occurences_higher_var.get()
         high_occ = None if high_occ == "" else int(high_occ)
 
-        to_show = {}
-        for key, value in self.db.items():
-            lemma = get_lemma(key)
-            check_word_filter = word_filter in key
-            check_lexeme_filter = lexeme_filter in lemma
-            check_info_filter = info_filter in beautiful(value[1])
-            check_low_occ_filter = True
-            if low_occ is not None:
-                check_low_occ_filter = value[0] >= low_occ
-            check_high_occ_filter = True
-            if high_occ is not None:
-                check_high_occ_filter = value[0] <= high_occ
+        self.filter_generation += 1
+        query = (word_filter, lexeme_filter, info_filter, low_occ, high_occ)
+        self.filter_worker.submit(self.run_filter, self.filter_generation, query)
 
-            if check_word_filter and check_lexeme_filter and check_info_filter and check_low_occ_filter and check_high_occ_filter:
-                to_show[key] = value
-
-        self.show = to_show
-
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    def run_filter(self, emit, generation, query):
+        # Runs on the filter thread; a request superseded by a newer one is dropped
+        if generation != self.filter_generation:
+            return
+        emit("filter", (generation, self.filter_engine.filter(*query)))
 
+    def show_filter_result(self, payload):
+        generation, matched = payload
+        if generation != self.filter_generation:
+            return
+        self.show = {word: self.db[word] for word in matched if word in self.db}
         self.populate_tree()
 
     def edit_selected(self):
@@ -291,6 +377,11 @@ class MyApp:
         answer = messagebox.askyesno("Question", f"Are you sure you want to delete {word}?")
         if answer:
             del self.db[word]
+            self.cache.invalidate(word)
+            self.update_filter_engine("remove", word)
+            if self.storage:
+                self.storage.log_delete(word)
+                self.storage.sync()
             self.show = self.db.copy()
 
             self.tree.delete(selected_item)
@@ -370,11 +461,17 @@ class MyApp:
                 new_morph_info = {'lemma': lemma, 'pos': pos, 'morph': morph}
 
                 self.db[original_word] = [occurrences, new_morph_info]
+                self.cache.invalidate(original_word)
             except Exception as e:
                 messagebox.showerror("Error", f"Error parsing morphological info: {e}")
                 return
 
-            self.tree.item(selected_item, values=(original_word, get_lemma(original_word), new_morph_info_str, occurrences))
+            lemma, info_str = self.cache.get(original_word, new_morph_info)
+            self.update_filter_engine("update", original_word, occurrences, lemma, info_str)
+            if self.storage:
+                self.storage.log_put(original_word, self.db[original_word])
+                self.storage.sync()
+            self.tree.item(selected_item, values=(original_word, lemma, new_morph_info_str, occurrences))
         else:
             messagebox.showinfo("Info", "Word not found in the database.")
 
@@ -395,51 +492,100 @@ class MyApp:
         if not (path.endswith(".txt") or path.endswith(".rtf")):
             messagebox.showerror("Error", "File type not supported.")
             return
+        if self.analysis_started is not None:
+            messagebox.showinfo("Info", "Another file is being analyzed right now.")
+            return
 
-        if path.endswith(".rtf"):
-            with open(path) as f:
-                rtf_content = f.read()
-                text = rtf_to_text(rtf_content).replace("\n", " ").lower()
-        elif path.endswith(".txt"):
-            with open(path) as f:
-                text = f.read().replace("\n", " ").lower()
-        tokens = text.split(" ")
-
-        counter = Counter(tokens)
-        occurrences_map = dict(counter.items())
-
-        if "" in occurrences_map:
-            occurrences_map.pop("")
-
-        for word, occurrences in occurrences_map.items():
-            word = word.strip(".").strip(",").strip('"').strip("'").strip("`").strip(":").strip("?").strip("!").strip(
-                '(').strip(')').strip('[').strip(']').strip('{').strip('}').strip('@').strip('#').strip('№').strip(
-                '$').strip(';').strip('<').strip('>').strip('/').strip('*').strip('%').strip('^').strip('&').strip('*')
+        self.analyze_button["state"] = "disabled"
+        self.progress["value"] = 0
+        self.analysis_started = time.perf_counter()
+        self.analysis_tokens = 0
+        self.analysis_new_words = 0
+        self.analysis_worker.submit(self.run_analysis, path, os.path.getsize(path) or 1, set(self.db))
+
+    def run_analysis(self, emit, path, total_bytes, known_words):
+        """
+        Runs on the analysis thread: reads the file chunk by chunk and analyzes every word
+        that was not in the database yet. The database itself is only updated on the main thread.
+        """
+        # The file is read chunk by chunk, so memory does not depend on the file size
+        for counter, consumed in iter_token_counts(path, CHUNK_SIZE):
+            counts = {}
+            for word, occurrences in counter.items():
+                word = strip_word(word)
+                # Different raw tokens may strip to the same word
+                counts[word] = counts.get(word, 0) + occurrences
+            new_words = [word for word in counts if word not in known_words]
+            known_words.update(new_words)
+            emit("analysis_chunk", (counts, analyze_words(new_words), min(100, consumed * 100 / total_bytes)))
+        emit("analysis_done")
+
+    def apply_analysis_chunk(self, payload):
+        counts, analyzed, progress = payload
+        engine_updates = []
+        for word, occurrences in counts.items():
+            self.analysis_tokens += occurrences
             if word in self.db:
 
                 self.db[word][0] += occurrences
-            else:
-                self.db[word] = [occurrences, get_morphological_info(word)]
+                engine_updates.append(("update_occurrences", word, self.db[word][0]))
+                if self.storage:
+                    self.storage.log_increment(word, occurrences)
+                continue
 
-        self.show = self.db.copy()
-
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+            if word in analyzed:
+                info = analyzed[word]
+            else:
+                # The word was deleted from the table while the file was being analyzed
+                info = get_morphological_info(word)
+            self.db[word] = [occurrences, info]
+            # The cache is filled from the batch results, the same lemma InfoCache.get takes from info
+            info_str = beautiful(info)
+            self.cache.put(word, info['lemma'], info_str)
+            engine_updates.append(("update", word, occurrences, info['lemma'], info_str))
+            if self.storage:
+                self.storage.log_put(word, self.db[word])
+            self.analysis_new_words += 1
+
+        def apply_updates(emit):
+            for method, *args in engine_updates:
+                getattr(self.filter_engine, method)(*args)
+        self.filter_worker.submit(apply_updates)
+
+        self.progress["value"] = progress
+        # Show what has been analyzed so far
+        self.on_entry_change()
+
+    def finish_analysis(self, payload=None):
+        if self.analysis_started is None:
+            return
+        if self.storage:
+            self.storage.sync()
 
-        self.populate_tree()
+        elapsed = time.perf_counter() - self.analysis_started
+        mode = f"batched, batch size {BATCH_SIZE}" if USE_BATCHED_ANALYSIS else "per-word"
+        words_per_sec = self.analysis_tokens / elapsed if elapsed > 0 else 0
+        print(f"Processed {self.analysis_tokens} words ({self.analysis_new_words} new) in {elapsed:.3f} s ({mode}): "
+              f"{words_per_sec:.1f} words/sec")
 
+        self.analysis_started = None
+        self.analyze_button["state"] = "normal"
+        self.progress["value"] = 100
 
 if __name__ == "__main__":
     root = tk.Tk()
     db_path = "lab1/db.json"
+    cache_path = "lab1/cache.json"
+
+    # Changes are journaled to lab1/db.journal as they happen and folded into db.json periodically
+    storage = JournalStorage(db_path)
+    db = storage.load()
 
-    db = {}
-    if os.path.exists(db_path):
-        with open(db_path) as file:
-            db = json.loads(file.read())
+    cache = InfoCache(beautiful, cache_path)
+    cache.load(db)
 
-    app = MyApp(root, db)
+    app = MyApp(root, db, cache, storage)
     root.mainloop()
 
-    with open(db_path, "w") as file:
-        json.dump(app.db, file, indent=2, ensure_ascii=False)
+    storage.close()
+    cache.save()
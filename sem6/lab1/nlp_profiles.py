@@ -0,0 +1,77 @@
+import statistics
+import sys
+import time
+
+import spacy
+
+SPACY_MODEL = 'en_core_web_sm'
+
+# Pipeline components left out for every profile:
+#   "morph"      - lemma, POS and morphology only (tok2vec, tagger, attribute_ruler, lemmatizer)
+#   "morph+dep"  - the above plus the dependency parser (token.dep_, sentence boundaries)
+#   "full"       - the whole model, including NER
+PROFILE_EXCLUDES = {
+    "morph": ["parser", "ner"],
+    "morph+dep": ["ner"],
+    "full": [],
+}
+
+
+def load_pipeline(profile="full", model=SPACY_MODEL):
+    """Loads the model with only the components the profile needs."""
+    if profile not in PROFILE_EXCLUDES:
+        raise ValueError(f"Unknown pipeline profile '{profile}', expected one of: {', '.join(PROFILE_EXCLUDES)}")
+    return spacy.load(model, exclude=PROFILE_EXCLUDES[profile])
+
+
+def select_profile(nlp, profile):
+    """
+    Runs an already loaded pipeline with only the components of the profile:
+        with select_profile(nlp, "morph"):
+            doc = nlp(text)
+    """
+    if profile not in PROFILE_EXCLUDES:
+        raise ValueError(f"Unknown pipeline profile '{profile}', expected one of: {', '.join(PROFILE_EXCLUDES)}")
+    disable = [name for name in PROFILE_EXCLUDES[profile] if name in nlp.pipe_names]
+    return nlp.select_pipes(disable=disable)
+
+
+def benchmark_profiles(texts, profiles=tuple(PROFILE_EXCLUDES), runs=3, model=SPACY_MODEL):
+    """Measures load time and throughput (tokens/sec) of every profile on the same texts."""
+    results = {}
+    for profile in profiles:
+        start_time = time.perf_counter()
+        nlp = load_pipeline(profile, model)
+        load_time = time.perf_counter() - start_time
+
+        list(nlp.pipe(texts[:1]))  # Warm-up
+        rates = []
+        tokens = 0
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            tokens = sum(len(doc) for doc in nlp.pipe(texts))
+            rates.append(tokens / (time.perf_counter() - start_time))
+
+        results[profile] = {
+            "components": nlp.pipe_names,
+            "load_time": load_time,
+            "tokens": tokens,
+            "tokens_per_sec": statistics.median(rates),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python nlp_profiles.py <text file>")
+        sys.exit(1)
+
+    with open(sys.argv[1], encoding="utf-8", errors="ignore") as file:
+        paragraphs = [p for p in file.read().split("\n") if p.strip()]
+
+    results = benchmark_profiles(paragraphs)
+    full_rate = results["full"]["tokens_per_sec"]
+    for profile, result in results.items():
+        print(f"{profile:10} load: {result['load_time']:.3f} s, "
+              f"{result['tokens_per_sec']:.1f} tokens/sec ({result['tokens_per_sec'] / full_rate:.2f}x full), "
+              f"components: {', '.join(result['components'])}")
@@ -0,0 +1,131 @@
+import json
+import os
+
+# The journal is folded into the snapshot once it holds this many changes
+COMPACT_EVERY = 5000
+
+
+class JournalStorage:
+    """
+    Persistence for the word database: a JSON snapshot plus an append-only journal of changes.
+    Every change is appended to the journal right away, so a crash loses nothing and saving
+    costs only the size of the change. The journal is compacted into a new snapshot periodically.
+
+    Journal lines:
+        {"seq": ..., "op": "put", "word": ..., "value": [occurrences, info]}
+        {"seq": ..., "op": "inc", "word": ..., "n": ...}
+        {"seq": ..., "op": "del", "word": ...}
+
+    Every entry gets the next sequence number, and the snapshot records the number of the last entry
+    folded into it: {"seq": ..., "words": {...}}. Replay skips the entries the snapshot already holds,
+    so a crash between replacing the snapshot and emptying the journal does not apply "inc" twice.
+    A snapshot that is a plain word dict (written before sequence numbers) counts as seq 0.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, compact_every=COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = compact_every
+        self.db = None
+        self.journal = None
+        self.journal_entries = 0
+        self.seq = 0  # Sequence number of the last change, in the journal or the snapshot
+
+    def load(self):
+        """Reads the snapshot, replays the journal on top of it and returns the database dict."""
+        self.db = {}
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as file:
+                data = json.load(file)
+            if isinstance(data.get("words"), dict) and "seq" in data:
+                snapshot_seq = data["seq"]
+                self.db = data["words"]
+            else:
+                self.db = data
+        self.seq = snapshot_seq
+
+        self.journal_entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from a crash, everything before it is intact
+                        print(f"Skipping damaged journal entry in {self.journal_path}")
+                        continue
+                    self.journal_entries += 1
+                    seq = entry.get("seq")
+                    if seq is not None:
+                        if seq <= snapshot_seq:
+                            continue  # Already in the snapshot, the journal was not emptied after compacting
+                        self.seq = max(self.seq, seq)
+                    self._apply(entry)
+
+        if self.journal_entries >= self.compact_every:
+            self.compact()
+        return self.db
+
+    def _apply(self, entry):
+        word = entry["word"]
+        if entry["op"] == "put":
+            self.db[word] = entry["value"]
+        elif entry["op"] == "inc" and word in self.db:
+            self.db[word][0] += entry["n"]
+        elif entry["op"] == "del":
+            self.db.pop(word, None)
+
+    def _append(self, entry):
+        if self.journal is None:
+            self.journal = open(self.journal_path, "a", encoding="utf-8")
+            if self.journal.tell() > 0:
+                # Terminate a possibly torn last line so the new entry starts on its own line
+                self.journal.write("\n")
+        self.seq += 1
+        self.journal.write(json.dumps({"seq": self.seq, **entry}, ensure_ascii=False) + "\n")
+        self.journal_entries += 1
+
+    def log_put(self, word, value):
+        self._append({"op": "put", "word": word, "value": value})
+
+    def log_increment(self, word, n):
+        self._append({"op": "inc", "word": word, "n": n})
+
+    def log_delete(self, word):
+        self._append({"op": "del", "word": word})
+
+    def sync(self):
+        """Makes the journal durable, call after every user action. Compacts when the journal grows too big."""
+        if self.journal is not None:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        if self.journal_entries >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """
+        Writes the current database into a new snapshot and empties the journal. A crash in between
+        leaves entries the snapshot already holds in the journal, load skips them by sequence number.
+        """
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"seq": self.seq, "words": self.db}, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        open(self.journal_path, "w").close()
+        self.journal_entries = 0
+        print(f"Compacted {self.journal_path} into {self.snapshot_path}")
+
+    def close(self):
+        self.sync()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
@@ -0,0 +1,39 @@
+import queue
+import threading
+
+
+class BackgroundWorker:
+    """
+    Runs tasks one by one on a daemon thread. A task is called as task(emit, *args) and reports
+    results with emit(tag, payload); the Tk side drains them with poll() from root.after,
+    so widgets are only ever touched from the main thread.
+    """
+
+    def __init__(self, name):
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, task, *args):
+        self.tasks.put((task, args))
+
+    def emit(self, tag, payload=None):
+        self.results.put((tag, payload))
+
+    def poll(self):
+        """Returns all results produced since the last call."""
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def _run(self):
+        while True:
+            task, args = self.tasks.get()
+            try:
+                task(self.emit, *args)
+            except Exception as e:
+                self.emit("error", e)
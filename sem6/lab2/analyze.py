@@ -1,147 +1,401 @@
+import argparse
+import hashlib
 import json
-import spacy
 import sqlite3
 import os
-from utils import POS_TAG_TRANSLATIONS, beautiful_morph, clean_token
+import time
+from datetime import datetime
+from annotation import INSERT_SENTENCES_SQL, INSERT_WORDFORMS_SQL, annotate_doc, ensure_annotation_schema
+from dictionary_schema import create_normalized_schema, is_normalized
+from doc_cache import ensure_doc_cache, serialize_doc, store_docs
+from corpus_matrices import ensure_doc_versions
+from nlp_profiles import load_pipeline
+from pos_stats import ensure_pos_stats
+from search_index import ensure_search_index
+from sources import iter_sources, sources_complete, sources_exist
+from text_store import create_text_blobs, write_texts
 
-# --- IMPORTANT: Comment this line if want to save db context ---
-# os.remove("movies.db")
+# Wordforms store lemma, POS, morphology and dependency, NER is never used
+NLP_PROFILE = "morph+dep"
 
+DB_PATH = "movies.db"
+SOURCES_PATH = "sources.jsonl"  # generate.py; старый sources.json тоже читается
 
-db = sqlite3.connect("movies.db")
-cursor = db.cursor()
+# Новая база в нормализованном виде: lemma/morph/pos/dep в словарных таблицах, wordforms - представление.
+# Существующие базы переводятся скриптом migrate_normalized.py
+NORMALIZED_SCHEMA = False
+# Новая база со сжатыми текстами (text_blobs, см. text_store.py). Существующие - скриптом compress_texts.py
+COMPRESSED_TEXTS = False
+# Разобранные Doc сохраняются в doc_cache (DocBin), чтобы аннотации можно было загрузить без spaCy
+DOC_CACHE = True
 
-# Загрузка модели spacy
-print("Загрузка модели spaCy 'en_core_web_sm'...")
-try:
-    nlp = spacy.load('en_core_web_sm')
-    print("Модель успешно загружена.")
-except OSError:
-    print("\n!!! Ошибка: Модель 'en_core_web_sm' не найдена. !!!")
-    print("Пожалуйста, скачайте её, выполнив в терминале:")
-    print("python -m spacy download en_core_web_sm")
-    print("---------------------------------------------------\n")
-    db.close()
-    exit()
-
-pos_tag_translations = POS_TAG_TRANSLATIONS
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS texts (
-    file_id INTEGER PRIMARY KEY,
-    text_id TEXT,
-    num_words TEXT,
-    genre TEXT,
-    date TEXT,
-    country TEXT,
-    lang TEXT,
-    imdb TEXT,
-    title TEXT,
-    text TEXT
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS wordforms (
-    wordform_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    wordform TEXT,
-    lemma TEXT,
-    morph TEXT,
-    pos TEXT,
-    dep TEXT,
-    file_id INTEGER,
-    FOREIGN KEY (file_id) REFERENCES texts(file_id) ON DELETE CASCADE
-);
-""")
-
-cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_file_id ON wordforms(file_id);")
-cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_wordform ON wordforms(wordform);")
-cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_lemma ON wordforms(lemma);")
-
-cursor.execute("PRAGMA foreign_keys = ON;")
-
-
-print("Чтение sources.json...")
-try:
-    with open("sources.json", encoding="utf-8") as file:
-        sources = json.load(file)
-except FileNotFoundError:
-    print("Ошибка: Файл sources.json не найден. Запустите generate.py сначала.")
-    db.close()
-    exit()
-except json.JSONDecodeError:
-    print("Ошибка: Не удалось декодировать JSON из файла sources.json.")
-    db.close()
-    exit()
+# --- Параллельная обработка ---
+N_PROCESS = 1              # Процессов spaCy в nlp.pipe (1 = без multiprocessing)
+PIPE_BATCH_SIZE = 16       # Текстов в одном пакете nlp.pipe
+WRITE_BATCH_DOCS = 200     # Текстов в одной транзакции записи
+COMMIT_INTERVAL = 30       # Секунд максимум между транзакциями (чекпоинтами)
+SCALING_DB_PATH = "movies_scaling.db"  # Временная база для замера --scaling
+# ---
+
+INSERT_TEXTS_SQL = """
+    INSERT INTO texts (file_id, text_id, num_words, genre, date, country, lang, imdb, title, text)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SAVE_CHECKPOINT_SQL = """
+    INSERT INTO ingest_state (source_path, source_hash, last_file_id, last_position, processed, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(source_path) DO UPDATE SET
+        source_hash = excluded.source_hash,
+        last_file_id = excluded.last_file_id,
+        last_position = excluded.last_position,
+        processed = ingest_state.processed + excluded.processed,
+        updated_at = excluded.updated_at
+"""
+
+
+def apply_pragmas(cursor):
+    # WAL: читатели (manager.py) не блокируются писателем, synchronous=NORMAL безопасен в WAL
+    cursor.execute("PRAGMA journal_mode = WAL;")
+    cursor.execute("PRAGMA synchronous = NORMAL;")
+    cursor.execute("PRAGMA cache_size = -65536;")  # 64 MiB
+    cursor.execute("PRAGMA temp_store = MEMORY;")
+    cursor.execute("PRAGMA foreign_keys = ON;")
+
+
+def create_schema(cursor, normalized=NORMALIZED_SCHEMA, compressed=COMPRESSED_TEXTS):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS texts (
+        file_id INTEGER PRIMARY KEY,
+        text_id TEXT,
+        num_words TEXT,
+        genre TEXT,
+        date TEXT,
+        country TEXT,
+        lang TEXT,
+        imdb TEXT,
+        title TEXT,
+        text TEXT
+    )
+    """)
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'wordforms'")
+    is_new_database = cursor.fetchone() is None
+
+    # Режим существующей базы сохраняется, normalized влияет только на новую
+    if is_normalized(cursor) or (normalized and is_new_database):
+        create_normalized_schema(cursor)
+    else:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS wordforms (
+            wordform_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wordform TEXT,
+            lemma TEXT,
+            morph TEXT,
+            pos TEXT,
+            dep TEXT,
+            file_id INTEGER,
+            char_offset INTEGER,
+            sent_index INTEGER,
+            FOREIGN KEY (file_id) REFERENCES texts(file_id) ON DELETE CASCADE
+        );
+        """)
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_file_id ON wordforms(file_id);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_wordform ON wordforms(wordform);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_lemma ON wordforms(lemma);")
+
+    # Как и normalized, сжатие текстов выбирается только для новой базы
+    if compressed and is_new_database:
+        create_text_blobs(cursor)
+
+    # Sentence spans and token offsets, used to build concordance examples without scanning texts
+    ensure_annotation_schema(cursor)
 
-print(f"Найдено {len(sources)} записей в sources.json.")
+    # FTS5 index over distinct wordforms and lemmas, filled by triggers as wordforms are inserted
+    ensure_search_index(cursor)
 
-processed_files = 0
-skipped_files = 0
-for source_key, source in sources.items():
-    file_id = source.get("file_id")
-    if file_id is None:
-        print(f"Предупреждение: Пропущена запись без file_id: {source.get('title', 'N/A')}")
-        skipped_files += 1
-        continue
+    # POS statistics for manager.py, kept current by triggers as wordforms are inserted
+    ensure_pos_stats(cursor)
 
-    cursor.execute("SELECT 1 FROM texts WHERE file_id = ?", (file_id,))
-    exists = cursor.fetchone()
+    # Serialized Doc of every text, see doc_cache.py
+    ensure_doc_cache(cursor)
 
-    if exists:
-        skipped_files += 1
-        continue
+    # Per-text versions for incremental refresh of the corpus matrices, see corpus_matrices.py
+    ensure_doc_versions(cursor)
 
-    print(f"Обработка текста file_id {file_id}: {source.get('title', 'N/A')}")
+    # Чекпоинт загрузки: последний записанный текст для каждого файла источников
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        source_path TEXT PRIMARY KEY,
+        source_hash TEXT,
+        last_file_id INTEGER,
+        last_position INTEGER,
+        processed INTEGER DEFAULT 0,
+        updated_at TEXT
+    )
+    """)
 
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(cursor, source_path, source_hash):
+    """
+    Returns the position in the sources file to resume from.
+    The position is only trusted if the sources file is unchanged; otherwise resuming relies on
+    the file_ids already in `texts`, which is exact as well because a text and its annotations
+    are committed in the same transaction.
+    """
+    cursor.execute("SELECT source_hash, last_file_id, last_position, processed FROM ingest_state WHERE source_path = ?",
+                   (source_path,))
+    row = cursor.fetchone()
+    if row is None or source_hash is None:
+        return 0
+    saved_hash, last_file_id, last_position, processed = row
+    if saved_hash != source_hash:
+        print(f"Файл {source_path} изменился с последней загрузки, чекпоинт позиции не используется.")
+        return 0
+    print(f"Продолжение загрузки: уже записано {processed} текстов, последний file_id {last_file_id} "
+          f"(позиция {last_position}).")
+    return last_position + 1
+
+
+def normalize_file_id(file_id):
+    """file_id в источниках - строка, в texts - INTEGER PRIMARY KEY."""
     try:
-        cursor.execute("INSERT INTO texts (file_id, text_id, num_words, genre, date, country, lang, imdb, title, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                       (file_id, source.get("text_id"), source.get("#words"), source.get("genre"), source.get("date"), source.get("country"), source.get("lang"), source.get("imdb"), source.get("title"), source.get("text")))
-    except sqlite3.IntegrityError:
-         print(f"Предупреждение: Не удалось вставить текст с file_id {file_id}, возможно дубликат PRIMARY KEY.")
-         skipped_files += 1
-         continue
-
-    text_to_process = source.get("text", "")
-    if not text_to_process:
-        print(f"Предупреждение: Пустой текст для file_id {file_id}. Словоформы не будут добавлены.")
-        # Текст уже вставлен, просто пропускаем анализ
-        processed_files += 1 # Считаем его обработанным (вставленным)
-        continue
-
-    # Обработка текста с помощью spacy
-    doc = nlp(text_to_process)
-    wordforms_to_insert = []
-    for token in doc:
-        cleaned_text = clean_token(token.text) # Используем функцию очистки
-        if not cleaned_text or token.is_space:
+        return int(file_id)
+    except (TypeError, ValueError):
+        return file_id
+
+
+def iter_pending(sources, existing_ids, stats, start_position=0):
+    """
+    Yields (text, (file_id, source, position)) for sources that are not in the database yet.
+    existing_ids is loaded once up front and extended here, so duplicate file_ids inside
+    the sources file are skipped as well.
+    """
+    for position, source in enumerate(sources):
+        if position < start_position:
+            stats["skipped"] += 1
             continue
 
-        pos_tag = token.pos_
-        human_readable_pos = pos_tag_translations.get(pos_tag, pos_tag) # Используем из utils
-
-        # Используем beautiful_morph из utils
-        morph_str = beautiful_morph(token.morph.to_dict())
-
-        wordforms_to_insert.append((
-            token.text.lower(), # Сохраняем в нижнем регистре для поиска
-            token.lemma_,
-            morph_str,
-            human_readable_pos,
-            token.dep_,
-            file_id # Используем file_id, который точно есть
-        ))
-
-    # Вставка словоформ пакетом для производительности
-    if wordforms_to_insert:
-        cursor.executemany('INSERT INTO wordforms (wordform, lemma, morph, pos, dep, file_id) VALUES (?, ?, ?, ?, ?, ?)',
-                           wordforms_to_insert)
-    processed_files += 1
-
-
-print(f"\nЗавершено.")
-print(f"Обработано и добавлено/обновлено текстов: {processed_files}")
-print(f"Пропущено (уже существовали или ошибка): {skipped_files}")
-db.commit()
-db.close()
-print("База данных сохранена и закрыта.")
+        file_id = source.get("file_id")
+        if file_id is None:
+            print(f"Предупреждение: Пропущена запись без file_id: {source.get('title', 'N/A')}")
+            stats["skipped"] += 1
+            continue
+
+        file_id = normalize_file_id(file_id)
+        if file_id in existing_ids:
+            stats["skipped"] += 1
+            continue
+        existing_ids.add(file_id)
+
+        text_to_process = source.get("text", "") or ""
+        if not text_to_process:
+            # Текст всё равно вставляется, просто без словоформ
+            print(f"Предупреждение: Пустой текст для file_id {file_id}. Словоформы не будут добавлены.")
+        yield text_to_process, (file_id, source, position)
+
+
+def flush(db, texts, wordforms, sentences, checkpoint=None, docs=None):
+    """
+    Single writer: one transaction per batch of documents. The checkpoint
+    (source_path, source_hash, last_file_id, last_position) is saved in the same transaction,
+    so after a crash the database holds either the whole batch and its checkpoint or neither.
+    """
+    if not texts:
+        return
+    cursor = db.cursor()
+    write_texts(cursor, INSERT_TEXTS_SQL, texts)
+    cursor.executemany(INSERT_WORDFORMS_SQL, wordforms)
+    cursor.executemany(INSERT_SENTENCES_SQL, sentences)
+    if docs:
+        store_docs(cursor, docs)
+    if checkpoint is not None:
+        cursor.execute(SAVE_CHECKPOINT_SQL, (*checkpoint, len(texts), datetime.now().isoformat(timespec="seconds")))
+    db.commit()
+    texts.clear()
+    wordforms.clear()
+    sentences.clear()
+    if docs:
+        docs.clear()
+
+
+def ingest(db, nlp, sources, n_process=N_PROCESS, batch_size=PIPE_BATCH_SIZE, write_batch=WRITE_BATCH_DOCS,
+           source_path=None, source_hash=None, cache_docs=DOC_CACHE):
+    """
+    Parses all pending sources with nlp.pipe (n_process worker processes) and writes them from
+    this process only, committing every write_batch documents or COMMIT_INTERVAL seconds.
+    With source_path/source_hash given, progress is checkpointed and a rerun resumes after the
+    last committed text. Ctrl-C commits the documents parsed so far before stopping.
+    With cache_docs every Doc is also stored in doc_cache.
+    Returns counters and the elapsed time, total and spent in writes.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT file_id FROM texts")
+    existing_ids = {row[0] for row in cursor.fetchall()}
+    start_position = load_checkpoint(cursor, source_path, source_hash) if source_path else 0
+
+    stats = {"processed": 0, "skipped": 0, "tokens": 0, "rows": 0, "write_seconds": 0.0, "interrupted": False}
+    texts, wordforms, sentences, docs = [], [], [], []
+    checkpoint = None
+
+    start_time = time.perf_counter()
+    last_commit = start_time
+    pending = iter_pending(sources, existing_ids, stats, start_position)
+    try:
+        for doc, (file_id, source, position) in nlp.pipe(pending, as_tuples=True, n_process=n_process,
+                                                         batch_size=batch_size):
+            texts.append((file_id, source.get("text_id"), source.get("#words"), source.get("genre"),
+                          source.get("date"), source.get("country"), source.get("lang"), source.get("imdb"),
+                          source.get("title"), source.get("text")))
+            doc_wordforms, doc_sentences = annotate_doc(doc, file_id)
+            wordforms.extend(doc_wordforms)
+            sentences.extend(doc_sentences)
+            if cache_docs:
+                docs.append(serialize_doc(file_id, doc, NLP_PROFILE))
+            stats["tokens"] += len(doc)
+            stats["rows"] += len(doc_wordforms)
+            stats["processed"] += 1
+            if source_path:
+                checkpoint = (source_path, source_hash, file_id, position)
+
+            now = time.perf_counter()
+            if len(texts) >= write_batch or now - last_commit >= COMMIT_INTERVAL:
+                flush(db, texts, wordforms, sentences, checkpoint, docs)
+                last_commit = time.perf_counter()
+                stats["write_seconds"] += last_commit - now
+                print(f"  Записано текстов: {stats['processed']} (file_id {file_id})")
+    except KeyboardInterrupt:
+        stats["interrupted"] = True
+        print("\nПрервано. Сохранение уже обработанных текстов...")
+    except json.JSONDecodeError as e:
+        stats["interrupted"] = True
+        print(f"\nОшибка: Не удалось декодировать запись источников: {e}. Сохранение уже обработанных текстов...")
+    flush_start = time.perf_counter()
+    flush(db, texts, wordforms, sentences, checkpoint, docs)
+    stats["write_seconds"] += time.perf_counter() - flush_start
+
+    stats["seconds"] = time.perf_counter() - start_time
+    return stats
+
+
+def report_rate(stats, n_process):
+    seconds = stats["seconds"] or 1e-9
+    print(f"  n_process={n_process}: {stats['processed']} текстов, {stats['tokens']} токенов за {seconds:.2f} с "
+          f"-> {stats['processed'] / seconds:.2f} docs/sec, {stats['tokens'] / seconds:.0f} tokens/sec")
+
+
+def open_database(path, normalized=NORMALIZED_SCHEMA, compressed=COMPRESSED_TEXTS):
+    db = sqlite3.connect(path)
+    cursor = db.cursor()
+    apply_pragmas(cursor)
+    create_schema(cursor, normalized, compressed)
+    db.commit()
+    return db
+
+
+def run_scaling(nlp, sources_path, max_workers, normalized=NORMALIZED_SCHEMA, compressed=COMPRESSED_TEXTS):
+    """Ingests the same sources into a scratch database for 1..max_workers processes."""
+    print(f"\nЗамер масштабирования (1..{max_workers} процессов), база {SCALING_DB_PATH}")
+    results = []
+    for n_process in range(1, max_workers + 1):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(SCALING_DB_PATH + suffix):
+                os.remove(SCALING_DB_PATH + suffix)
+        db = open_database(SCALING_DB_PATH, normalized, compressed)
+        stats = ingest(db, nlp, iter_sources(sources_path), n_process=n_process)
+        db.close()
+        report_rate(stats, n_process)
+        results.append((n_process, stats))
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(SCALING_DB_PATH + suffix):
+            os.remove(SCALING_DB_PATH + suffix)
+
+    print("\nПроцессов | docs/sec | tokens/sec | ускорение")
+    base_rate = results[0][1]["processed"] / (results[0][1]["seconds"] or 1e-9)
+    for n_process, stats in results:
+        rate = stats["processed"] / (stats["seconds"] or 1e-9)
+        print(f"{n_process:9} | {rate:8.2f} | {stats['tokens'] / (stats['seconds'] or 1e-9):10.0f} | "
+              f"{rate / base_rate if base_rate else 0:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка текстов из sources.jsonl в movies.db")
+    parser.add_argument("--sources", default=SOURCES_PATH, help="файл источников (.jsonl или старый .json)")
+    parser.add_argument("--follow", action="store_true",
+                        help="читать источники, пока generate.py их ещё пишет, и завершиться вместе с ним")
+    parser.add_argument("--workers", type=int, default=N_PROCESS, help="процессов spaCy для nlp.pipe")
+    parser.add_argument("--batch-size", type=int, default=PIPE_BATCH_SIZE, help="текстов в пакете nlp.pipe")
+    parser.add_argument("--scaling", type=int, metavar="N",
+                        help="только замерить docs/sec и tokens/sec для 1..N процессов во временной базе")
+    parser.add_argument("--normalized", action="store_true", default=NORMALIZED_SCHEMA,
+                        help="создать новую базу в нормализованном виде (словарные таблицы)")
+    parser.add_argument("--compressed", action="store_true", default=COMPRESSED_TEXTS,
+                        help="создать новую базу со сжатыми текстами (text_blobs)")
+    parser.add_argument("--no-doc-cache", dest="doc_cache", action="store_false", default=DOC_CACHE,
+                        help="не сохранять разобранные Doc в doc_cache")
+    args = parser.parse_args()
+
+    # --- IMPORTANT: Uncomment this line to rebuild db from scratch ---
+    # os.remove(DB_PATH)
+
+    # Загрузка модели spacy
+    print(f"Загрузка модели spaCy 'en_core_web_sm' (профиль '{NLP_PROFILE}')...")
+    try:
+        nlp = load_pipeline(NLP_PROFILE)
+        print("Модель успешно загружена.")
+    except OSError:
+        print("\n!!! Ошибка: Модель 'en_core_web_sm' не найдена. !!!")
+        print("Пожалуйста, скачайте её, выполнив в терминале:")
+        print("python -m spacy download en_core_web_sm")
+        print("---------------------------------------------------\n")
+        return
+
+    if not (sources_exist(args.sources) if args.follow else os.path.exists(args.sources)):
+        if not args.follow:
+            print(f"Ошибка: Файл {args.sources} не найден. Запустите generate.py сначала.")
+            return
+        print(f"Ожидание {args.sources}...")
+    elif not args.follow and not sources_complete(args.sources):
+        print(f"Ошибка: generate.py ещё пишет {args.sources}. Дождитесь окончания или запустите с --follow.")
+        return
+
+    if args.scaling:
+        run_scaling(nlp, args.sources, args.scaling, args.normalized, args.compressed)
+        return
+
+    # Хэш только у готового файла: пока generate.py пишет, продолжение идёт по file_id
+    source_hash = None
+    if sources_complete(args.sources):
+        source_hash = file_hash(args.sources)
+    print(f"Чтение {args.sources}{' (ожидание новых записей)' if args.follow else ''}...")
+
+    db = open_database(DB_PATH, args.normalized, args.compressed)
+    print(f"Обработка текстов: n_process={args.workers}, batch_size={args.batch_size}")
+    stats = ingest(db, nlp, iter_sources(args.sources, follow=args.follow), n_process=args.workers,
+                   batch_size=args.batch_size, source_path=os.path.abspath(args.sources), source_hash=source_hash,
+                   cache_docs=args.doc_cache)
+    db.close()
+
+    if stats["interrupted"]:
+        print("\nЗагрузка прервана, повторный запуск продолжит с последнего чекпоинта.")
+    else:
+        print(f"\nЗавершено.")
+    print(f"Обработано и добавлено/обновлено текстов: {stats['processed']}")
+    print(f"Пропущено (уже существовали или ошибка): {stats['skipped']}")
+    report_rate(stats, args.workers)
+    print("База данных сохранена и закрыта.")
+
+
+# nlp.pipe(n_process > 1) starts worker processes that re-import this module
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from bisect import bisect_left, bisect_right
+
+from utils import POS_TAG_TRANSLATIONS, beautiful_morph, clean_token
+
+INSERT_WORDFORMS_SQL = """
+    INSERT INTO wordforms (wordform, lemma, morph, pos, dep, file_id, char_offset, sent_index)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_SENTENCES_SQL = "INSERT INTO sentences (file_id, sent_index, start_char, end_char) VALUES (?, ?, ?, ?)"
+
+
+def ensure_annotation_schema(cursor):
+    """Adds sentence spans and token offsets to databases created before they existed."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sentences (
+        file_id INTEGER,
+        sent_index INTEGER,
+        start_char INTEGER,
+        end_char INTEGER,
+        PRIMARY KEY (file_id, sent_index),
+        FOREIGN KEY (file_id) REFERENCES texts(file_id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("PRAGMA table_info(wordforms)")
+    columns = {row[1] for row in cursor.fetchall()}
+    for column in ("char_offset", "sent_index"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE wordforms ADD COLUMN {column} INTEGER")
+
+
+def iter_sentences(doc):
+    """Sentence spans of the doc; a doc without sentence boundaries counts as one sentence."""
+    if doc.has_annotation("SENT_START") or doc.has_annotation("DEP"):
+        return doc.sents
+    return [doc[:]] if len(doc) else []
+
+
+def annotate_doc(doc, file_id, char_shift=0, sent_shift=0):
+    """
+    Turns a parsed text into rows for the wordforms and sentences tables.
+    char_shift/sent_shift place a doc parsed from a fragment of the text at its position in the full text.
+    """
+    wordform_rows = []
+    sentence_rows = []
+    for sent_index, sent in enumerate(iter_sentences(doc), start=sent_shift):
+        sentence_rows.append((file_id, sent_index, sent.start_char + char_shift, sent.end_char + char_shift))
+        for token in sent:
+            cleaned_text = clean_token(token.text)
+            if not cleaned_text or token.is_space:
+                continue
+
+            wordform_rows.append((
+                token.text.lower(),  # Сохраняем в нижнем регистре для поиска
+                token.lemma_,
+                beautiful_morph(token.morph.to_dict()),
+                POS_TAG_TRANSLATIONS.get(token.pos_, token.pos_),
+                token.dep_,
+                file_id,
+                token.idx + char_shift,
+                sent_index
+            ))
+    return wordform_rows, sentence_rows
+
+
+def find_changed_sentences(old_text, new_text, sentence_spans, context=1):
+    """
+    Finds the sentences of old_text touched by the edit that turns it into new_text.
+    sentence_spans are (sent_index, start_char, end_char) of old_text ordered by sent_index.
+    The edit is the span between the common prefix and the common suffix of the two texts;
+    `context` sentences on each side are added so spaCy sees the same neighbourhood as before.
+
+    Returns (first_index, last_index, region_start, region_end) with the region covering whole
+    sentences of old_text (up to the start of the next sentence), or None if the texts are equal
+    or there are no spans.
+    """
+    if old_text == new_text or not sentence_spans:
+        return None
+
+    max_common = min(len(old_text), len(new_text))
+    prefix = 0
+    while prefix < max_common and old_text[prefix] == new_text[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < max_common - prefix and old_text[-suffix - 1] == new_text[-suffix - 1]:
+        suffix += 1
+    change_start, change_end = prefix, len(old_text) - suffix
+
+    starts = [start for _, start, _ in sentence_spans]
+    first = max(0, bisect_right(starts, change_start) - 1)
+    last = max(first, bisect_left(starts, change_end) - 1)
+    first = max(0, first - context)
+    last = min(len(sentence_spans) - 1, last + context)
+
+    region_start = 0 if first == 0 else sentence_spans[first][1]
+    region_end = len(old_text) if last == len(sentence_spans) - 1 else sentence_spans[last + 1][1]
+    return sentence_spans[first][0], sentence_spans[last][0], region_start, region_end
@@ -0,0 +1,134 @@
+"""
+In-memory prefix index over the distinct wordforms and lemmas, for suggestions while typing.
+
+The terms are kept in one sorted list, so the terms starting with a prefix are a contiguous slice
+found with two bisects. The weight of a term is the number of wordform rows an exact search for it
+returns (rows where it is the wordform or the lemma). For prefixes of up to TOP_PREFIX_LENGTH
+characters, whose slices cover a large part of the vocabulary, the top SUGGESTION_COUNT terms are
+computed once when the index is built; longer prefixes select them from their (short) slice.
+
+Building needs two GROUP BY scans over `wordforms`, so the index is saved next to the database
+(<db>.suggest.json) and reused while the stamp of the database still matches.
+"""
+import bisect
+import heapq
+import json
+import os
+
+SUGGESTION_COUNT = 10
+TOP_PREFIX_LENGTH = 2       # Prefixes up to this length get precomputed top-k lists
+SUGGEST_CACHE_SUFFIX = ".suggest.json"
+SUGGEST_CACHE_VERSION = 1
+
+TERM_WEIGHTS_SQL = """
+    SELECT term, SUM(n) FROM (
+        SELECT lower(wordform) AS term, COUNT(*) AS n FROM wordforms WHERE wordform IS NOT NULL GROUP BY wordform
+        UNION ALL
+        SELECT lower(lemma), COUNT(*) FROM wordforms
+        WHERE lemma IS NOT NULL AND lemma != wordform GROUP BY lemma
+    )
+    WHERE term != ''
+    GROUP BY term
+"""
+
+
+class PrefixIndex:
+
+    def __init__(self, terms, weights, stamp=None, top_prefix_length=TOP_PREFIX_LENGTH, k=SUGGESTION_COUNT):
+        """terms must be sorted and distinct, weights[i] belongs to terms[i]."""
+        self.terms = terms
+        self.weights = weights
+        self.stamp = stamp
+        self.k = k
+        self.top = {}  # short prefix -> its k heaviest terms, in suggestion order
+        for length in range(1, top_prefix_length + 1):
+            start = 0
+            while start < len(terms):
+                if len(terms[start]) < length:
+                    start += 1
+                    continue
+                prefix = terms[start][:length]
+                end = self._end(prefix, start)
+                self.top[prefix] = self._heaviest(start, end, k)
+                start = end
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _end(self, prefix, start=0):
+        # Every term starting with prefix sorts below prefix + the highest code point
+        return bisect.bisect_left(self.terms, prefix + "\U0010ffff", start)
+
+    def _heaviest(self, start, end, k):
+        best = heapq.nsmallest(k, range(start, end), key=lambda i: (-self.weights[i], self.terms[i]))
+        return [(self.terms[i], self.weights[i]) for i in best]
+
+    def suggest(self, prefix, k=None):
+        """Up to k (term, weight) pairs starting with prefix, most frequent first."""
+        k = k or self.k
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        if prefix in self.top and k <= self.k:
+            return self.top[prefix][:k]
+        start = bisect.bisect_left(self.terms, prefix)
+        return self._heaviest(start, self._end(prefix, start), k)
+
+    @classmethod
+    def from_weights(cls, pairs, stamp=None):
+        pairs = sorted(pairs)
+        return cls([term for term, _ in pairs], [weight for _, weight in pairs], stamp)
+
+
+def database_stamp(cursor):
+    """
+    Changes whenever rows are added or removed (pos_stats total) or a new term appears (search_terms).
+    Edits that only move counts between existing terms keep it, the weights are then slightly off
+    until the next rebuild, which only affects the order of suggestions.
+    """
+    cursor.execute("SELECT COALESCE(SUM(count), 0) FROM pos_stats_overall")
+    total = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(term_id), 0) FROM search_terms")
+    return [total, cursor.fetchone()[0]]
+
+
+def cache_path(db_path):
+    return db_path + SUGGEST_CACHE_SUFFIX
+
+
+def load_cached_index(db_path, stamp):
+    """The index saved for db_path if its stamp is current, otherwise None."""
+    try:
+        with open(cache_path(db_path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != SUGGEST_CACHE_VERSION or data.get("stamp") != stamp:
+        return None
+    return PrefixIndex(data["terms"], data["weights"], stamp)
+
+
+def save_index(db_path, index):
+    path = cache_path(db_path)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": SUGGEST_CACHE_VERSION, "stamp": index.stamp,
+                   "terms": index.terms, "weights": index.weights}, f, ensure_ascii=False)
+    os.replace(temp_path, path)  # Never leaves a half-written cache behind
+
+
+def build_index(cursor, db_path=None):
+    """Loads the index from the disk cache or builds it from the database (and saves it when db_path is given)."""
+    stamp = database_stamp(cursor)
+    if db_path is not None:
+        index = load_cached_index(db_path, stamp)
+        if index is not None:
+            return index
+    cursor.execute(TERM_WEIGHTS_SQL)
+    index = PrefixIndex.from_weights(((row[0], row[1]) for row in cursor.fetchall()), stamp)
+    if db_path is not None:
+        try:
+            save_index(db_path, index)
+        except OSError as e:
+            print(f"Could not save the suggestion index to {cache_path(db_path)}: {e}")
+    return index
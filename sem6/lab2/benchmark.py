@@ -1,10 +1,15 @@
 # --- START OF FILE benchmark.py ---
 
+import argparse
+import itertools
+import os
+import sqlite3
 import time
 import json
 import spacy
 import statistics
 import random
+from datetime import datetime
 # Импортируем matplotlib
 try:
     import matplotlib.pyplot as plt
@@ -17,22 +22,53 @@ except ImportError:
     print("Установите её: pip install matplotlib")
     print("-" * 55 + "\n")
 
+from sources import iter_sources
 from utils import POS_TAG_TRANSLATIONS, beautiful_morph, clean_token
 
 # --- Конфигурация Бенчмарка ---
-SOURCES_JSON_PATH = "sources.json"
+SOURCES_JSON_PATH = "sources.jsonl"
 NUM_TEXTS_TO_BENCHMARK = 15 # Увеличим немного для более показательных графиков
 NUM_RUNS = 1                # Для графиков часто достаточно одного прогона
 SPACY_MODEL = 'en_core_web_sm'
 MAX_TEXTS_ON_BAR_CHART = 30 # Ограничение для читаемости бар-чарта
+
+# --- Конфигурация бенчмарка базы данных (--db) ---
+BENCHMARK_DB_PATH = "movies_benchmark.db"  # Временная база, удаляется перед каждой сборкой
+DB_BENCHMARK_TEXTS = 50     # Текстов из источников, разбираемых spaCy
+DB_BENCHMARK_COPIES = 1     # Сколько раз записать каждый текст (копии тоже разбираются spaCy)
+QUERY_RUNS = 20             # Повторов каждого запроса
+WORDS_PER_CLASS = 10        # Слов в каждом классе нагрузки (frequent, rare, prefix, substring)
+RESULTS_JSON_PATH = "benchmark_results.json"
+COPY_ID_OFFSET = 10 ** 9    # file_id копии = file_id + номер копии * COPY_ID_OFFSET
 # ---
 
 def load_texts(filepath, num_texts):
-    """Загружает тексты из sources.json."""
+    """
+    Загружает тексты из sources.jsonl (или старого sources.json).
+    Источники читаются потоком, а случайная выборка из num_texts текстов набирается
+    reservoir sampling, поэтому в памяти одновременно только выборка, а не весь корпус.
+    """
     print(f"Загрузка текстов из {filepath}...")
+    texts = []
+    seen = 0
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            sources = json.load(f)
+        for position, source_data in enumerate(iter_sources(filepath)):
+            source_id = source_data.get("file_id", str(position))
+            text = source_data.get("text")
+            title = source_data.get("title", f"ID: {source_id}") # Получаем title
+            if not text:
+                print(f"Предупреждение: Пустой текст для ID {source_id}")
+                continue
+
+            # Сохраняем ID, текст и title
+            text_info = {"id": source_id, "content": text, "title": title}
+            seen += 1
+            if num_texts <= 0 or len(texts) < num_texts:
+                texts.append(text_info)
+            else:
+                replace_index = random.randrange(seen)
+                if replace_index < num_texts:
+                    texts[replace_index] = text_info
     except FileNotFoundError:
         print(f"Ошибка: Файл {filepath} не найден.")
         return None
@@ -40,26 +76,15 @@ def load_texts(filepath, num_texts):
         print(f"Ошибка: Не удалось декодировать JSON из файла {filepath}.")
         return None
 
-    texts = []
-    for source_id, source_data in sources.items():
-        text = source_data.get("text")
-        title = source_data.get("title", f"ID: {source_id}") # Получаем title
-        if text:
-            # Сохраняем ID, текст и title
-            texts.append({"id": source_id, "content": text, "title": title})
-        else:
-            print(f"Предупреждение: Пустой текст для ID {source_id}")
-
     if not texts:
         print("Ошибка: Не найдено текстов для бенчмарка.")
         return None
 
-    if num_texts > 0 and num_texts < len(texts):
-        print(f"Выбрано {num_texts} случайных текстов для бенчмарка.")
-        return random.sample(texts, num_texts)
+    if num_texts > 0 and num_texts < seen:
+        print(f"Выбрано {num_texts} случайных текстов из {seen} для бенчмарка.")
     else:
         print(f"Используются все {len(texts)} текстов для бенчмарка.")
-        return texts
+    return texts
 
 def benchmark_run(nlp, texts_data):
     """Выполняет один прогон бенчмарка для заданного списка текстов."""
@@ -217,8 +242,260 @@ def plot_time_vs_tokens(run_results):
     plt.tight_layout()
     # plt.savefig("benchmark_time_vs_tokens.png")
 
+
+# --- Бенчмарк SQLite: сборка базы, скорость записи, задержки запросов ---
+
+def iter_scaled_sources(filepath, num_texts, copies):
+    """
+    Первые num_texts источников, каждый copies раз с разными file_id. Копии разбираются spaCy
+    заново, зато размер базы задаётся без полного корпуса.
+    """
+    sources = list(itertools.islice(iter_sources(filepath), num_texts))
+    for copy in range(copies):
+        for source in sources:
+            file_id = source.get("file_id")
+            if copy:
+                try:
+                    file_id = str(int(file_id) + copy * COPY_ID_OFFSET)
+                except (TypeError, ValueError):
+                    file_id = f"{file_id}-{copy}"
+            yield dict(source, file_id=file_id)
+
+
+def remove_database(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def database_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def build_benchmark_db(path, sources_path, num_texts, copies, normalized):
+    """Собирает базу через analyze.ingest и возвращает показатели записи."""
+    from analyze import NLP_PROFILE, ingest, open_database
+    from nlp_profiles import load_pipeline
+
+    print(f"Загрузка spaCy (профиль '{NLP_PROFILE}') для сборки базы...")
+    nlp = load_pipeline(NLP_PROFILE)
+
+    remove_database(path)
+    print(f"Сборка {path}: {num_texts} текстов x {copies}, схема {'normalized' if normalized else 'plain'}...")
+    db = open_database(path, normalized)
+    stats = ingest(db, nlp, iter_scaled_sources(sources_path, num_texts, copies))
+    db.close()
+
+    seconds = stats["seconds"] or 1e-9
+    write_seconds = stats["write_seconds"] or 1e-9
+    return {
+        "docs": stats["processed"],
+        "tokens": stats["tokens"],
+        "rows": stats["rows"],
+        "seconds": stats["seconds"],
+        "write_seconds": stats["write_seconds"],
+        "docs_per_sec": stats["processed"] / seconds,
+        "rows_per_sec": stats["rows"] / seconds,
+        "write_rows_per_sec": stats["rows"] / write_seconds,  # Только транзакции записи, без spaCy
+        "db_bytes": database_size(path),
+    }
+
+
+def choose_workload(cursor, words_per_class, seed=0):
+    """
+    Слова для нагрузки, выбранные из самой базы (повторяемо при одинаковом seed):
+        frequent  - самые частые словоформы, exact
+        rare      - словоформы, встречающиеся один раз, exact
+        prefix    - первые 3 буквы случайных словоформ, prefix
+        substring - 3 буквы из середины случайных словоформ, substring
+    """
+    rng = random.Random(seed)
+    cursor.execute("""
+        SELECT wordform, COUNT(*) AS n FROM wordforms
+        WHERE length(wordform) >= 4 AND wordform NOT GLOB '*[^a-z]*'
+        GROUP BY wordform
+    """)
+    counts = [(row[0], row[1]) for row in cursor.fetchall()]
+    if not counts:
+        return {}
+    counts.sort(key=lambda item: (-item[1], item[0]))
+
+    words = [word for word, _ in counts]
+    rare = [word for word, n in counts if n == 1] or words[-words_per_class:]
+    sample = rng.sample(words, min(words_per_class, len(words)))
+    return {
+        "frequent": [(word, "exact") for word, _ in counts[:words_per_class]],
+        "rare": [(word, "exact") for word in rng.sample(rare, min(words_per_class, len(rare)))],
+        "prefix": [(word[:3], "prefix") for word in sample],
+        "substring": [(word[1:4], "substring") for word in sample],
+    }
+
+
+def check_search_plans(cursor, workload):
+    """
+    Проверяет, что поиск терминов для prefix/substring идёт через триграммный индекс FTS5
+    (в плане 'INDEX 0:L...'), а не полным перебором search_terms_fts. Возвращает планы.
+    """
+    from search_index import terms_query_plan
+
+    plans = {}
+    for query_class, queries in workload.items():
+        for word, mode in queries:
+            if mode == "exact" or len(word) < 3:
+                continue  # Шаблоны короче триграммы индекс не использует
+            for query in (word, word[:1] + "_" + word[2:]):  # Второй - с подстановочным символом в запросе
+                plan = terms_query_plan(cursor, query, mode)
+                assert any("INDEX 0:L" in detail for detail in plan), \
+                    f"Поиск '{query}' ({mode}) не использует триграммный индекс: {plan}"
+                plans[f"{mode}:{query}"] = plan
+    return plans
+
+
+def latency_summary(samples):
+    """p50/p95/p99, среднее и максимум в миллисекундах."""
+    ms = sorted(sample * 1000 for sample in samples)
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    return {"n": len(ms), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+            "mean_ms": statistics.mean(ms), "max_ms": ms[-1]}
+
+
+def time_call(samples, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+def run_query_workload(conn, path, workload, runs):
+    """
+    Повторяет нагрузку через методы conn (DBConnection) на читающем соединении, как у потоков менеджера.
+    Кэш терминов соединения сбрасывается перед каждым запросом только ради замера: повторный
+    одинаковый запрос без записей в базу иначе не собирал бы термины заново.
+    """
+    from query_executor import open_read_connection
+
+    reader = open_read_connection(path)
+    cursor = reader.cursor()
+    timings = {}
+    try:
+        cursor.execute("SELECT file_id FROM texts")
+        file_ids = [row[0] for row in cursor.fetchall()]
+
+        for run in range(runs):
+            print(f"  Прогон запросов {run + 1}/{runs}...", end='\r')
+            for query_class, queries in workload.items():
+                for word, mode in queries:
+                    reader.search_key = None
+                    result = time_call(timings.setdefault(f"search:{query_class}", []),
+                                       conn.find_info_by_word, cursor, word, mode=mode)
+                    if result["next_key"]:
+                        time_call(timings.setdefault(f"next_page:{query_class}", []),
+                                  conn.find_next_page, cursor, word, mode, result["next_key"])
+                    reader.search_key = None
+                    time_call(timings.setdefault(f"count:{query_class}", []),
+                              conn.count_all_matches, cursor, word, mode, None)
+
+            time_call(timings.setdefault("stats:overall", []), conn.get_overall_pos_stats, cursor)
+            for file_id in random.Random(run).sample(file_ids, min(WORDS_PER_CLASS, len(file_ids))):
+                time_call(timings.setdefault("stats:document", []), conn.get_document_pos_stats, cursor, file_id)
+            time_call(timings.setdefault("texts:summary", []), conn.get_all_texts_summary, cursor)
+            # Аннотации текста из doc_cache вместо повторного nlp(text)
+            for file_id in random.Random(run).sample(file_ids, min(WORDS_PER_CLASS, len(file_ids))):
+                time_call(timings.setdefault("doc_cache:load", []), conn.get_doc, cursor, file_id)
+        print()
+    finally:
+        reader.close()
+
+    return {name: latency_summary(samples) for name, samples in sorted(timings.items())}
+
+
+def run_db_benchmark(args):
+    """Полный бенчмарк базы: сборка (или готовая база через --existing), нагрузка, JSON с результатами."""
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "sqlite_version": sqlite3.sqlite_version,
+        "config": {"texts": args.texts, "copies": args.copies, "runs": args.runs,
+                   "words_per_class": args.words, "normalized": args.normalized,
+                   "existing": args.existing},
+    }
+
+    path = args.existing or BENCHMARK_DB_PATH
+    if args.existing:
+        print(f"Используется готовая база {path}, сборка пропущена.")
+    else:
+        results["ingest"] = build_benchmark_db(path, args.sources, args.texts, args.copies, args.normalized)
+        ingest_stats = results["ingest"]
+        print(f"Запись: {ingest_stats['rows']} строк за {ingest_stats['seconds']:.2f} с -> "
+              f"{ingest_stats['rows_per_sec']:.0f} rows/sec (без spaCy: {ingest_stats['write_rows_per_sec']:.0f} rows/sec), "
+              f"{ingest_stats['db_bytes'] / 2 ** 20:.1f} MiB")
+
+    from manager import DBConnection
+
+    # Создаёт недостающие индексы/триггеры/FTS, как при запуске менеджера: базе из --existing их может не хватать
+    conn = DBConnection(path)
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = db.cursor()
+        workload = choose_workload(cursor, args.words)
+        cursor.execute("SELECT type FROM sqlite_master WHERE name = 'wordforms'")
+        results["schema"] = "normalized" if cursor.fetchone()[0] == "view" else "plain"
+        cursor.execute("SELECT COUNT(*) FROM texts")
+        results["texts_in_db"] = cursor.fetchone()[0]
+        if not workload:
+            print("Ошибка: В базе нет словоформ для нагрузки.")
+            return None
+        results["search_plans"] = check_search_plans(cursor, workload)
+        results["workload"] = {query_class: [word for word, _ in queries] for query_class, queries in workload.items()}
+
+        print(f"Нагрузка запросов: {args.runs} прогонов, по {args.words} слов в классе...")
+        results["queries"] = run_query_workload(conn, path, workload, args.runs)
+    finally:
+        db.close()
+        conn.close()
+
+    print(f"\n{'Запрос':24} | {'n':>5} | {'p50, мс':>9} | {'p95, мс':>9} | {'p99, мс':>9}")
+    for name, summary in results["queries"].items():
+        print(f"{name:24} | {summary['n']:5} | {summary['p50_ms']:9.2f} | {summary['p95_ms']:9.2f} | "
+              f"{summary['p99_ms']:9.2f}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты записаны в {args.output}")
+
+    if not args.existing and not args.keep:
+        remove_database(path)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора spaCy; с --db - бенчмарк базы SQLite")
+    parser.add_argument("--db", action="store_true",
+                        help="собрать базу, замерить скорость записи и задержки запросов, записать JSON")
+    parser.add_argument("--sources", default=SOURCES_JSON_PATH, help="файл источников для сборки базы")
+    parser.add_argument("--texts", type=int, default=DB_BENCHMARK_TEXTS, help="текстов для разбора")
+    parser.add_argument("--copies", type=int, default=DB_BENCHMARK_COPIES,
+                        help="копий каждого текста в базе (увеличивает размер базы)")
+    parser.add_argument("--normalized", action="store_true", help="собрать базу в нормализованной схеме")
+    parser.add_argument("--existing", metavar="DB", help="не собирать базу, а замерить запросы к готовой")
+    parser.add_argument("--runs", type=int, default=QUERY_RUNS, help="повторов нагрузки запросов")
+    parser.add_argument("--words", type=int, default=WORDS_PER_CLASS, help="слов в каждом классе нагрузки")
+    parser.add_argument("--output", default=RESULTS_JSON_PATH, help="файл для результатов в JSON")
+    parser.add_argument("--keep", action="store_true", help="не удалять собранную базу после замера")
+    return parser.parse_args()
+
+
 # --- Основная часть скрипта ---
 if __name__ == "__main__":
+    cli_args = parse_args()
+    if cli_args.db:
+        print("--- Запуск Бенчмарка Базы Данных ---")
+        run_db_benchmark(cli_args)
+        exit()
+
     print("--- Запуск Бенчмарка NLP Обработки ---")
 
     # 1. Загрузка модели spaCy
@@ -0,0 +1,142 @@
+"""
+Bulk import of corrected wordforms.
+
+Accepted files:
+    .json  - {"<wordform_id>": {"wordform": ..., "lemma": ..., "morph": ..., "pos": ...}, ...}
+             (the format written by "Export Selected to JSON"), loaded whole
+    .jsonl - one entry per line, either {"wordform_id": ..., "wordform": ..., ...} or
+             {"<wordform_id>": {...}}, read line by line so the file can be larger than memory
+
+The file is validated completely before anything is written; the updates are then applied with
+executemany in chunks of IMPORT_CHUNK_SIZE inside a single transaction.
+"""
+import json
+
+from dictionary_schema import wordforms_table
+
+REQUIRED_FIELDS = ('wordform', 'lemma', 'morph', 'pos')
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_PROBLEMS = 10
+
+UPDATE_WORDFORM_SQL = """
+    UPDATE wordforms
+    SET wordform = ?, lemma = ?, morph = ?, pos = ?
+    WHERE wordform_id = ?
+"""
+
+
+class ImportFormatError(ValueError):
+    """The file itself cannot be read as an import file (bad JSON, wrong top-level type)."""
+
+
+def iter_import_entries(path):
+    """Yields (raw wordform_id, entry) pairs from a .json or .jsonl file."""
+    if not path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ImportFormatError(f"Failed to decode JSON file:\n{e}") from e
+        if not isinstance(data, dict):
+            raise ImportFormatError("The JSON file must contain a dictionary (key-value pairs representing "
+                                    "wordform_id: data) at the top level.")
+        yield from data.items()
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ImportFormatError(f"Line {line_number} is not valid JSON:\n{e}") from e
+            if not isinstance(record, dict):
+                raise ImportFormatError(f"Line {line_number} must contain a JSON object.")
+            if "wordform_id" in record:
+                yield record["wordform_id"], record
+            else:
+                yield from record.items()
+
+
+def validate_entry(wordform_id_raw, entry_data):
+    """
+    Returns the row (wordform, lemma, morph, pos, wordform_id) for UPDATE_WORDFORM_SQL,
+    with values cleaned the same way the import always did. Raises ValueError with the reason otherwise.
+    """
+    try:
+        wordform_id = int(wordform_id_raw)
+    except (ValueError, TypeError):
+        raise ValueError(f"invalid ID '{wordform_id_raw}' (not an integer)")
+
+    if not isinstance(entry_data, dict):
+        raise ValueError(f"invalid data format for ID {wordform_id} (expected dictionary, got {type(entry_data)})")
+
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in entry_data]
+    if missing_fields:
+        raise ValueError(f"incomplete data for ID {wordform_id} (missing fields: {', '.join(missing_fields)})")
+
+    return (
+        str(entry_data['wordform']).lower().strip(),
+        str(entry_data['lemma']).strip(),
+        str(entry_data['morph']).strip(),
+        str(entry_data['pos']).strip(),
+        wordform_id
+    )
+
+
+def iter_valid_rows(entries, report=None):
+    """Validated rows of the entries; invalid ones are counted (and the first few described) in report."""
+    for wordform_id_raw, entry_data in entries:
+        try:
+            row = validate_entry(wordform_id_raw, entry_data)
+        except ValueError as e:
+            if report is not None:
+                report["skipped"] += 1
+                if len(report["problems"]) < MAX_REPORTED_PROBLEMS:
+                    report["problems"].append(str(e))
+            continue
+        if report is not None:
+            report["valid"] += 1
+        yield row
+
+
+def validate_import_file(path):
+    """First pass over the file: counts valid and invalid entries without keeping them."""
+    report = {"valid": 0, "skipped": 0, "problems": []}
+    for _ in iter_valid_rows(iter_import_entries(path), report):
+        pass
+    return report
+
+
+def apply_import(cursor, rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Applies validated rows with executemany, chunk by chunk, in the caller's transaction.
+    Returns (updated, not_found) counted by distinct wordform_id.
+    """
+    table = wordforms_table(cursor)
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS import_ids (wordform_id INTEGER PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.import_ids")
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _apply_chunk(cursor, chunk)
+            chunk = []
+    if chunk:
+        _apply_chunk(cursor, chunk)
+
+    # rowcount is not reliable for executemany through the normalized view, so count by ids
+    cursor.execute(f"""
+        SELECT count(*), count(w.wordform_id) FROM temp.import_ids i
+        LEFT JOIN {table} w ON w.wordform_id = i.wordform_id
+    """)
+    total, updated = cursor.fetchone()
+    cursor.execute("DELETE FROM temp.import_ids")
+    return updated, total - updated
+
+
+def _apply_chunk(cursor, chunk):
+    cursor.executemany("INSERT OR IGNORE INTO temp.import_ids(wordform_id) VALUES (?)", [(row[4],) for row in chunk])
+    cursor.executemany(UPDATE_WORDFORM_SQL, chunk)
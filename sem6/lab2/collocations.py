@@ -0,0 +1,267 @@
+"""
+Lemma collocations of the corpus, computed by a batch job and read by the manager.
+
+Two lemmas co-occur when they are at most COLLOCATION_WINDOW tokens apart within one sentence
+(punctuation is skipped and does not take a place in the window). Pair counts are accumulated as
+int64 keys in numpy arrays, one document at a time, and reduced with np.unique every PAIR_CHUNK
+pairs, so memory grows with the number of distinct pairs rather than with the corpus.
+
+For every pair seen at least MIN_PAIR_COUNT times the job computes PMI and Dunning's log-likelihood
+ratio (G2) from the 2x2 contingency table of the pair counts. Only the top COLLOCATES_PER_LEMMA
+collocates of each lemma under each measure are kept, in `collocations`, whose primary key
+(lemma, measure, rank) makes a lookup a range scan of at most that many rows for any lemma.
+
+    python collocations.py [movies.db] [--window N] [--min-count N] [--top N]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+
+from corpus_matrices import ensure_doc_versions
+
+COLLOCATION_WINDOW = 5
+MIN_PAIR_COUNT = 3          # Rarer pairs get extreme PMI from chance alone
+COLLOCATES_PER_LEMMA = 20
+PAIR_CHUNK = 5_000_000      # Pair keys buffered before they are reduced
+MEASURES = ("llr", "pmi")
+COLLOCATION_EXCLUDED_POS = ("punctuation", "space")
+
+INSERT_COLLOCATION_SQL = """
+    INSERT INTO collocations (lemma, measure, rank, collocate, pair_count, pmi, llr) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def ensure_collocations(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS collocations (
+        lemma TEXT NOT NULL,
+        measure TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        collocate TEXT NOT NULL,
+        pair_count INTEGER NOT NULL,
+        pmi REAL NOT NULL,
+        llr REAL NOT NULL,
+        PRIMARY KEY (lemma, measure, rank)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS collocation_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+
+
+def corpus_stamp(cursor):
+    """Moves whenever texts are added, removed or re-annotated (see corpus_matrices.ensure_doc_versions)."""
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(file_id), 0) FROM texts")
+    texts, id_sum = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(SUM(version), 0) FROM doc_versions")
+    return [texts, id_sum, cursor.fetchone()[0]]
+
+
+def _iter_documents(cursor):
+    """Yields (sentence indexes, lemma strings) of each document in token order, punctuation removed."""
+    excluded = ", ".join(f"'{pos}'" for pos in COLLOCATION_EXCLUDED_POS)
+    cursor.execute(f"""
+        SELECT file_id, sent_index, lemma FROM wordforms
+        WHERE lemma IS NOT NULL AND lemma != '' AND (pos IS NULL OR pos NOT IN ({excluded}))
+        ORDER BY file_id, char_offset, wordform_id
+    """)
+    current, sentences, lemmas = None, [], []
+    for file_id, sent_index, lemma in cursor:
+        if file_id != current:
+            if lemmas:
+                yield sentences, lemmas
+            current, sentences, lemmas = file_id, [], []
+        # Rows without sentence spans (databases from before they existed) form one sentence
+        sentences.append(-1 if sent_index is None else sent_index)
+        lemmas.append(lemma)
+    if lemmas:
+        yield sentences, lemmas
+
+
+def _reduce(keys, counts):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def count_pairs(cursor, window=COLLOCATION_WINDOW):
+    """Returns (lemma strings, token count per lemma id, pair keys a << 32 | b, their counts), both directions."""
+    lemma_ids = {}
+    lemma_counts = []
+    keys = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(0, dtype=np.int64)
+    buffered, buffered_size = [], 0
+
+    for sentences, lemmas in _iter_documents(cursor):
+        ids = np.empty(len(lemmas), dtype=np.int64)
+        for position, lemma in enumerate(lemmas):
+            lemma_id = lemma_ids.get(lemma)
+            if lemma_id is None:
+                lemma_id = lemma_ids[lemma] = len(lemma_counts)
+                lemma_counts.append(0)
+            lemma_counts[lemma_id] += 1
+            ids[position] = lemma_id
+        sentence_ids = np.asarray(sentences, dtype=np.int64)
+
+        for distance in range(1, min(window, len(ids) - 1) + 1):
+            same_sentence = sentence_ids[:-distance] == sentence_ids[distance:]
+            left, right = ids[:-distance][same_sentence], ids[distance:][same_sentence]
+            different = left != right
+            left, right = left[different], right[different]
+            buffered.append((left << 32) | right)
+            buffered.append((right << 32) | left)
+            buffered_size += 2 * len(left)
+
+        if buffered_size >= PAIR_CHUNK:
+            keys, counts = _reduce(np.concatenate([keys, *buffered]),
+                                   np.concatenate([counts, np.ones(buffered_size, dtype=np.int64)]))
+            buffered, buffered_size = [], 0
+
+    if buffered:
+        keys, counts = _reduce(np.concatenate([keys, *buffered]),
+                               np.concatenate([counts, np.ones(buffered_size, dtype=np.int64)]))
+    lemmas = [None] * len(lemma_ids)
+    for lemma, lemma_id in lemma_ids.items():
+        lemmas[lemma_id] = lemma
+    return lemmas, np.asarray(lemma_counts, dtype=np.int64), keys, counts
+
+
+def _xlogx_ratio(observed, expected):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(observed > 0, observed * np.log(observed / expected), 0.0)
+
+
+def score_pairs(keys, counts, min_count=MIN_PAIR_COUNT):
+    """(first ids, second ids, counts, pmi, llr) of the pairs seen at least min_count times."""
+    first, second = keys >> 32, keys & 0xFFFFFFFF
+    # Marginals of the pair table; pairs are counted in both directions, so rows and columns agree
+    totals = np.bincount(first, weights=counts)
+    total = counts.sum()
+
+    keep = counts >= min_count
+    first, second, k11 = first[keep], second[keep], counts[keep].astype(np.float64)
+    row, column = totals[first], totals[second]
+    pmi = np.log2(k11 * total / (row * column))
+
+    k12, k21 = row - k11, column - k11
+    k22 = total - k11 - k12 - k21
+    observed = (k11, k12, k21, k22)
+    expected = (row * column / total, row * (total - column) / total,
+                (total - row) * column / total, (total - row) * (total - column) / total)
+    llr = 2 * sum(_xlogx_ratio(o, e) for o, e in zip(observed, expected))
+    # G2 does not tell attraction from repulsion, keep only pairs seen more often than expected
+    llr = np.where(k11 > expected[0], llr, -llr)
+    return first, second, k11.astype(np.int64), pmi, llr
+
+
+def top_collocates(first, scores, top):
+    """Indexes of the top scored pairs of each first lemma and their ranks (0 = best)."""
+    order = np.lexsort((-scores, first))
+    grouped = first[order]
+    starts = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+    ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    keep = ranks < top
+    return order[keep], ranks[keep]
+
+
+def build_collocations(cursor, window=COLLOCATION_WINDOW, min_count=MIN_PAIR_COUNT, top=COLLOCATES_PER_LEMMA):
+    """
+    Recomputes the collocations table. Must run inside a transaction, the caller commits.
+    Returns the summary stored in collocation_state.
+    """
+    ensure_collocations(cursor)
+    ensure_doc_versions(cursor)
+    stamp = corpus_stamp(cursor)
+    start_time = time.perf_counter()
+    lemmas, lemma_counts, keys, counts = count_pairs(cursor, window)
+    first, second, pair_counts, pmi, llr = score_pairs(keys, counts, min_count)
+
+    cursor.execute("DELETE FROM collocations")
+    for measure, scores in (("llr", llr), ("pmi", pmi)):
+        positive = scores > 0
+        indexes, ranks = top_collocates(first[positive], scores[positive], top)
+        selected = np.flatnonzero(positive)[indexes]
+        cursor.executemany(INSERT_COLLOCATION_SQL, (
+            (lemmas[first[i]], measure, int(rank), lemmas[second[i]], int(pair_counts[i]), float(pmi[i]), float(llr[i]))
+            for i, rank in zip(selected.tolist(), ranks.tolist())
+        ))
+
+    summary = {
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "stamp": stamp,
+        "window": window,
+        "min_count": min_count,
+        "top": top,
+        "tokens": int(lemma_counts.sum()),
+        "lemmas": len(lemmas),
+        "pairs": int(len(keys)),
+        "scored_pairs": int(len(first)),
+        "seconds": round(time.perf_counter() - start_time, 2),
+    }
+    cursor.execute("INSERT OR REPLACE INTO collocation_state(key, value) VALUES ('summary', ?)",
+                   (json.dumps(summary),))
+    return summary
+
+
+def collocation_summary(cursor):
+    """The summary of the last build, with 'outdated' set if texts changed since, or None if never built."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'collocation_state'")
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute("SELECT value FROM collocation_state WHERE key = 'summary'")
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    summary = json.loads(row[0])
+    summary["outdated"] = summary.get("stamp") != corpus_stamp(cursor)
+    return summary
+
+
+def find_collocates(cursor, lemma, measure="llr", limit=COLLOCATES_PER_LEMMA):
+    """Top collocates of lemma from the collocations table: (collocate, pair_count, pmi, llr) rows."""
+    if measure not in MEASURES:
+        raise ValueError(f"Unknown measure '{measure}', expected one of: {', '.join(MEASURES)}")
+    cursor.execute("""
+        SELECT collocate, pair_count, pmi, llr FROM collocations
+        WHERE lemma = ? AND measure = ? ORDER BY rank LIMIT ?
+    """, (lemma, measure, limit))
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Расчёт коллокаций лемм корпуса")
+    parser.add_argument("path", nargs="?", default="movies.db", help="файл базы")
+    parser.add_argument("--window", type=int, default=COLLOCATION_WINDOW, help="окно в токенах")
+    parser.add_argument("--min-count", type=int, default=MIN_PAIR_COUNT, help="минимальная частота пары")
+    parser.add_argument("--top", type=int, default=COLLOCATES_PER_LEMMA, help="коллокатов на лемму")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Ошибка: база {args.path} не найдена.")
+        return
+    db = sqlite3.connect(args.path, isolation_level=None)
+    cursor = db.cursor()
+    print(f"Расчёт коллокаций (окно {args.window}, частота пары >= {args.min_count})...")
+    cursor.execute("BEGIN")
+    try:
+        summary = build_collocations(cursor, args.window, args.min_count, args.top)
+        cursor.execute("COMMIT")
+    except sqlite3.Error as e:
+        cursor.execute("ROLLBACK")
+        print(f"Ошибка расчёта, база не изменена: {e}")
+        return
+    finally:
+        db.close()
+    print(f"Готово за {summary['seconds']:.1f} с: {summary['tokens']} токенов, {summary['lemmas']} лемм, "
+          f"{summary['pairs']} пар, из них {summary['scored_pairs']} с частотой >= {args.min_count}.")
+
+
+if __name__ == "__main__":
+    main()
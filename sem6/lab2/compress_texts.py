@@ -0,0 +1,100 @@
+"""
+Переносит тексты существующей movies.db в сжатую таблицу text_blobs (см. text_store.py)
+и замеряет размер базы и время чтения метаданных и текстов до и после.
+
+    python compress_texts.py [movies.db] [--codec zlib|lzma]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import time
+
+from migrate_normalized import DB_PATH, MAKE_BACKUP, TIMING_RUNS, database_size
+from text_store import CODECS, DEFAULT_CODEC, TEXT_CACHE, is_compressed, migrate_to_compressed, read_text
+
+
+def measure_reads(db, file_ids):
+    """Медианы: метаданные всех текстов, один текст без кэша и один текст из кэша."""
+    cursor = db.cursor()
+    durations = {"all_metadata": [], "text_cold": [], "text_cached": []}
+    for run in range(TIMING_RUNS):
+        start_time = time.perf_counter()
+        cursor.execute("SELECT file_id, title, genre, date, country FROM texts").fetchall()
+        durations["all_metadata"].append(time.perf_counter() - start_time)
+
+        file_id = file_ids[run % len(file_ids)]
+        TEXT_CACHE.clear()
+        start_time = time.perf_counter()
+        read_text(cursor, file_id)
+        durations["text_cold"].append(time.perf_counter() - start_time)
+        start_time = time.perf_counter()
+        read_text(cursor, file_id)
+        durations["text_cached"].append(time.perf_counter() - start_time)
+    return {name: statistics.median(values) for name, values in durations.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сжатие текстов movies.db в text_blobs")
+    parser.add_argument("path", nargs="?", default=DB_PATH, help="файл базы")
+    parser.add_argument("--codec", choices=CODECS, default=DEFAULT_CODEC, help="алгоритм сжатия")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Ошибка: база {args.path} не найдена.")
+        return
+
+    db = sqlite3.connect(args.path, isolation_level=None)
+    db.execute("PRAGMA foreign_keys = ON;")
+    if is_compressed(db.cursor()):
+        print(f"Тексты {args.path} уже сжаты.")
+        db.close()
+        return
+
+    file_ids = [row[0] for row in db.execute("SELECT file_id FROM texts ORDER BY length(text) DESC LIMIT 5")]
+    if not file_ids:
+        print(f"В {args.path} нет текстов.")
+        db.close()
+        return
+    size_before = database_size(db)
+    timings_before = measure_reads(db, file_ids)
+
+    if MAKE_BACKUP:
+        # analyze.py keeps the database in WAL mode, move everything into the main file first
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.close()
+        shutil.copyfile(args.path, args.path + ".bak")
+        print(f"Резервная копия: {args.path}.bak")
+        db = sqlite3.connect(args.path, isolation_level=None)
+        db.execute("PRAGMA foreign_keys = ON;")
+
+    print(f"Сжатие текстов ({args.codec})...")
+    start_time = time.perf_counter()
+    cursor = db.cursor()
+    cursor.execute("BEGIN")
+    try:
+        migrate_to_compressed(cursor, args.codec)
+        cursor.execute("COMMIT")
+    except sqlite3.Error as e:
+        cursor.execute("ROLLBACK")
+        print(f"Ошибка сжатия, база не изменена: {e}")
+        db.close()
+        return
+    print("VACUUM...")
+    cursor.execute("VACUUM")
+    print(f"Сжатие завершено за {time.perf_counter() - start_time:.1f} с.")
+
+    size_after = database_size(db)
+    timings_after = measure_reads(db, file_ids)
+    db.close()
+
+    print(f"\nРазмер базы: {size_before / 2 ** 20:.1f} MiB -> {size_after / 2 ** 20:.1f} MiB "
+          f"({size_after / size_before:.0%})")
+    print(f"{'Чтение':22} | {'до, мс':>9} | {'после, мс':>9}")
+    for name in timings_before:
+        print(f"{name:22} | {timings_before[name] * 1000:9.2f} | {timings_after[name] * 1000:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
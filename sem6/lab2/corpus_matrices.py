@@ -0,0 +1,339 @@
+"""
+Document x POS and document x lemma count matrices for corpus-wide statistics.
+
+pos_counts is a dense (documents x POS tags) array; the lemma counts are a CSR matrix kept as three
+arrays (lemma_indptr, lemma_indices, lemma_data), so numpy alone is enough to use them. Both are
+built in one pass over `wordforms` ordered by file_id and saved as .npy files in <db>.matrices/,
+which are opened memory-mapped. Punctuation is left out of the lemma matrix.
+
+doc_versions(file_id, version) is bumped by triggers whenever a text is rewritten or its wordform
+rows are edited or deleted. A refresh compares it with the versions the matrices were built at and
+re-reads only the changed and new documents. Columns are only ever appended, like search_terms.
+
+Every save writes a new generation of files and then switches matrices.json to it, so a reader
+that still has the previous files mapped is never affected (on Windows they cannot be replaced).
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from dictionary_schema import is_normalized
+
+MATRICES_SUFFIX = ".matrices"
+MATRICES_VERSION = 1
+LEMMA_EXCLUDED_POS = ("punctuation", "space")
+REBUILD_FRACTION = 0.5      # More changed documents than this share: rebuild instead of patching
+GROUP_COLUMNS = ("genre", "country", "decade")
+SIMILAR_TEXTS = 10
+
+_refresh_lock = threading.Lock()
+
+
+def _bump_statement(file_id_sql):
+    return f"""
+        INSERT INTO doc_versions(file_id, version) SELECT {file_id_sql}, 1 WHERE {file_id_sql} IS NOT NULL
+        ON CONFLICT(file_id) DO UPDATE SET version = version + 1;"""
+
+
+def ensure_doc_versions(cursor):
+    """Creates doc_versions and the triggers that bump it. Inserts are not watched: new texts are new rows."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS doc_versions (
+        file_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS texts_versions_au AFTER UPDATE OF text ON texts BEGIN
+        {_bump_statement("new.file_id")}
+    END
+    """)
+    if is_normalized(cursor):
+        table, columns = "wordforms_data", "lemma_id, pos_id, file_id"
+    else:
+        table, columns = "wordforms", "lemma, pos, file_id"
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_versions_ad AFTER DELETE ON {table} BEGIN
+        {_bump_statement("old.file_id")}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_versions_au AFTER UPDATE OF {columns} ON {table} BEGIN
+        {_bump_statement("old.file_id")}
+        {_bump_statement("new.file_id")}
+    END
+    """)
+
+
+def matrices_dir(db_path):
+    return db_path + MATRICES_SUFFIX
+
+
+class CorpusMatrices:
+
+    def __init__(self, doc_ids, versions, pos_tags, lemmas, pos_counts, lemma_indptr, lemma_indices, lemma_data,
+                 generation=0):
+        self.doc_ids = doc_ids
+        self.versions = versions
+        self.pos_tags = pos_tags
+        self.lemmas = lemmas
+        self.pos_counts = pos_counts
+        self.lemma_indptr = lemma_indptr
+        self.lemma_indices = lemma_indices
+        self.lemma_data = lemma_data
+        self.generation = generation
+        self.rows = {int(file_id): row for row, file_id in enumerate(doc_ids)}
+        self._weights = None  # tf-idf values aligned with lemma_indices, computed on first use
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def lemma_row(self, row):
+        start, end = self.lemma_indptr[row], self.lemma_indptr[row + 1]
+        return self.lemma_indices[start:end], self.lemma_data[start:end]
+
+    def group_pos_stats(self, groups):
+        """
+        groups: name -> file_ids. Returns (name, documents, tokens, {pos: share}) per group, largest first.
+        A document may belong to several groups.
+        """
+        stats = []
+        for name, file_ids in groups.items():
+            rows = [self.rows[file_id] for file_id in file_ids if file_id in self.rows]
+            if not rows:
+                continue
+            totals = self.pos_counts[rows].sum(axis=0)
+            tokens = int(totals.sum())
+            shares = {pos: int(count) / tokens for pos, count in zip(self.pos_tags, totals) if count} if tokens else {}
+            stats.append((name, len(rows), tokens, shares))
+        stats.sort(key=lambda item: -item[2])
+        return stats
+
+    def _tfidf(self):
+        if self._weights is None:
+            document_frequency = np.bincount(self.lemma_indices, minlength=len(self.lemmas))
+            # Smoothed idf: a lemma found in every text still counts a little
+            idf = np.log((1 + len(self)) / (1 + document_frequency)) + 1.0
+            weights = (1.0 + np.log(self.lemma_data)) * idf[self.lemma_indices]
+            row_of_value = np.repeat(np.arange(len(self)), np.diff(self.lemma_indptr))
+            norms = np.sqrt(np.bincount(row_of_value, weights=weights ** 2, minlength=len(self)))
+            self._weights = (weights, row_of_value, norms)
+        return self._weights
+
+    def similar(self, file_id, k=SIMILAR_TEXTS):
+        """Up to k (file_id, cosine similarity of tf-idf lemma vectors) pairs, most similar first."""
+        row = self.rows.get(file_id)
+        if row is None:
+            return []
+        weights, row_of_value, norms = self._tfidf()
+        start, end = self.lemma_indptr[row], self.lemma_indptr[row + 1]
+        if norms[row] == 0:
+            return []
+        query = np.zeros(len(self.lemmas))
+        query[self.lemma_indices[start:end]] = weights[start:end]
+        dots = np.bincount(row_of_value, weights=query[self.lemma_indices] * weights, minlength=len(self))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(norms > 0, dots / (norms * norms[row]), 0.0)
+        scores[row] = -1.0
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [(int(self.doc_ids[i]), float(scores[i])) for i in best if scores[i] > 0]
+
+
+def _scan_documents(cursor, file_ids=None):
+    """Yields (file_id, pos Counter, lemma Counter) per document in one pass ordered by file_id."""
+    where = ""
+    params = ()
+    if file_ids is not None:
+        where = "WHERE file_id IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(sorted(file_ids)),)
+    cursor.execute(f"SELECT file_id, pos, lemma FROM wordforms {where} ORDER BY file_id", params)
+    current, pos_counts, lemma_counts = None, Counter(), Counter()
+    for file_id, pos, lemma in cursor:
+        if file_id != current:
+            if current is not None:
+                yield current, pos_counts, lemma_counts
+            current, pos_counts, lemma_counts = file_id, Counter(), Counter()
+        if pos:
+            pos_counts[pos] += 1
+        if lemma and pos not in LEMMA_EXCLUDED_POS:
+            lemma_counts[lemma] += 1
+    if current is not None:
+        yield current, pos_counts, lemma_counts
+
+
+def _current_versions(cursor):
+    cursor.execute("""
+        SELECT t.file_id, COALESCE(v.version, 0) FROM texts t
+        LEFT JOIN doc_versions v ON v.file_id = t.file_id
+        ORDER BY t.file_id
+    """)
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def _assemble(versions, pos_tags, lemmas, parsed, previous=None):
+    """
+    Matrices with one row per file_id in versions: rows of documents in parsed (file_id -> counters)
+    are built from the counters, all others are copied from previous.
+    """
+    pos_index = {pos: column for column, pos in enumerate(pos_tags)}
+    lemma_index = {lemma: column for column, lemma in enumerate(lemmas)}
+    for pos_counter, lemma_counter in parsed.values():
+        for pos in pos_counter:
+            if pos not in pos_index:
+                pos_index[pos] = len(pos_tags)
+                pos_tags.append(pos)
+        for lemma in lemma_counter:
+            if lemma not in lemma_index:
+                lemma_index[lemma] = len(lemmas)
+                lemmas.append(lemma)
+
+    doc_ids = np.fromiter(versions, dtype=np.int64, count=len(versions))
+    pos_counts = np.zeros((len(doc_ids), len(pos_tags)), dtype=np.int32)
+    indptr = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+    index_parts, data_parts = [], []
+    for row, file_id in enumerate(versions):
+        if file_id in parsed:
+            pos_counter, lemma_counter = parsed[file_id]
+            for pos, count in pos_counter.items():
+                pos_counts[row, pos_index[pos]] = count
+            columns = np.fromiter((lemma_index[lemma] for lemma in lemma_counter), dtype=np.int32,
+                                  count=len(lemma_counter))
+            counts = np.fromiter(lemma_counter.values(), dtype=np.int32, count=len(lemma_counter))
+            order = np.argsort(columns)
+            columns, counts = columns[order], counts[order]
+        elif previous is not None and file_id in previous.rows:
+            old_row = previous.rows[file_id]
+            pos_counts[row, :previous.pos_counts.shape[1]] = previous.pos_counts[old_row]
+            columns, counts = (np.array(part) for part in previous.lemma_row(old_row))
+        else:
+            columns, counts = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)  # Text without wordforms
+        index_parts.append(columns)
+        data_parts.append(counts)
+        indptr[row + 1] = indptr[row] + len(columns)
+
+    lemma_indices = np.concatenate(index_parts) if index_parts else np.zeros(0, dtype=np.int32)
+    lemma_data = np.concatenate(data_parts) if data_parts else np.zeros(0, dtype=np.int32)
+    version_array = np.fromiter(versions.values(), dtype=np.int64, count=len(versions))
+    return CorpusMatrices(doc_ids, version_array, pos_tags, lemmas, pos_counts, indptr,
+                          lemma_indices.astype(np.int32), lemma_data.astype(np.int32))
+
+
+ARRAY_NAMES = ("doc_ids", "versions", "pos_counts", "lemma_indptr", "lemma_indices", "lemma_data")
+
+
+def save_matrices(db_path, matrices):
+    directory = matrices_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    matrices.generation += 1
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(directory, f"{name}.{matrices.generation}.npy"), getattr(matrices, name))
+    meta_path = os.path.join(directory, "matrices.json")
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": MATRICES_VERSION, "generation": matrices.generation,
+                   "pos_tags": matrices.pos_tags, "lemmas": matrices.lemmas}, f, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    for path in glob.glob(os.path.join(directory, "*.npy")):
+        if not path.endswith(f".{matrices.generation}.npy"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Still mapped by a reader, removed by a later save
+
+
+def load_matrices(db_path):
+    """The saved matrices, memory-mapped, or None if there are none."""
+    directory = matrices_dir(db_path)
+    try:
+        with open(os.path.join(directory, "matrices.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != MATRICES_VERSION:
+            return None
+        generation = meta["generation"]
+        arrays = {name: np.load(os.path.join(directory, f"{name}.{generation}.npy"), mmap_mode="r")
+                  for name in ARRAY_NAMES}
+    except (OSError, ValueError, KeyError):
+        return None
+    return CorpusMatrices(pos_tags=meta["pos_tags"], lemmas=meta["lemmas"], generation=generation, **arrays)
+
+
+def refresh_matrices(cursor, db_path, current=None, rebuild=False):
+    """
+    Brings the saved matrices of db_path up to date and returns them. Only documents whose version
+    changed since the last save are read from the database, unless rebuild is set; current avoids
+    reloading the files.
+    """
+    with _refresh_lock:
+        # Versions are read before the rows: a text changed in between is simply re-read next time
+        versions = _current_versions(cursor)
+        matrices = current if current is not None else load_matrices(db_path)
+        if matrices is not None and not rebuild:
+            stored = dict(zip(matrices.doc_ids.tolist(), matrices.versions.tolist()))
+            changed = {file_id for file_id, version in versions.items() if stored.get(file_id) != version}
+            if not changed and len(stored) == len(versions):
+                return matrices
+            if len(changed) <= REBUILD_FRACTION * len(versions):
+                parsed = {file_id: (pos, lemmas) for file_id, pos, lemmas in _scan_documents(cursor, changed)}
+                for file_id in changed:
+                    parsed.setdefault(file_id, (Counter(), Counter()))
+                updated = _assemble(versions, list(matrices.pos_tags), list(matrices.lemmas), parsed, matrices)
+                updated.generation = matrices.generation
+                save_matrices(db_path, updated)
+                return updated
+
+        parsed = {file_id: (pos, lemmas) for file_id, pos, lemmas in _scan_documents(cursor)}
+        rebuilt = _assemble(versions, [], [], parsed)
+        rebuilt.generation = matrices.generation if matrices is not None else 0
+        save_matrices(db_path, rebuilt)
+        return rebuilt
+
+
+def group_documents(cursor, column):
+    """file_ids per value of genre / country (comma-separated lists) or decade (from date)."""
+    if column not in GROUP_COLUMNS:
+        raise ValueError(f"Unknown group column '{column}', expected one of: {', '.join(GROUP_COLUMNS)}")
+    source = "date" if column == "decade" else column
+    cursor.execute(f"SELECT file_id, {source} FROM texts")
+    groups = {}
+    for file_id, value in cursor.fetchall():
+        if column == "decade":
+            year = (value or "").strip()[:4]
+            names = [f"{int(year) // 10 * 10}s"] if year.isdigit() else ["unknown"]
+        else:
+            names = [name.strip() for name in (value or "").split(",") if name.strip()] or ["unknown"]
+        for name in names:
+            groups.setdefault(name, []).append(file_id)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка матриц документ x POS и документ x лемма")
+    parser.add_argument("path", nargs="?", default="movies.db", help="файл базы")
+    parser.add_argument("--rebuild", action="store_true", help="собрать заново, а не обновить")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Ошибка: база {args.path} не найдена.")
+        return
+    db = sqlite3.connect(args.path)
+    try:
+        ensure_doc_versions(db.cursor())
+        db.commit()
+        start_time = time.perf_counter()
+        matrices = refresh_matrices(db.cursor(), args.path, rebuild=args.rebuild)
+    finally:
+        db.close()
+    print(f"Матрицы {matrices_dir(args.path)}: {len(matrices)} документов, {len(matrices.pos_tags)} POS, "
+          f"{len(matrices.lemmas)} лемм, {len(matrices.lemma_data)} ненулевых, "
+          f"{time.perf_counter() - start_time:.2f} с.")
+
+
+if __name__ == "__main__":
+    main()
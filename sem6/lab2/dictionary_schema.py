@@ -0,0 +1,182 @@
+"""
+Normalized storage for wordforms.
+
+lemma, morph, pos and dep repeat the same few thousand strings across millions of rows. In the
+normalized layout they are interned into small dictionary tables and `wordforms_data` keeps
+integer ids only. `wordforms` becomes a view with the old columns, and INSTEAD OF triggers let
+the existing INSERT/UPDATE/DELETE statements run against it unchanged.
+
+SQLite reports rowcount 0 for statements handled by INSTEAD OF triggers, so code that needs the
+number of changed rows uses update_wordform_row / delete_wordform_rows, which write to
+`wordforms_data` directly in normalized mode.
+"""
+
+# (table, id column, value column) - value column matches the column name in the wordforms view
+DICTIONARIES = (
+    ("lemmas", "lemma_id", "lemma"),
+    ("morphs", "morph_id", "morph"),
+    ("pos_tags", "pos_id", "pos"),
+    ("deps", "dep_id", "dep"),
+)
+
+
+def is_normalized(cursor):
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'wordforms'")
+    row = cursor.fetchone()
+    return row is not None and row[0] == "view"
+
+
+def _lookup(table, id_column, value_column, value_sql):
+    return f"(SELECT {id_column} FROM {table} WHERE {value_column} = {value_sql})"
+
+
+def _intern_statements(prefix="new."):
+    # NULL values are skipped by OR IGNORE (NOT NULL) and end up as NULL ids
+    return "\n".join(f"INSERT OR IGNORE INTO {table}({value}) VALUES ({prefix}{value});"
+                     for table, _, value in DICTIONARIES)
+
+
+def create_normalized_tables(cursor):
+    for table, id_column, value_column in DICTIONARIES:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            {id_column} INTEGER PRIMARY KEY,
+            {value_column} TEXT UNIQUE NOT NULL
+        )
+        """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS wordforms_data (
+        wordform_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        wordform TEXT,
+        lemma_id INTEGER REFERENCES lemmas(lemma_id),
+        morph_id INTEGER REFERENCES morphs(morph_id),
+        pos_id INTEGER REFERENCES pos_tags(pos_id),
+        dep_id INTEGER REFERENCES deps(dep_id),
+        file_id INTEGER,
+        char_offset INTEGER,
+        sent_index INTEGER,
+        FOREIGN KEY (file_id) REFERENCES texts(file_id) ON DELETE CASCADE
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_data_file_id ON wordforms_data(file_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_data_wordform ON wordforms_data(wordform);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_data_lemma_id ON wordforms_data(lemma_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordforms_data_pos_id ON wordforms_data(pos_id);")
+
+
+def create_wordforms_view(cursor):
+    """The compatibility view; must be created after a `wordforms` table of the same name is gone."""
+    cursor.execute("""
+    CREATE VIEW IF NOT EXISTS wordforms AS
+    SELECT d.wordform_id, d.wordform, l.lemma, m.morph, p.pos, dp.dep, d.file_id, d.char_offset, d.sent_index
+    FROM wordforms_data d
+    LEFT JOIN lemmas l ON l.lemma_id = d.lemma_id
+    LEFT JOIN morphs m ON m.morph_id = d.morph_id
+    LEFT JOIN pos_tags p ON p.pos_id = d.pos_id
+    LEFT JOIN deps dp ON dp.dep_id = d.dep_id
+    """)
+
+    ids = ", ".join(_lookup(table, id_column, value, f"new.{value}") for table, id_column, value in DICTIONARIES)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS wordforms_view_insert INSTEAD OF INSERT ON wordforms BEGIN
+        {_intern_statements()}
+        INSERT INTO wordforms_data (wordform_id, wordform, lemma_id, morph_id, pos_id, dep_id,
+                                    file_id, char_offset, sent_index)
+        VALUES (new.wordform_id, new.wordform, {ids}, new.file_id, new.char_offset, new.sent_index);
+    END
+    """)
+
+    assignments = ", ".join(f"{id_column} = {_lookup(table, id_column, value, f'new.{value}')}"
+                            for table, id_column, value in DICTIONARIES)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS wordforms_view_update INSTEAD OF UPDATE ON wordforms BEGIN
+        {_intern_statements()}
+        UPDATE wordforms_data
+        SET wordform = new.wordform, {assignments},
+            file_id = new.file_id, char_offset = new.char_offset, sent_index = new.sent_index
+        WHERE wordform_id = old.wordform_id;
+    END
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS wordforms_view_delete INSTEAD OF DELETE ON wordforms BEGIN
+        DELETE FROM wordforms_data WHERE wordform_id = old.wordform_id;
+    END
+    """)
+
+
+def create_normalized_schema(cursor):
+    create_normalized_tables(cursor)
+    create_wordforms_view(cursor)
+
+
+def migrate_to_normalized(cursor):
+    """
+    Converts a database with a plain `wordforms` table to the normalized layout, keeping wordform_ids.
+    Must run inside a transaction; the caller commits (and ideally VACUUMs) afterwards.
+    """
+    if is_normalized(cursor):
+        return False
+
+    create_normalized_tables(cursor)
+    for table, _, value in DICTIONARIES:
+        cursor.execute(f"INSERT OR IGNORE INTO {table}({value}) "
+                       f"SELECT DISTINCT {value} FROM wordforms WHERE {value} IS NOT NULL")
+
+    cursor.execute("""
+    INSERT INTO wordforms_data (wordform_id, wordform, lemma_id, morph_id, pos_id, dep_id,
+                                file_id, char_offset, sent_index)
+    SELECT w.wordform_id, w.wordform, l.lemma_id, m.morph_id, p.pos_id, dp.dep_id,
+           w.file_id, w.char_offset, w.sent_index
+    FROM wordforms w
+    LEFT JOIN lemmas l ON l.lemma = w.lemma
+    LEFT JOIN morphs m ON m.morph = w.morph
+    LEFT JOIN pos_tags p ON p.pos = w.pos
+    LEFT JOIN deps dp ON dp.dep = w.dep
+    """)
+
+    # Drops the old indexes and search triggers too; ensure_search_index recreates the triggers
+    cursor.execute("DROP TABLE wordforms")
+    create_wordforms_view(cursor)
+    return True
+
+
+def update_wordform_row(cursor, wordform_id, data):
+    """UPDATE of wordform, lemma, morph, pos for one row. Returns the number of updated rows."""
+    values = (data['wordform'], data['lemma'], data['morph'], data['pos'])
+    if not is_normalized(cursor):
+        cursor.execute("""
+            UPDATE wordforms
+            SET wordform = ?, lemma = ?, morph = ?, pos = ?
+            WHERE wordform_id = ?
+        """, (*values, wordform_id))
+        return cursor.rowcount
+
+    for (table, _, value_column), value in zip(DICTIONARIES, values[1:]):
+        cursor.execute(f"INSERT OR IGNORE INTO {table}({value_column}) VALUES (?)", (value,))
+    cursor.execute(f"""
+        UPDATE wordforms_data
+        SET wordform = ?,
+            lemma_id = {_lookup("lemmas", "lemma_id", "lemma", "?")},
+            morph_id = {_lookup("morphs", "morph_id", "morph", "?")},
+            pos_id = {_lookup("pos_tags", "pos_id", "pos", "?")}
+        WHERE wordform_id = ?
+    """, (*values, wordform_id))
+    return cursor.rowcount
+
+
+def wordforms_table(cursor):
+    """
+    The table holding the wordform rows. wordform_id, wordform, file_id, char_offset and sent_index
+    have the same names in both layouts, so statements touching only those can use it directly.
+    """
+    return "wordforms_data" if is_normalized(cursor) else "wordforms"
+
+
+def delete_wordform_rows(cursor, column, value):
+    """DELETE of the wordforms whose column (wordform_id or file_id) equals value. Returns the number of deleted rows."""
+    if column not in ("wordform_id", "file_id"):
+        raise ValueError(f"Cannot delete wordforms by column '{column}'")
+    cursor.execute(f"DELETE FROM {wordforms_table(cursor)} WHERE {column} = ?", (value,))
+    return cursor.rowcount
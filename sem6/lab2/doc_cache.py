@@ -0,0 +1,94 @@
+"""
+Parsed spaCy documents stored next to the texts, so annotations can be reloaded without re-parsing.
+
+doc_cache holds one serialized DocBin per text together with the hash of the text it was parsed
+from and the pipeline profile. A cached Doc is returned only while the stored hash still matches
+the current text, so a text changed by any means is never served stale; manager.py additionally
+deletes (or replaces) the entry in the same transaction that changes the text.
+
+Loading needs no model: the DocBin carries its strings, and a blank English vocab is enough to
+restore tokens, lemmas, POS, morphology, dependencies and sentence boundaries.
+"""
+import hashlib
+
+import spacy
+from spacy.tokens import DocBin
+
+from text_store import read_text
+
+INSERT_DOC_SQL = """
+    INSERT OR REPLACE INTO doc_cache (file_id, text_hash, profile, spacy_version, data) VALUES (?, ?, ?, ?, ?)
+"""
+
+_blank_vocab = None
+
+
+def ensure_doc_cache(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS doc_cache (
+        file_id INTEGER PRIMARY KEY,
+        text_hash TEXT NOT NULL,
+        profile TEXT,
+        spacy_version TEXT,
+        data BLOB NOT NULL,
+        FOREIGN KEY (file_id) REFERENCES texts(file_id) ON DELETE CASCADE
+    )
+    """)
+
+
+def text_hash(text):
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def blank_vocab():
+    global _blank_vocab
+    if _blank_vocab is None:
+        _blank_vocab = spacy.blank("en").vocab
+    return _blank_vocab
+
+
+def serialize_doc(file_id, doc, profile):
+    """The row for INSERT_DOC_SQL."""
+    doc_bin = DocBin(docs=[doc], store_user_data=False)
+    return file_id, text_hash(doc.text), profile, spacy.__version__, doc_bin.to_bytes()
+
+
+def store_docs(cursor, rows):
+    """rows from serialize_doc."""
+    cursor.executemany(INSERT_DOC_SQL, rows)
+
+
+def invalidate_doc(cursor, file_id):
+    cursor.execute("DELETE FROM doc_cache WHERE file_id = ?", (file_id,))
+
+
+def _restore(data, vocab):
+    return next(DocBin().from_bytes(data).get_docs(vocab or blank_vocab()))
+
+
+def load_doc(cursor, file_id, vocab=None, text=None):
+    """The cached Doc of file_id, or None if there is none or the text changed since it was parsed."""
+    cursor.execute("SELECT text_hash, data FROM doc_cache WHERE file_id = ?", (file_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    stored_hash, data = row
+    if text is None:
+        text = read_text(cursor, file_id)
+    if stored_hash != text_hash(text):
+        return None
+    return _restore(data, vocab)
+
+
+def iter_cached_docs(cursor, vocab=None, file_ids=None):
+    """
+    Yields (file_id, doc) for every text with an up-to-date cached Doc (or only for file_ids).
+    Stale entries are skipped; use load_doc per text to tell the two cases apart.
+    """
+    if file_ids is None:
+        cursor.execute("SELECT file_id FROM doc_cache ORDER BY file_id")
+        file_ids = [row[0] for row in cursor.fetchall()]
+    for file_id in file_ids:
+        doc = load_doc(cursor, file_id, vocab)
+        if doc is not None:
+            yield file_id, doc
@@ -1,47 +1,83 @@
 MOVIES_SOURCES_PATH = "movies_sources.txt"
 MOVIES_TEXTS_PATH = "movies_text.txt"
+SOURCES_PATH = "sources.jsonl"
 
 import json
+import os
 
+from sources import WRITING_SUFFIX
 
-def generate_sources_list():
-  with open(MOVIES_SOURCES_PATH, encoding="utf-8", errors="ignore") as file:
-    raw = file.readlines()
-  raw = map(lambda x: x.strip("\n"), raw)
-  raw = list(raw)[3:]
 
+def generate_sources_list():
+  """Metadata of every movie by file_id. One short line per movie, small enough to keep in memory."""
   sources = {}
-  for line in raw:
-    splitted = line.split("\t")
-    source = {
-      "text_id": splitted[0],
-      "file_id": splitted[1],
-      "#words": splitted[2],
-      "genre": splitted[3],
-      "date": splitted[4],
-      "country": splitted[5],
-      "lang": splitted[6],
-      "imdb": splitted[7],
-      "title": splitted[8]
-    }
-    sources[source["file_id"]] = source
+  with open(MOVIES_SOURCES_PATH, encoding="utf-8", errors="ignore") as file:
+    for line_number, line in enumerate(file):
+      if line_number < 3:
+        continue
+      splitted = line.strip("\n").split("\t")
+      source = {
+        "text_id": splitted[0],
+        "file_id": splitted[1],
+        "#words": splitted[2],
+        "genre": splitted[3],
+        "date": splitted[4],
+        "country": splitted[5],
+        "lang": splitted[6],
+        "imdb": splitted[7],
+        "title": splitted[8]
+      }
+      sources[source["file_id"]] = source
   return sources
 
 
-def add_texts_to_sources(sources):
+def iter_sources_with_texts(sources):
+  """
+  Streams movies_text.txt line by line and yields each text joined with its metadata.
+  Metadata without a text is yielded at the end, as sources.json used to contain it too.
+  A text is written as soon as it is read, so of several texts for one file_id the first one is kept
+  (sources.json kept the last one) and the others are reported.
+  """
+  written = set()
   with open(MOVIES_TEXTS_PATH, encoding="utf-8", errors="ignore") as file:
-    raw = file.readlines()
-  raw = map(lambda x: x.strip("\n"), raw)
-  raw = list(raw)[1:]
+    for line_number, line in enumerate(file):
+      if line_number < 1:
+        continue
+      line = line.strip("\n")
+      file_id = line[2:line.find(" ")]
+      source = sources.pop(file_id, None)
+      if source is None:
+        if file_id in written:
+          print(f"Warning: duplicate text for file_id {file_id} skipped, the first one is kept")
+        else:
+          print(f"Warning: text for unknown file_id {file_id} skipped")
+        continue
+      written.add(file_id)
+      source["text"] = line[line.find(" "):]
+      yield source
+  yield from sources.values()
 
-  for line in raw:
-    file_id = line[2:line.find(" ")]
-    sources[file_id]["text"] = line[line.find(" "):]
 
+def write_sources(sources, path=SOURCES_PATH):
+  """
+  Writes one JSON object per line to <path>, flushing every line so analyze.py --follow
+  can ingest while this is still running. <path>.writing exists until the last line is written;
+  after a crash it stays, and the file has to be generated again.
+  """
+  writing_path = path + WRITING_SUFFIX
+  open(writing_path, "w").close()
+  count = 0
+  with open(path, "w", encoding="utf-8") as file:
+    for source in iter_sources_with_texts(sources):
+      file.write(json.dumps(source, ensure_ascii=False) + "\n")
+      file.flush()
+      count += 1
+  os.remove(writing_path)  # Only the sidecar is removed, readers keep the file open
+  return count
 
-sources = generate_sources_list()
-print("===========================")
-add_texts_to_sources(sources)
 
-with open("sources.json", "w") as file:
-  json.dump(sources, file, ensure_ascii=False, indent=2)
\ No newline at end of file
+if __name__ == "__main__":
+  sources = generate_sources_list()
+  print("===========================")
+  count = write_sources(sources)
+  print(f"{count} sources written to {SOURCES_PATH}")
@@ -5,12 +5,33 @@ import tkinter as tk
 import os
 from tkinter import ttk, messagebox, scrolledtext, Toplevel, filedialog
 from idlelib.tooltip import Hovertip
-import spacy
 import re
-from utils import POS_TAG_TRANSLATIONS, beautiful_morph, clean_token
+import threading
+from nlp_profiles import load_pipeline
+from annotation import (INSERT_SENTENCES_SQL, INSERT_WORDFORMS_SQL, annotate_doc, ensure_annotation_schema,
+                        find_changed_sentences)
+from dictionary_schema import delete_wordform_rows, update_wordform_row, wordforms_table
+from search_index import (SEARCH_MODES, DEFAULT_SEARCH_MODE, SEARCH_PAGE_SIZE, ensure_search_index,
+                          collect_matching_terms, count_matches, fetch_search_page)
+from pos_stats import ensure_pos_stats
+from doc_cache import ensure_doc_cache, invalidate_doc, load_doc, serialize_doc, store_docs
+from query_executor import QueryExecutor
+from autocomplete import SUGGESTION_COUNT, build_index
+from collocations import (MEASURES, build_collocations, collocation_summary, ensure_collocations,
+                          find_collocates)
+from corpus_matrices import GROUP_COLUMNS, SIMILAR_TEXTS, ensure_doc_versions, group_documents, refresh_matrices
+from text_store import read_text, write_text
+from bulk_import import ImportFormatError, apply_import, iter_import_entries, iter_valid_rows, validate_import_file
 import json
 
 NLP_MODEL = None
+# Re-analysis stores lemma, POS, morphology and dependency, NER is never used
+NLP_PROFILE = "morph+dep"
+# Unchanged sentences re-parsed on each side of an edit, so spaCy sees the same neighbourhood
+REPARSE_CONTEXT_SENTENCES = 1
+
+# Search results are loaded page by page (SEARCH_PAGE_SIZE rows) as the table is scrolled
+SEARCH_PRELOAD_FRACTION = 0.9  # Load the next page once the view reaches 90% of the loaded rows
 
 
 def load_spacy_model():
@@ -18,7 +39,7 @@ def load_spacy_model():
     if NLP_MODEL is None:
         print("Loading spaCy model 'en_core_web_sm' for editor...")
         try:
-            NLP_MODEL = spacy.load('en_core_web_sm')
+            NLP_MODEL = load_pipeline(NLP_PROFILE)
             print("spaCy model loaded successfully.")
             return True
         except OSError:
@@ -53,18 +74,35 @@ class SearchResult:
 class DBConnection:
 
     def __init__(self, path) -> None:
+        self.path = path
+        self.match_counts = {}  # match_count_key -> total number of matching wordforms
+        self.write_generation = 0
+        self.executor = None
+        self.matrices = None  # CorpusMatrices, refreshed by get_corpus_matrices
         try:
-            self.db = sqlite3.connect(f"file:{path}?mode=rw", uri=True)
+            # The write connection: after start_executor only the writer thread uses it
+            self.db = sqlite3.connect(f"file:{path}?mode=rw", uri=True, check_same_thread=False)
             self.db.row_factory = sqlite3.Row
             self.cursor = self.db.cursor()
             print(f"Successfully connected to database: {path}")
             self.cursor.execute("PRAGMA foreign_keys = ON;")
+            # WAL lets the reader threads run while the writer holds a transaction
+            self.cursor.execute("PRAGMA journal_mode = WAL;")
+            ensure_annotation_schema(self.cursor)
+            ensure_search_index(self.cursor)
+            ensure_pos_stats(self.cursor)
+            ensure_doc_cache(self.cursor)
+            ensure_doc_versions(self.cursor)
+            ensure_collocations(self.cursor)
+            self.db.commit()
+            # Tk-thread connection that only reads PRAGMA data_version for match_count_key
+            self.version_db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
         except sqlite3.OperationalError as e:
             print(f"Database connection error for {path}: {e}")
-            messagebox.showerror("Database Error",
-                                 f"Could not connect to database '{path}'.\n"
-                                 f"Ensure the file exists, is accessible, and analyze.py "
-                                 f"has been run successfully (with ON DELETE CASCADE enabled).")
+            self.show_error("Database Error",
+                            f"Could not connect to database '{path}'.\n"
+                            f"Ensure the file exists, is accessible, and analyze.py "
+                            f"has been run successfully (with ON DELETE CASCADE enabled).")
             raise  # Re-raise the exception to stop app initialization
 
         # --- Фрагмент manager.py (внутри класса DBConnection) ---
@@ -110,13 +148,13 @@ class DBConnection:
                 except Exception as rollback_e:
                     print(f"DB: Дополнительная ошибка при попытке отката транзакции: {rollback_e}")
                 # Показываем ошибку пользователю
-                messagebox.showerror("Database Update Error", f"Could not update wordform entry ID {wordform_id}:\n{e}")
+                self.show_error("Database Update Error", f"Could not update wordform entry ID {wordform_id}:\n{e}")
                 return False
             except KeyError as e:
                 # Ловим ошибки, если в словаре 'data' не хватает нужного ключа
                 print(f"DB: Отсутствует ключ '{e}' в данных для обновления ID {wordform_id}.")  # <-- Отладка
-                messagebox.showerror("Data Error",
-                                     f"Missing data field ('{e}') needed for updating wordform ID {wordform_id}.")
+                self.show_error("Data Error",
+                                f"Missing data field ('{e}') needed for updating wordform ID {wordform_id}.")
                 # Откат не нужен, так как SQL команда не выполнялась
                 return False
             except Exception as e:
@@ -127,8 +165,8 @@ class DBConnection:
                     print(f"DB: Rollback выполнен из-за неожиданной ошибки для ID {wordform_id}.")
                 except Exception as rollback_e:
                     print(f"DB: Дополнительная ошибка при попытке отката транзакции: {rollback_e}")
-                messagebox.showerror("Unexpected Error",
-                                     f"An unexpected error occurred during update for ID {wordform_id}:\n{e}")
+                self.show_error("Unexpected Error",
+                                f"An unexpected error occurred during update for ID {wordform_id}:\n{e}")
                 return False
 
         # --- Фрагмент manager.py (внутри класса DBConnection) ---
@@ -152,17 +190,12 @@ class DBConnection:
 
             # Шаг 2: Если существует, выполняем UPDATE
             # Транзакция начнется неявно здесь
-            self.cursor.execute("""
-                UPDATE wordforms
-                SET wordform = ?, lemma = ?, morph = ?, pos = ?
-                WHERE wordform_id = ?
-            """, (data['wordform'], data['lemma'], data['morph'], data['pos'], wordform_id))
-
-            updated_rows = self.cursor.rowcount
+            updated_rows = update_wordform_row(self.cursor, wordform_id, data)
             print(f"DB: Затронуто строк при обновлении ID {wordform_id}: {updated_rows}")
 
             # Шаг 3: Фиксируем изменения неявной транзакции
             self.db.commit()
+            self.write_generation += 1
             print(f"DB: Commit выполнен для операции обновления с ID {wordform_id}.")
             return updated_rows  # Возвращаем количество обновленных строк (должно быть 1)
 
@@ -174,11 +207,11 @@ class DBConnection:
                 print(f"DB: Rollback выполнен из-за ошибки для ID {wordform_id}.")
             except Exception as rollback_e:
                 print(f"DB: Дополнительная ошибка при попытке отката транзакции: {rollback_e}")
-            messagebox.showerror("Database Update Error", f"Could not update entry ID {wordform_id}:\n{e}")
+            self.show_error("Database Update Error", f"Could not update entry ID {wordform_id}:\n{e}")
             return -1
         except KeyError as e:
             print(f"DB: Отсутствует ключ '{e}' в данных для ID {wordform_id}.")
-            messagebox.showerror("Data Error", f"Missing data field ('{e}') for ID {wordform_id}.")
+            self.show_error("Data Error", f"Missing data field ('{e}') for ID {wordform_id}.")
             return -1  # Ошибка данных, возвращаем -1 (можно было бы и -2, но -1 достаточно)
         except Exception as e:
             print(f"DB: Неожиданная ошибка при обновлении wordform_id {wordform_id}: {e}")
@@ -187,149 +220,328 @@ class DBConnection:
                 print(f"DB: Rollback выполнен из-за неожиданной ошибки для ID {wordform_id}.")
             except Exception as rollback_e:
                 print(f"DB: Дополнительная ошибка при попытке отката транзакции: {rollback_e}")
-            messagebox.showerror("Unexpected Error", f"Error during update for ID {wordform_id}:\n{e}")
+            self.show_error("Unexpected Error", f"Error during update for ID {wordform_id}:\n{e}")
             return -1
 
-    def find_info_by_word(self, word, limit=500):
+    def import_wordforms(self, rows, path=None):
+        """
+        Применяет уже проверенные строки импорта (см. bulk_import) одной транзакцией.
+        Возвращает (updated, not_found) или None, если транзакция откатена.
+        """
+        source = f" from {path}" if path else ""
+        try:
+            updated, not_found = apply_import(self.cursor, rows)
+            self.db.commit()
+            self.write_generation += 1
+            print(f"DB: Импорт зафиксирован: обновлено {updated}, не найдено {not_found}.")
+            return updated, not_found
+        except (sqlite3.Error, ImportFormatError, OSError) as e:
+            print(f"DB: Ошибка при импорте{source}, выполняется rollback: {e}")
+            self.db.rollback()
+            self.show_error("Import Error", f"The import{source} was rolled back, no entries were changed:\n{e}")
+            return None
+        except Exception as e:
+            print(f"DB: Неожиданная ошибка при импорте{source}, выполняется rollback: {e}")
+            try:
+                self.db.rollback()
+            except Exception as rollback_e:
+                print(f"DB: Дополнительная ошибка при попытке отката транзакции: {rollback_e}")
+            self.show_error("Import Error", f"Unexpected error, the import{source} was rolled back:\n{e}")
+            return None
+
+    def start_executor(self, root):
+        """Starts the reader pool and the writer thread; from here on use self.executor for database work."""
+        self.executor = QueryExecutor(root, self.path)
+        return self.executor
+
+    def show_error(self, title, message):
+        """messagebox.showerror that may be called from the executor threads."""
+        if self.executor is None or threading.current_thread() is threading.main_thread():
+            messagebox.showerror(title, message)
+        else:
+            self.executor.call_in_ui(messagebox.showerror, title, message)
+
+    def prepare_search(self, cursor, query_word, mode):
+        """
+        Fills the temp search tables of the cursor's connection for the query, unless they already hold it.
+        Each reader connection has its own temp tables, so a later page may land on a connection
+        that has to collect the terms first. Like match_count_key, the key includes write_generation
+        and the connection's data_version, so the tables are collected again after any commit.
+        """
+        connection = cursor.connection
+        data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        search_key = (query_word, mode, self.write_generation, data_version)
+        if getattr(connection, "search_key", None) == search_key:
+            return
+        connection.search_key = None  # Not valid if collecting is interrupted half-way
+        collect_matching_terms(cursor, query_word, mode)
+        connection.search_key = search_key
+
+    def find_info_by_word(self, cursor, word, limit=SEARCH_PAGE_SIZE, mode=DEFAULT_SEARCH_MODE, count_key=None):
+        """
+        First page of the search plus examples. "next_key" is passed to find_next_page for the following
+        page (None when there is none). "occurences" is the total if it is cached under count_key
+        (see match_count_key), otherwise None and the count can be requested with count_all_matches.
+        """
         query_word = word.lower().strip()
         if not query_word:
-            return {"occurences": "0", "search_results": [], "examples": []}
+            return {"occurences": "0", "search_results": [], "examples": [], "next_key": None}
 
         try:
-            self.cursor.execute(f"""
-                SELECT DISTINCT
-                    wf.wordform_id, wf.wordform, wf.lemma, wf.morph, wf.pos,
-                    ts.title, ts.country, ts.date, ts.file_id
-                FROM wordforms wf
-                JOIN texts ts ON wf.file_id = ts.file_id
-                WHERE wf.wordform LIKE ? OR wf.lemma LIKE ?
-                ORDER BY wf.wordform
-                LIMIT ?
-            """, (f'%{query_word}%', f'%{query_word}%', limit))
-            results_raw = self.cursor.fetchall()
+            # Resolve the query to matching terms through the FTS index, then use the wordform/lemma indexes
+            self.prepare_search(cursor, query_word, mode)
+            match_clause = """wf.wordform IN (SELECT term FROM temp.search_matches)
+                   OR wf.lemma IN (SELECT term FROM temp.search_matches)"""
 
-            self.cursor.execute("""
-                SELECT count(*) FROM wordforms wf
-                WHERE wf.wordform LIKE ? OR wf.lemma LIKE ?
-            """, (f'%{query_word}%', f'%{query_word}%'))
-            occurences = self.cursor.fetchone()
-
-            examples = []
-            MAX_EXAMPLES_PER_QUERY = 20
-            MAX_TEXTS_TO_SCAN = 50
-            self.cursor.execute("""
-                SELECT DISTINCT ts.file_id
-                FROM texts ts JOIN wordforms wf ON wf.file_id = ts.file_id
-                WHERE wf.wordform LIKE ? OR wf.lemma LIKE ? LIMIT ?
-            """, (f'%{query_word}%', f'%{query_word}%', MAX_TEXTS_TO_SCAN))
-            text_ids_with_word = [row['file_id'] for row in self.cursor.fetchall()]
-            if text_ids_with_word:
-                placeholders = ','.join('?' * len(text_ids_with_word))
-                self.cursor.execute(f"""
-                    SELECT file_id, text, title, country, date, genre
-                    FROM texts WHERE file_id IN ({placeholders})
-                """, text_ids_with_word)
-                raw_example_texts = self.cursor.fetchall()
-                try:
-                    pattern = re.compile(r'\b' + re.escape(query_word) + r'\b', re.IGNORECASE)
-                except re.error as re_err:
-                    print(f"Regex error for query '{query_word}': {re_err}")
-                    pattern = None
-                if pattern:
-                    example_count = 0
-                    for text_row in raw_example_texts:
-                        if example_count >= MAX_EXAMPLES_PER_QUERY: break
-                        full_text = text_row['text']
-                        if not full_text: continue
-                        for match in pattern.finditer(full_text):
-                            start_match, end_match = match.span()
-                            sentence_delimiters = ['.', '!', '?', '\n']
-                            sentence_start = -1
-                            for delim in sentence_delimiters: sentence_start = max(sentence_start,
-                                                                                   full_text.rfind(delim, 0,
-                                                                                                   start_match))
-                            sentence_start += 1
-                            sentence_end = len(full_text)
-                            for delim in sentence_delimiters:
-                                found_pos = full_text.find(delim, end_match)
-                                if found_pos != -1: sentence_end = min(sentence_end, found_pos)
-                            if sentence_end < len(full_text): sentence_end += 1
-                            example_text = full_text[sentence_start:sentence_end].strip().replace("\n", " ")
-                            if len(example_text) > 10:
-                                examples.append({"text": example_text,
-                                                 "link": f"{text_row['title']} ({text_row['country']}, {text_row['date']})",
-                                                 "genre": text_row['genre']})
-                                example_count += 1
-                                if example_count >= MAX_EXAMPLES_PER_QUERY: break
-
-            search_results_obj = [
-                SearchResult(
-                    r['wordform_id'],
-                    r['wordform'], r['lemma'], r['morph'], r['pos'],
-                    f"{r['title']} ({r['country']}, {r['date']})"
-                ) for r in results_raw
-            ]
+            page = self.find_next_page(cursor, word, mode, None, limit)
+            examples = self.find_examples(cursor, match_clause, query_word)
 
+            occurences = self.match_counts.get(count_key)
             return {
-                "occurences": str(occurences['count(*)'] if occurences else 0),
-                "search_results": search_results_obj,
-                "examples": examples
+                "occurences": None if occurences is None else str(occurences),
+                "search_results": page["search_results"],
+                "examples": examples,
+                "next_key": page["next_key"]
             }
         except sqlite3.Error as e:
+            if isinstance(e, sqlite3.OperationalError) and str(e) == "interrupted":
+                raise  # Superseded by a newer search, nobody waits for this result
             print(f"Database error during search for '{word}': {e}")
-            messagebox.showerror("Search Error",
-                                 f"A database error occurred during the search:\n{e}\n\nCheck if the database schema is up-to-date (column 'wordform_id' might be missing).")
-            return {"occurences": "0", "search_results": [], "examples": []}
-
-    def get_overall_pos_stats(self):
+            self.show_error("Search Error",
+                            f"A database error occurred during the search:\n{e}\n\nCheck if the database schema is up-to-date (column 'wordform_id' might be missing).")
+            return {"occurences": "0", "search_results": [], "examples": [], "next_key": None}
+
+    def find_next_page(self, cursor, word, mode, after, limit=SEARCH_PAGE_SIZE):
+        """The page of the search for word that follows the key `after`."""
+        self.prepare_search(cursor, word.lower().strip(), mode)
+        results_raw = fetch_search_page(cursor, after, limit)
+        search_results_obj = [
+            SearchResult(
+                r['wordform_id'],
+                r['wordform'], r['lemma'], r['morph'], r['pos'],
+                f"{r['title']} ({r['country']}, {r['date']})"
+            ) for r in results_raw
+        ]
+        next_key = None
+        if len(results_raw) == limit:
+            next_key = (results_raw[-1]['wordform'], results_raw[-1]['wordform_id'])
+        return {"search_results": search_results_obj, "next_key": next_key}
+
+    def match_count_key(self, query_word, mode):
+        # write_generation moves with every edit made here, data_version with every commit of any
+        # other connection (the writer thread, analyze.py), so a cached total is never shown for different data
+        data_version = self.version_db.execute("PRAGMA data_version").fetchone()[0]
+        return query_word.lower().strip(), mode, self.write_generation, data_version
+
+    def count_all_matches(self, cursor, word, mode, count_key):
+        """Counts all matches of the query on a reader connection and caches the total under count_key."""
+        self.prepare_search(cursor, word.lower().strip(), mode)
+        total = count_matches(cursor)
+        self.match_counts[count_key] = total
+        return total
+
+    def find_examples(self, cursor, match_clause, query_word, max_examples=20, max_texts_to_scan=50):
+        """
+        Builds concordance examples from the sentence spans stored by analyze.py: an indexed lookup
+        of (file_id, start_char, end_char) and a slice of the text (see text_store for the LRU of
+        decompressed texts). Texts analyzed before spans were stored fall back to scanning the text.
+        Only the first matches in index order are read, so a frequent word does not group all its rows.
+        """
+        cursor.execute(f"""
+            SELECT s.file_id, s.start_char, s.end_char, ts.title, ts.country, ts.date, ts.genre
+            FROM (
+                SELECT DISTINCT file_id, sent_index FROM (
+                    SELECT wf.file_id, wf.sent_index FROM wordforms wf
+                    WHERE ({match_clause}) AND wf.sent_index IS NOT NULL
+                    LIMIT ?
+                )
+            ) m
+            JOIN sentences s ON s.file_id = m.file_id AND s.sent_index = m.sent_index
+            JOIN texts ts ON ts.file_id = m.file_id
+            LIMIT ?
+        """, (max_examples * 4, max_examples * 2))  # A sentence often holds the word more than once
+        examples = []
+        texts = {}  # Examples cluster in a few texts, read each one once
+        for row in cursor.fetchall():
+            if row['file_id'] not in texts:
+                texts[row['file_id']] = read_text(cursor, row['file_id']) or ""
+            full_text = texts[row['file_id']]
+            example_text = full_text[row['start_char']:row['end_char']].strip().replace("\n", " ")
+            if len(example_text) > 10:
+                examples.append({"text": example_text,
+                                 "link": f"{row['title']} ({row['country']}, {row['date']})",
+                                 "genre": row['genre']})
+                if len(examples) >= max_examples:
+                    return examples
+
+        cursor.execute(f"""
+            SELECT DISTINCT wf.file_id
+            FROM wordforms wf
+            WHERE ({match_clause}) AND wf.sent_index IS NULL LIMIT ?
+        """, (max_texts_to_scan,))
+        text_ids_with_word = [row['file_id'] for row in cursor.fetchall()]
+        if text_ids_with_word:
+            examples.extend(self.scan_texts_for_examples(cursor, text_ids_with_word, query_word,
+                                                         max_examples - len(examples)))
+        return examples
+
+    def scan_texts_for_examples(self, cursor, text_ids_with_word, query_word, max_examples):
+        examples = []
+        placeholders = ','.join('?' * len(text_ids_with_word))
+        cursor.execute(f"""
+            SELECT file_id, title, country, date, genre
+            FROM texts WHERE file_id IN ({placeholders})
+        """, text_ids_with_word)
+        raw_example_texts = cursor.fetchall()
         try:
-            self.cursor.execute("""
-                SELECT pos, COUNT(*) as count
-                FROM wordforms
-                WHERE pos IS NOT NULL AND pos != '' AND pos != 'space' -- Exclude empty/space       
-                GROUP BY pos
+            pattern = re.compile(r'\b' + re.escape(query_word) + r'\b', re.IGNORECASE)
+        except re.error as re_err:
+            print(f"Regex error for query '{query_word}': {re_err}")
+            pattern = None
+        if pattern:
+            example_count = 0
+            for text_row in raw_example_texts:
+                if example_count >= max_examples: break
+                full_text = read_text(cursor, text_row['file_id'])
+                if not full_text: continue
+                for match in pattern.finditer(full_text):
+                    start_match, end_match = match.span()
+                    sentence_delimiters = ['.', '!', '?', '\n']
+                    sentence_start = -1
+                    for delim in sentence_delimiters: sentence_start = max(sentence_start,
+                                                                           full_text.rfind(delim, 0,
+                                                                                           start_match))
+                    sentence_start += 1
+                    sentence_end = len(full_text)
+                    for delim in sentence_delimiters:
+                        found_pos = full_text.find(delim, end_match)
+                        if found_pos != -1: sentence_end = min(sentence_end, found_pos)
+                    if sentence_end < len(full_text): sentence_end += 1
+                    example_text = full_text[sentence_start:sentence_end].strip().replace("\n", " ")
+                    if len(example_text) > 10:
+                        examples.append({"text": example_text,
+                                         "link": f"{text_row['title']} ({text_row['country']}, {text_row['date']})",
+                                         "genre": text_row['genre']})
+                        example_count += 1
+                        if example_count >= max_examples: break
+        return examples
+
+    def get_overall_pos_stats(self, cursor):
+        try:
+            # pos_stats_overall is maintained by triggers (see pos_stats.py), one row per tag
+            cursor.execute("""
+                SELECT pos, count
+                FROM pos_stats_overall
+                WHERE pos != '' AND pos != 'space' AND count > 0 -- Exclude empty/space
                 ORDER BY count DESC
             """)
-            return self.cursor.fetchall()
+            return cursor.fetchall()
         except sqlite3.Error as e:
             print(f"Error getting overall POS stats: {e}")
-            messagebox.showerror("Statistics Error", f"Could not retrieve overall statistics:\n{e}")
+            self.show_error("Statistics Error", f"Could not retrieve overall statistics:\n{e}")
             return []
 
-    def get_document_pos_stats(self, file_id):
+    def get_document_pos_stats(self, cursor, file_id):
         """Retrieves part-of-speech statistics for a specific document."""
         try:
-            self.cursor.execute("""
-                SELECT pos, COUNT(*) as count
-                FROM wordforms
-                WHERE file_id = ? AND pos IS NOT NULL AND pos != '' AND pos != 'space'
-                GROUP BY pos
+            cursor.execute("""
+                SELECT pos, count
+                FROM pos_stats_by_doc
+                WHERE file_id = ? AND pos != '' AND pos != 'space' AND count > 0
                 ORDER BY count DESC
             """, (file_id,))
-            return self.cursor.fetchall()
+            return cursor.fetchall()
         except sqlite3.Error as e:
             print(f"Error getting document POS stats for file_id {file_id}: {e}")
-            messagebox.showerror("Statistics Error", f"Could not retrieve statistics for the document:\n{e}")
+            self.show_error("Statistics Error", f"Could not retrieve statistics for the document:\n{e}")
             return []
 
-    def get_all_texts_summary(self):
+    def get_corpus_matrices(self, cursor):
+        """The document x POS / lemma matrices, updated for the texts changed since the last call."""
+        self.matrices = refresh_matrices(cursor, self.path, self.matrices)
+        return self.matrices
+
+    def get_group_pos_stats(self, cursor, column):
+        """POS shares per genre, country or decade: (group, documents, tokens, {pos: share}), largest first."""
+        try:
+            return self.get_corpus_matrices(cursor).group_pos_stats(group_documents(cursor, column))
+        except (sqlite3.Error, OSError) as e:
+            print(f"Error getting POS stats by {column}: {e}")
+            self.show_error("Statistics Error", f"Could not retrieve statistics by {column}:\n{e}")
+            return []
+
+    def get_similar_texts(self, cursor, file_id, limit=SIMILAR_TEXTS):
+        """The texts with the most similar lemma profile: [{'file_id', 'title', 'score'}]."""
+        try:
+            similar = self.get_corpus_matrices(cursor).similar(file_id, limit)
+            cursor.execute("SELECT file_id, title FROM texts WHERE file_id IN (SELECT value FROM json_each(?))",
+                           (json.dumps([other_id for other_id, _ in similar]),))
+            titles = {row['file_id']: row['title'] for row in cursor.fetchall()}
+            return [{'file_id': other_id, 'title': titles.get(other_id) or f"ID: {other_id}", 'score': score}
+                    for other_id, score in similar]
+        except (sqlite3.Error, OSError) as e:
+            print(f"Error finding texts similar to file_id {file_id}: {e}")
+            return []
+
+    def get_collocates(self, cursor, lemma, measure):
+        """{'summary': last build (see collocations.py) or None, 'lemma': the lemma found, 'rows': collocates}."""
+        lemma = lemma.strip()
+        try:
+            rows = find_collocates(cursor, lemma, measure)
+            if not rows and lemma.lower() != lemma:
+                lemma = lemma.lower()
+                rows = find_collocates(cursor, lemma, measure)
+            return {'summary': collocation_summary(cursor), 'lemma': lemma, 'rows': rows}
+        except sqlite3.Error as e:
+            print(f"Error getting collocates of '{lemma}': {e}")
+            self.show_error("Collocations Error", f"Could not retrieve collocates:\n{e}")
+            return {'summary': None, 'lemma': lemma, 'rows': []}
+
+    def rebuild_collocations(self):
+        """Recomputes the collocations table in one transaction (writer thread). Returns the summary or None."""
+        try:
+            summary = build_collocations(self.cursor)
+            self.db.commit()
+            print(f"Collocations rebuilt in {summary['seconds']:.1f} s: {summary['scored_pairs']} pairs scored.")
+            return summary
+        except (sqlite3.Error, MemoryError) as e:
+            print(f"Error rebuilding collocations: {e}")
+            self.db.rollback()
+            self.show_error("Collocations Error", f"Could not rebuild collocations, nothing was changed:\n{e}")
+            return None
+
+    def get_all_texts_summary(self, cursor):
         """Retrieves a list of all text IDs and titles for dropdowns."""
         try:
-            self.cursor.execute("SELECT file_id, title FROM texts ORDER BY title COLLATE NOCASE")
-            return [{'file_id': row['file_id'], 'title': row['title']} for row in self.cursor.fetchall()]
+            cursor.execute("SELECT file_id, title FROM texts ORDER BY title COLLATE NOCASE")
+            return [{'file_id': row['file_id'], 'title': row['title']} for row in cursor.fetchall()]
         except sqlite3.Error as e:
             print(f"Error getting text list: {e}")
             return []
 
-    def get_text_metadata(self, file_id):
-        """Retrieves all metadata (including text content) for a specific file_id."""
+    def get_text_metadata(self, cursor, file_id):
+        """Retrieves all metadata (without the text content, see get_text_content) for a specific file_id."""
         try:
-            self.cursor.execute("SELECT * FROM texts WHERE file_id = ?", (file_id,))
-            return self.cursor.fetchone()
+            cursor.execute("""
+                SELECT file_id, text_id, num_words, genre, date, country, lang, imdb, title
+                FROM texts WHERE file_id = ?
+            """, (file_id,))
+            return cursor.fetchone()
         except sqlite3.Error as e:
             print(f"Error getting metadata for file_id {file_id}: {e}")
             return None
 
+    def get_text_content(self, cursor, file_id):
+        """Returns (found, text) for a specific file_id; text may be None for an empty text."""
+        try:
+            cursor.execute("SELECT 1 FROM texts WHERE file_id = ?", (file_id,))
+            if cursor.fetchone() is None:
+                return False, None
+            return True, read_text(cursor, file_id)
+        except sqlite3.Error as e:
+            print(f"Error getting text content for file_id {file_id}: {e}")
+            return False, None
+
     def update_text_metadata(self, file_id, data):
         """Updates metadata fields (excluding 'text') for a given file_id."""
         fields_to_update = {k: v for k, v in data.items() if k != 'text'}
@@ -346,50 +558,57 @@ class DBConnection:
             return True
         except sqlite3.Error as e:
             print(f"Error updating metadata for file_id {file_id}: {e}")
-            messagebox.showerror("Update Error", f"Could not update metadata:\n{e}")
+            self.show_error("Update Error", f"Could not update metadata:\n{e}")
             self.db.rollback()
             return False
 
     def update_text_content_and_reanalyze(self, file_id, new_text):
+        """
+        Saves the new text and brings its annotations up to date in one transaction.
+        Only the sentences touched by the edit (plus REPARSE_CONTEXT_SENTENCES around them) are
+        re-parsed; wordform rows outside them, including manual corrections, are kept and only
+        have their offsets shifted. Texts without stored sentence spans are re-parsed completely.
+        """
         if not load_spacy_model():
             return False, "spaCy model not loaded. Cannot re-analyze."
 
         global NLP_MODEL
 
         try:
+            old_text = read_text(self.cursor, file_id) or ""
+
+            self.cursor.execute("SELECT sent_index, start_char, end_char FROM sentences WHERE file_id = ? "
+                                "ORDER BY sent_index", (file_id,))
+            sentence_spans = [tuple(span) for span in self.cursor.fetchall()]
+            self.cursor.execute(f"SELECT 1 FROM {wordforms_table(self.cursor)} "
+                                f"WHERE file_id = ? AND sent_index IS NULL LIMIT 1", (file_id,))
+            has_unplaced_wordforms = self.cursor.fetchone() is not None
+
+            if old_text == new_text:
+                return True, "Text is unchanged, no sentences re-parsed."
+
+            changed = None
+            if not has_unplaced_wordforms:
+                changed = find_changed_sentences(old_text, new_text, sentence_spans, REPARSE_CONTEXT_SENTENCES)
+
             self.cursor.execute("BEGIN TRANSACTION")
 
-            self.cursor.execute("UPDATE texts SET text = ? WHERE file_id = ?", (new_text, file_id))
+            write_text(self.cursor, file_id, new_text)
             print(f"Text content updated for file_id {file_id}.")
 
-            self.cursor.execute("DELETE FROM wordforms WHERE file_id = ?", (file_id,))
-            print(f"Old annotations deleted for file_id {file_id}.")
-
-            print(f"Starting spaCy analysis for file_id {file_id}...")
-            doc = NLP_MODEL(new_text)
-            print(f"spaCy analysis complete.")
-
-            wordforms_to_insert = []
-            for token in doc:
-                cleaned = clean_token(token.text)
-                if not cleaned or token.is_space:
-                    continue
-                pos_tag = POS_TAG_TRANSLATIONS.get(token.pos_, token.pos_)
-                morph = beautiful_morph(token.morph.to_dict())
-                wordforms_to_insert.append((
-                    token.text.lower(), token.lemma_, morph, pos_tag, token.dep_, file_id
-                ))
-
-            if wordforms_to_insert:
-                self.cursor.executemany(
-                    'INSERT INTO wordforms (wordform, lemma, morph, pos, dep, file_id) VALUES (?, ?, ?, ?, ?, ?)',
-                    wordforms_to_insert)
-                print(f"Inserted {len(wordforms_to_insert)} new annotations for file_id {file_id}.")
+            if changed is None:
+                reparsed = self.reannotate_whole_text(file_id, new_text)
+                message = f"Text content and annotations successfully updated ({reparsed} sentences re-parsed)."
             else:
-                print(f"No new annotations generated for file_id {file_id} (text might be empty).")
+                reparsed = self.reannotate_sentences(file_id, new_text, len(new_text) - len(old_text), *changed)
+                message = (f"Text content and annotations successfully updated "
+                           f"({reparsed} of {len(sentence_spans) - (changed[1] - changed[0] + 1) + reparsed} "
+                           f"sentences re-parsed).")
 
             self.db.commit()
-            return True, "Text content and annotations successfully updated."
+            self.write_generation += 1
+            print(message)
+            return True, message
 
         except sqlite3.Error as e:
             print(f"SQLite error during text update/re-analysis for file_id {file_id}: {e}")
@@ -400,11 +619,90 @@ class DBConnection:
             self.db.rollback()
             return False, f"Processing error: {e}"
 
-    def get_wordform_details(self, wordform_id):
+    def reannotate_whole_text(self, file_id, new_text):
+        """Replaces all annotations of the text. Returns the number of parsed sentences."""
+        delete_wordform_rows(self.cursor, "file_id", file_id)
+        self.cursor.execute("DELETE FROM sentences WHERE file_id = ?", (file_id,))
+        print(f"Old annotations deleted for file_id {file_id}.")
+
+        print(f"Starting spaCy analysis for file_id {file_id}...")
+        doc = NLP_MODEL(new_text)
+        print(f"spaCy analysis complete.")
+
+        wordforms_to_insert, sentences_to_insert = annotate_doc(doc, file_id)
+        store_docs(self.cursor, [serialize_doc(file_id, doc, NLP_PROFILE)])
+        if sentences_to_insert:
+            self.cursor.executemany(INSERT_SENTENCES_SQL, sentences_to_insert)
+
+        if wordforms_to_insert:
+            self.cursor.executemany(INSERT_WORDFORMS_SQL, wordforms_to_insert)
+            print(f"Inserted {len(wordforms_to_insert)} new annotations for file_id {file_id}.")
+        else:
+            print(f"No new annotations generated for file_id {file_id} (text might be empty).")
+        return len(sentences_to_insert)
+
+    def reannotate_sentences(self, file_id, new_text, length_delta, first_index, last_index, region_start, region_end):
+        """
+        Re-parses the sentences first_index..last_index, which cover region_start..region_end of the old text,
+        and shifts the offsets and sentence numbers of everything after them. Returns the number of parsed sentences.
+        """
+        table = wordforms_table(self.cursor)
+        fragment = new_text[region_start:region_end + length_delta]
+        print(f"Re-parsing sentences {first_index}..{last_index} of file_id {file_id} "
+              f"(characters {region_start}..{region_end + length_delta})...")
+        doc = NLP_MODEL(fragment)
+        wordforms_to_insert, sentences_to_insert = annotate_doc(doc, file_id, char_shift=region_start,
+                                                                sent_shift=first_index)
+        sentence_delta = len(sentences_to_insert) - (last_index - first_index + 1)
+        # Only a fragment was parsed, there is no Doc of the whole new text to cache
+        invalidate_doc(self.cursor, file_id)
+
+        self.cursor.execute(f"DELETE FROM {table} WHERE file_id = ? AND sent_index BETWEEN ? AND ?",
+                            (file_id, first_index, last_index))
+        print(f"Deleted {self.cursor.rowcount} annotations of the changed sentences.")
+        self.cursor.execute("DELETE FROM sentences WHERE file_id = ? AND sent_index BETWEEN ? AND ?",
+                            (file_id, first_index, last_index))
+
+        if length_delta or sentence_delta:
+            self.cursor.execute(f"""
+                UPDATE {table}
+                SET char_offset = char_offset + ?, sent_index = sent_index + ?
+                WHERE file_id = ? AND sent_index > ?
+            """, (length_delta, sentence_delta, file_id, last_index))
+            # (file_id, sent_index) is the primary key: move the later sentences through negative
+            # indexes so the shift never collides with a row that has not moved yet
+            self.cursor.execute("""
+                UPDATE sentences
+                SET sent_index = -(sent_index + ?) - 1, start_char = start_char + ?, end_char = end_char + ?
+                WHERE file_id = ? AND sent_index > ?
+            """, (sentence_delta, length_delta, length_delta, file_id, last_index))
+            self.cursor.execute("UPDATE sentences SET sent_index = -sent_index - 1 WHERE file_id = ? AND sent_index < 0",
+                                (file_id,))
+
+        if sentences_to_insert:
+            self.cursor.executemany(INSERT_SENTENCES_SQL, sentences_to_insert)
+        if wordforms_to_insert:
+            self.cursor.executemany(INSERT_WORDFORMS_SQL, wordforms_to_insert)
+        print(f"Inserted {len(wordforms_to_insert)} new annotations for file_id {file_id}.")
+        return len(sentences_to_insert)
+
+    def build_suggestion_index(self, cursor):
+        """Prefix index for the search box, read from the disk cache while it is current (see autocomplete.py)."""
+        return build_index(cursor, self.path)
+
+    def get_doc(self, cursor, file_id):
+        """The parsed Doc of the text from doc_cache, or None if it has to be re-parsed (see doc_cache.py)."""
         try:
-            self.cursor.execute("SELECT wordform_id, wordform, lemma, morph, pos FROM wordforms WHERE wordform_id = ?",
+            return load_doc(cursor, file_id)
+        except sqlite3.Error as e:
+            print(f"Error loading cached Doc for file_id {file_id}: {e}")
+            return None
+
+    def get_wordform_details(self, cursor, wordform_id):
+        try:
+            cursor.execute("SELECT wordform_id, wordform, lemma, morph, pos FROM wordforms WHERE wordform_id = ?",
                                 (wordform_id,))
-            return self.cursor.fetchone()
+            return cursor.fetchone()
         except sqlite3.Error as e:
             print(f"Error getting details for wordform_id {wordform_id}: {e}")
             return None
@@ -419,15 +717,8 @@ class DBConnection:
         """
         print(f"DB: Попытка обновить wordform_id={wordform_id} данными: {data}")
         try:
-            # Выполняем SQL команду UPDATE
-            self.cursor.execute("""
-                    UPDATE wordforms
-                    SET wordform = ?, lemma = ?, morph = ?, pos = ?
-                    WHERE wordform_id = ?
-                """, (data['wordform'], data['lemma'], data['morph'], data['pos'], wordform_id))
-
-            # Получаем количество строк, которые были изменены последней командой
-            updated_rows = self.cursor.rowcount
+            # Выполняем SQL команду UPDATE и получаем количество измененных строк
+            updated_rows = update_wordform_row(self.cursor, wordform_id, data)
             print(f"DB: Затронуто строк при обновлении ID {wordform_id}: {updated_rows}")
 
             if updated_rows == 0:
@@ -435,6 +726,7 @@ class DBConnection:
 
             # Фиксируем изменения
             self.db.commit()
+            self.write_generation += 1
             print(f"DB: Commit выполнен для операции с ID {wordform_id}.")
 
             # Возвращаем количество реально обновленных строк
@@ -447,12 +739,12 @@ class DBConnection:
                 print(f"DB: Rollback выполнен из-за ошибки для ID {wordform_id}.")
             except Exception as rollback_e:
                 print(f"DB: Дополнительная ошибка при попытке отката транзакции: {rollback_e}")
-            messagebox.showerror("Database Update Error", f"Could not update wordform entry ID {wordform_id}:\n{e}")
+            self.show_error("Database Update Error", f"Could not update wordform entry ID {wordform_id}:\n{e}")
             return -1  # Возвращаем -1 при ошибке
         except KeyError as e:
             print(f"DB: Отсутствует ключ '{e}' в данных для обновления ID {wordform_id}.")
-            messagebox.showerror("Data Error",
-                                 f"Missing data field ('{e}') needed for updating wordform ID {wordform_id}.")
+            self.show_error("Data Error",
+                            f"Missing data field ('{e}') needed for updating wordform ID {wordform_id}.")
             return -1  # Возвращаем -1 при ошибке
         except Exception as e:
             print(f"DB: Неожиданная ошибка при обновлении wordform_id {wordform_id}: {e}")
@@ -461,25 +753,29 @@ class DBConnection:
                 print(f"DB: Rollback выполнен из-за неожиданной ошибки для ID {wordform_id}.")
             except Exception as rollback_e:
                 print(f"DB: Дополнительная ошибка при попытке отката транзакции: {rollback_e}")
-            messagebox.showerror("Unexpected Error",
-                                 f"An unexpected error occurred during update for ID {wordform_id}:\n{e}")
+            self.show_error("Unexpected Error",
+                            f"An unexpected error occurred during update for ID {wordform_id}:\n{e}")
             return -1  # Возвращаем -1 при ошибке
 
     def delete_wordform(self, wordform_id):
         try:
-            self.cursor.execute("DELETE FROM wordforms WHERE wordform_id = ?", (wordform_id,))
-            deleted_rows = self.cursor.rowcount
+            deleted_rows = delete_wordform_rows(self.cursor, "wordform_id", wordform_id)
             self.db.commit()
+            self.write_generation += 1
             if deleted_rows == 0:
                 print(f"Warning: No row found with wordform_id {wordform_id} to delete.")
             return deleted_rows > 0
         except sqlite3.Error as e:
             print(f"Error deleting wordform_id {wordform_id}: {e}")
             self.db.rollback()
-            messagebox.showerror("Deletion Error", f"Could not delete wordform entry:\n{e}")
+            self.show_error("Deletion Error", f"Could not delete wordform entry:\n{e}")
             return False
 
     def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()  # Queued writes are finished before the connection closes
+        if self.version_db:
+            self.version_db.close()
         if self.db:
             self.db.close()
             print("Database connection closed.")
@@ -495,6 +791,7 @@ class ManagerApp:
             return  # Stop initialization
 
         self.root = root
+        self.executor = self.conn.start_executor(root)
         self.root.title("Corpus Manager")
         self.root.geometry("1200x800")
 
@@ -508,21 +805,33 @@ class ManagerApp:
         self.stats_doc_frame = ttk.Frame(self.notebook, padding="10")
         self.edit_meta_frame = ttk.Frame(self.notebook, padding="10")
         self.edit_text_frame = ttk.Frame(self.notebook, padding="10")
+        self.collocations_frame = ttk.Frame(self.notebook, padding="10")
 
         self.notebook.add(self.search_frame, text="Search")
         self.notebook.add(self.stats_overall_frame, text="Overall Stats")
         self.notebook.add(self.stats_doc_frame, text="Document Stats")
+        self.notebook.add(self.collocations_frame, text="Collocations")
         self.notebook.add(self.edit_meta_frame, text="Edit Metadata")
         self.notebook.add(self.edit_text_frame, text="Edit Text")
 
         self.setup_search_tab()
         self.setup_stats_overall_tab()
         self.setup_stats_doc_tab()
+        self.setup_collocations_tab()
         self.setup_edit_meta_tab()
         self.setup_edit_text_tab()
 
+        self.texts_list = []
+        self.text_titles = []
         self.load_texts_list()
         self.last_search_word = ""
+        self.search_mode = DEFAULT_SEARCH_MODE
+        self.search_next_key = None  # (wordform, wordform_id) of the last loaded row while more pages exist
+        self.search_count_key = None  # The background count the Occurrences field is waiting for
+        self.suggest_index = None
+        self.suggest_generation = None  # write_generation the suggestion index was requested at
+        self.suggest_popup = None
+        self.load_suggestion_index()
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
@@ -547,8 +856,17 @@ class ManagerApp:
             self.conn.close()
             self.root.destroy()
 
-    def load_texts_list(self):
-        self.texts_list = self.conn.get_all_texts_summary()
+    def load_texts_list(self, then=None):
+        """Reloads the document lists in the background; then() runs once the comboboxes are updated."""
+        def loaded(texts_list):
+            self.show_texts_list(texts_list)
+            if then is not None:
+                then()
+
+        self.executor.submit_read(self.conn.get_all_texts_summary, key="texts-list", on_done=loaded)
+
+    def show_texts_list(self, texts_list):
+        self.texts_list = texts_list
         self.text_titles = [text['title'] if text['title'] else f"ID: {text['file_id']}"
                             for text in self.texts_list]
 
@@ -579,8 +897,21 @@ class ManagerApp:
         self.entry_var = tk.StringVar()
         entry_search = ttk.Entry(top_frame, textvariable=self.entry_var, width=40)
         entry_search.pack(side="left", padx=5)
-        Hovertip(entry_search, "Enter word or lemma to search.")
+        Hovertip(entry_search, "Enter word or lemma to search.\nSuggestions appear while typing, Down selects them.")
         entry_search.bind("<Return>", self.search)
+        # Suggestions come from the in-memory index, only the chosen word is searched in the database
+        entry_search.bind("<KeyRelease>", self.on_search_typed)
+        entry_search.bind("<Down>", self.focus_suggestions)
+        entry_search.bind("<Escape>", self.hide_suggestions)
+        entry_search.bind("<FocusOut>", lambda event: self.root.after(150, self.hide_suggestions_unless_focused))
+        self.entry_search = entry_search
+
+        self.search_mode_var = tk.StringVar(value=DEFAULT_SEARCH_MODE)
+        combo_mode = ttk.Combobox(top_frame, textvariable=self.search_mode_var, values=SEARCH_MODES,
+                                  state="readonly", width=10)
+        combo_mode.pack(side="left", padx=5)
+        Hovertip(combo_mode, "exact: the whole word or lemma\nprefix: words starting with the query\n"
+                             "substring: words containing the query")
 
         btn_search = ttk.Button(top_frame, text="Search", command=self.search)
         btn_search.pack(side="left", padx=5)
@@ -590,7 +921,8 @@ class ManagerApp:
         self.occ_numb_var = tk.StringVar(value="0")
         entry_occ = ttk.Entry(top_frame, textvariable=self.occ_numb_var, state="readonly", width=10)
         entry_occ.pack(side="left", padx=5)
-        Hovertip(entry_occ, "Total number of matching wordforms found.")
+        Hovertip(entry_occ, "Total number of matching wordforms found.\n"
+                            "Shown as 'N+' (rows loaded so far) while the total is being counted.")
 
         ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
 
@@ -608,11 +940,12 @@ class ManagerApp:
             stretch = tk.NO if col == "ID" else tk.YES  # Don't stretch hidden ID column
             self.tree_search.column(col, width=col_widths[col], anchor='w', stretch=stretch)
 
-        vsb_results = ttk.Scrollbar(table_results_frame, orient="vertical", command=self.tree_search.yview)
+        self.vsb_results = ttk.Scrollbar(table_results_frame, orient="vertical", command=self.tree_search.yview)
         hsb_results = ttk.Scrollbar(table_results_frame, orient="horizontal", command=self.tree_search.xview)
-        self.tree_search.configure(yscrollcommand=vsb_results.set, xscrollcommand=hsb_results.set)
+        # The next page is loaded when the visible part gets near the end of what is loaded
+        self.tree_search.configure(yscrollcommand=self.on_search_scroll, xscrollcommand=hsb_results.set)
 
-        vsb_results.pack(side="right", fill="y")
+        self.vsb_results.pack(side="right", fill="y")
         hsb_results.pack(side="bottom", fill="x")
         self.tree_search.pack(side="left", fill="both", expand=True)
         Hovertip(self.tree_search, "Double-click a row to edit the wordform details.")
@@ -685,6 +1018,31 @@ class ManagerApp:
         self.tree_stats_overall.pack(side="left", fill="both", expand=True)
         Hovertip(self.tree_stats_overall, "Total count for each part of speech across the entire corpus.")
 
+        group_frame = ttk.LabelFrame(frame, text="Parts of Speech by Group", padding="5")
+        group_frame.pack(pady=5, fill="both", expand=True)
+        group_selector_frame = ttk.Frame(group_frame)
+        group_selector_frame.pack(fill="x", pady=5)
+        ttk.Label(group_selector_frame, text="Group by:").pack(side="left", padx=5)
+        self.group_by_var = tk.StringVar(value=GROUP_COLUMNS[0])
+        combo_group = ttk.Combobox(group_selector_frame, textvariable=self.group_by_var, values=GROUP_COLUMNS,
+                                   state="readonly", width=10)
+        combo_group.pack(side="left", padx=5)
+        combo_group.bind("<<ComboboxSelected>>", self.load_group_stats)
+        btn_group = ttk.Button(group_selector_frame, text="Load Group Statistics", command=self.load_group_stats)
+        btn_group.pack(side="left", padx=5)
+        Hovertip(btn_group, "Share of each part of speech per genre, country or decade.\n"
+                            "A text with several genres or countries counts in each of them.")
+
+        group_table_frame = ttk.Frame(group_frame)
+        group_table_frame.pack(fill="both", expand=True)
+        self.tree_stats_group = ttk.Treeview(group_table_frame, show="headings", height=10)
+        vsb_group = ttk.Scrollbar(group_table_frame, orient="vertical", command=self.tree_stats_group.yview)
+        hsb_group = ttk.Scrollbar(group_table_frame, orient="horizontal", command=self.tree_stats_group.xview)
+        self.tree_stats_group.configure(yscrollcommand=vsb_group.set, xscrollcommand=hsb_group.set)
+        vsb_group.pack(side="right", fill="y")
+        hsb_group.pack(side="bottom", fill="x")
+        self.tree_stats_group.pack(side="left", fill="both", expand=True)
+
     def setup_stats_doc_tab(self):
         frame = self.stats_doc_frame
         # Document selection
@@ -715,6 +1073,63 @@ class ManagerApp:
         self.tree_stats_doc.pack(side="left", fill="both", expand=True)
         Hovertip(self.tree_stats_doc, "Part of speech counts for the selected text.")
 
+        similar_frame = ttk.LabelFrame(frame, text="Similar Texts", padding="5")
+        similar_frame.pack(pady=5, fill="both", expand=True)
+        self.tree_similar = ttk.Treeview(similar_frame, columns=("Title", "Similarity"), show="headings", height=SIMILAR_TEXTS)
+        self.tree_similar.heading("Title", text="Title", anchor='w')
+        self.tree_similar.column("Title", width=300, anchor='w')
+        self.tree_similar.heading("Similarity", text="Similarity", anchor='e')
+        self.tree_similar.column("Similarity", width=150, anchor='e', stretch=tk.NO)
+        self.tree_similar.pack(fill="both", expand=True)
+        Hovertip(self.tree_similar, "Texts with the most similar vocabulary (cosine of tf-idf weighted lemma counts).")
+
+    def setup_collocations_tab(self):
+        frame = self.collocations_frame
+        top_frame = ttk.Frame(frame)
+        top_frame.pack(fill="x", pady=5)
+
+        ttk.Label(top_frame, text="Lemma:").pack(side="left", padx=5)
+        self.colloc_lemma_var = tk.StringVar()
+        entry_lemma = ttk.Entry(top_frame, textvariable=self.colloc_lemma_var, width=30)
+        entry_lemma.pack(side="left", padx=5)
+        entry_lemma.bind("<Return>", self.load_collocates)
+        Hovertip(entry_lemma, "Enter a lemma to see the words it most often occurs with.")
+
+        self.colloc_measure_var = tk.StringVar(value=MEASURES[0])
+        combo_measure = ttk.Combobox(top_frame, textvariable=self.colloc_measure_var, values=MEASURES,
+                                     state="readonly", width=6)
+        combo_measure.pack(side="left", padx=5)
+        combo_measure.bind("<<ComboboxSelected>>", self.load_collocates)
+        Hovertip(combo_measure, "llr: log-likelihood ratio, favours frequent strong pairs\n"
+                                "pmi: pointwise mutual information, favours rare exclusive pairs")
+
+        btn_lookup = ttk.Button(top_frame, text="Show Collocates", command=self.load_collocates)
+        btn_lookup.pack(side="left", padx=5)
+
+        self.colloc_rebuild_button = ttk.Button(top_frame, text="Rebuild Collocations",
+                                                command=self.rebuild_collocations)
+        self.colloc_rebuild_button.pack(side="right", padx=5)
+        Hovertip(self.colloc_rebuild_button, "Recompute co-occurrence statistics for the whole corpus.\n"
+                                             "Other edits wait until it finishes.")
+
+        self.colloc_status_var = tk.StringVar(value="")
+        ttk.Label(frame, textvariable=self.colloc_status_var).pack(fill="x", pady=5)
+
+        table_frame = ttk.Frame(frame)
+        table_frame.pack(pady=5, fill="both", expand=True)
+        columns = ("Collocate", "Count", "PMI", "LLR")
+        self.tree_collocates = ttk.Treeview(table_frame, columns=columns, show="headings", height=20)
+        for col in columns:
+            self.tree_collocates.heading(col, text=col, anchor='w' if col == "Collocate" else 'e')
+            self.tree_collocates.column(col, width=300 if col == "Collocate" else 120,
+                                        anchor='w' if col == "Collocate" else 'e',
+                                        stretch=tk.YES if col == "Collocate" else tk.NO)
+        vsb = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree_collocates.yview)
+        self.tree_collocates.configure(yscrollcommand=vsb.set)
+        vsb.pack(side="right", fill="y")
+        self.tree_collocates.pack(side="left", fill="both", expand=True)
+        Hovertip(self.tree_collocates, "Lemmas found near the given one in the same sentence, best first.")
+
     def setup_edit_meta_tab(self):
         frame = self.edit_meta_frame
         selector_frame = ttk.Frame(frame)
@@ -776,11 +1191,11 @@ class ManagerApp:
         self.text_edit_widget.pack(fill="both", expand=True)
         Hovertip(self.text_edit_widget, "Edit the text content here. Undo/Redo available (Ctrl+Z/Ctrl+Y).")
 
-        btn_save_analyze = ttk.Button(frame, text="Save Text and Re-analyze Annotations",
-                                      command=self.save_and_reanalyze_text)
-        btn_save_analyze.pack(pady=10)
-        Hovertip(btn_save_analyze,
-                 "Save the edited text. WARNING: This will delete all existing annotations (lemma, POS, etc.) for this text and generate new ones based on the edited content. This can be slow.")
+        self.save_text_button = ttk.Button(frame, text="Save Text and Re-analyze Annotations",
+                                           command=self.save_and_reanalyze_text)
+        self.save_text_button.pack(pady=10)
+        Hovertip(self.save_text_button,
+                 "Save the edited text. Only the edited sentences and the sentences next to them are re-annotated; annotations elsewhere, including manual corrections, are kept.")
 
     # --- Action Handler Methods ---
 
@@ -791,15 +1206,119 @@ class ManagerApp:
             # messagebox.showwarning("Empty Query", "Please enter a word or lemma to search.")
             return  # Don't search if query is empty
 
+        self.hide_suggestions()
         print(f"Searching for: {word}")
         self.last_search_word = word
+        mode = self.search_mode_var.get()
+        self.search_mode = mode
+
+        # A new search supersedes the running one, its next page and its count
+        self.executor.cancel("search-page")
+        self.executor.cancel("search-count")
+        self.search_next_key = None
+        self.search_count_key = self.conn.match_count_key(word, mode)
+        self.executor.submit_read(self.conn.find_info_by_word, word, mode=mode, count_key=self.search_count_key,
+                                  key="search", on_done=self.show_search_results)
+
+    def load_suggestion_index(self):
+        self.suggest_generation = self.conn.write_generation
+        self.executor.submit_read(self.conn.build_suggestion_index, key="suggest-index",
+                                  on_done=self.set_suggestion_index,
+                                  on_error=lambda e: print(f"Error building the suggestion index: {e}"))
+
+    def set_suggestion_index(self, index):
+        self.suggest_index = index
+        print(f"Suggestion index ready: {len(index)} terms.")
+
+    def on_search_typed(self, event):
+        if event.keysym in ("Return", "KP_Enter", "Escape", "Down", "Up", "Tab"):
+            return
+        if self.suggest_generation != self.conn.write_generation:
+            # Edits were saved since the index was built: rebuild it, the old one is used meanwhile
+            self.load_suggestion_index()
+        if self.suggest_index is None:
+            return
+        suggestions = self.suggest_index.suggest(self.entry_var.get(), SUGGESTION_COUNT)
+        if suggestions:
+            self.show_suggestions(suggestions)
+        else:
+            self.hide_suggestions()
+
+    def show_suggestions(self, suggestions):
+        if self.suggest_popup is None:
+            self.suggest_popup = tk.Toplevel(self.root)
+            self.suggest_popup.overrideredirect(True)
+            self.suggest_list = tk.Listbox(self.suggest_popup, height=SUGGESTION_COUNT, activestyle="dotbox",
+                                           exportselection=False)
+            self.suggest_list.pack(fill="both", expand=True)
+            self.suggest_list.bind("<Return>", self.choose_suggestion)
+            self.suggest_list.bind("<ButtonRelease-1>", self.choose_suggestion)
+            self.suggest_list.bind("<Escape>", lambda event: (self.hide_suggestions(), self.entry_search.focus_set()))
+            self.suggest_list.bind("<FocusOut>", lambda event: self.root.after(150, self.hide_suggestions_unless_focused))
+
+        self.suggest_terms = [term for term, _ in suggestions]
+        self.suggest_list.delete(0, "end")
+        for term, weight in suggestions:
+            self.suggest_list.insert("end", f"{term}  ({weight})")
+        self.suggest_list.configure(height=len(suggestions))
+        x = self.entry_search.winfo_rootx()
+        y = self.entry_search.winfo_rooty() + self.entry_search.winfo_height()
+        self.suggest_popup.geometry(f"{self.entry_search.winfo_width()}x{self.suggest_list.winfo_reqheight()}+{x}+{y}")
+        self.suggest_popup.deiconify()
+        self.suggest_popup.lift()
+
+    def hide_suggestions(self, event=None):
+        if self.suggest_popup is not None:
+            self.suggest_popup.withdraw()
+
+    def hide_suggestions_unless_focused(self):
+        focused = self.root.focus_get()
+        if focused is not self.entry_search and (self.suggest_popup is None or focused is not self.suggest_list):
+            self.hide_suggestions()
+
+    def focus_suggestions(self, event=None):
+        if self.suggest_popup is not None and self.suggest_popup.winfo_viewable():
+            self.suggest_list.focus_set()
+            self.suggest_list.selection_clear(0, "end")
+            self.suggest_list.selection_set(0)
+            self.suggest_list.activate(0)
+        return "break"
+
+    def choose_suggestion(self, event=None):
+        selection = self.suggest_list.curselection()
+        if not selection:
+            return
+        self.entry_var.set(self.suggest_terms[selection[0]])
+        self.entry_search.icursor("end")
+        self.entry_search.focus_set()
+        # A suggestion is a whole word or lemma
+        self.search_mode_var.set("exact")
+        self.search()
+
+    def show_search_results(self, res):
+        self.tree_search.delete(*self.tree_search.get_children())
+        self.search_next_key = res["next_key"]
+        self.insert_search_results(res["search_results"])
 
-        res = self.conn.find_info_by_word(word)
+        # Only the first page is read here; the total comes from the cache or a background count
+        if res["occurences"] is not None or not res["search_results"]:
+            self.search_count_key = None
+            self.occ_numb_var.set(res["occurences"] or "0")
+        else:
+            self.update_approximate_count()
+            self.executor.submit_read(self.conn.count_all_matches, self.last_search_word, self.search_mode,
+                                      self.search_count_key, key="search-count", on_done=self.show_match_count,
+                                      on_error=self.match_count_failed)
 
-        self.occ_numb_var.set(res["occurences"])
+        self.tree_examples.delete(*self.tree_examples.get_children())
+        for example in res["examples"]:
+            self.tree_examples.insert("", "end", values=(
+                example["text"], example["link"], example["genre"]
+            ))
+        print("Search complete.")
 
-        self.tree_search.delete(*self.tree_search.get_children())
-        for result in res["search_results"]:
+    def insert_search_results(self, results):
+        for result in results:
             values = (
                 result.wordform_id,
                 result.wordform,
@@ -810,16 +1329,45 @@ class ManagerApp:
             )
             self.tree_search.insert("", "end", values=values, iid=result.wordform_id)
 
-        self.tree_examples.delete(*self.tree_examples.get_children())
-        for example in res["examples"]:
-            self.tree_examples.insert("", "end", values=(
-                example["text"], example["link"], example["genre"]
-            ))
-        print("Search complete.")
+    def update_approximate_count(self):
+        loaded = len(self.tree_search.get_children())
+        self.occ_numb_var.set(f"{loaded}+" if self.search_next_key else str(loaded))
+
+    def on_search_scroll(self, first, last):
+        self.vsb_results.set(first, last)
+        if self.search_next_key and float(last) >= SEARCH_PRELOAD_FRACTION:
+            # after_idle: the Treeview is still inside its own redraw while reporting the scroll position
+            self.root.after_idle(self.load_next_search_page)
+
+    def load_next_search_page(self):
+        after = self.search_next_key
+        if not after:
+            return
+        self.search_next_key = None  # One page at a time even if several scroll events arrive
+        self.executor.submit_read(self.conn.find_next_page, self.last_search_word, self.search_mode, after,
+                                  key="search-page", on_done=self.show_next_search_page,
+                                  on_error=lambda e: print(f"Error loading the next page of results: {e}"))
+
+    def show_next_search_page(self, page):
+        self.search_next_key = page["next_key"]
+        self.insert_search_results(page["search_results"])
+        if self.search_count_key is not None:
+            self.update_approximate_count()
+
+    def show_match_count(self, total):
+        self.search_count_key = None
+        self.occ_numb_var.set(str(total))
+
+    def match_count_failed(self, error):
+        print(f"Error counting matches for '{self.last_search_word}': {error}")
+        self.search_count_key = None
 
     def load_overall_stats(self):
         print("Loading overall statistics...")
-        stats = self.conn.get_overall_pos_stats()
+        self.executor.submit_read(self.conn.get_overall_pos_stats, key="stats-overall",
+                                  on_done=self.show_overall_stats)
+
+    def show_overall_stats(self, stats):
         self.tree_stats_overall.delete(*self.tree_stats_overall.get_children())
         for row in stats:
             self.tree_stats_overall.insert("", "end", values=(row['pos'], row['count']))
@@ -830,13 +1378,91 @@ class ManagerApp:
         self.tree_stats_doc.delete(*self.tree_stats_doc.get_children())
         if file_id is not None:
             print(f"Loading document statistics for file_id: {file_id}")
-            stats = self.conn.get_document_pos_stats(file_id)
-            for row in stats:
-                self.tree_stats_doc.insert("", "end", values=(row['pos'], row['count']))
-            print("Document statistics loaded.")
+            self.executor.submit_read(self.conn.get_document_pos_stats, file_id, key="stats-doc",
+                                      on_done=self.show_doc_stats)
+            self.executor.submit_read(self.conn.get_similar_texts, file_id, key="similar-texts",
+                                      on_done=self.show_similar_texts)
         else:
+            self.executor.cancel("stats-doc")
+            self.executor.cancel("similar-texts")
+            self.tree_similar.delete(*self.tree_similar.get_children())
             print("No document selected for statistics.")
 
+    def show_doc_stats(self, stats):
+        self.tree_stats_doc.delete(*self.tree_stats_doc.get_children())
+        for row in stats:
+            self.tree_stats_doc.insert("", "end", values=(row['pos'], row['count']))
+        print("Document statistics loaded.")
+
+    def show_similar_texts(self, similar):
+        self.tree_similar.delete(*self.tree_similar.get_children())
+        for row in similar:
+            self.tree_similar.insert("", "end", values=(row['title'], f"{row['score']:.3f}"))
+
+    def load_group_stats(self, event=None):
+        column = self.group_by_var.get()
+        print(f"Loading statistics by {column}...")
+        self.executor.submit_read(self.conn.get_group_pos_stats, column, key="stats-group",
+                                  on_done=self.show_group_stats)
+
+    def show_group_stats(self, stats):
+        tree = self.tree_stats_group
+        tree.delete(*tree.get_children())
+        # One column per tag, most frequent tags first
+        totals = {}
+        for _, _, tokens, shares in stats:
+            for pos, share in shares.items():
+                totals[pos] = totals.get(pos, 0) + share * tokens
+        pos_columns = sorted(totals, key=totals.get, reverse=True)
+        columns = ("Group", "Texts", "Tokens", *pos_columns)
+        tree.configure(columns=columns)
+        for col in columns:
+            tree.heading(col, text=col, anchor='w' if col == "Group" else 'e')
+            tree.column(col, width=200 if col == "Group" else 90, anchor='w' if col == "Group" else 'e',
+                        stretch=tk.YES if col == "Group" else tk.NO)
+        for name, documents, tokens, shares in stats:
+            tree.insert("", "end", values=(name, documents, tokens,
+                                           *(f"{shares.get(pos, 0):.1%}" for pos in pos_columns)))
+        print("Group statistics loaded.")
+
+    def load_collocates(self, event=None):
+        lemma = self.colloc_lemma_var.get().strip()
+        if not lemma:
+            return
+        self.executor.submit_read(self.conn.get_collocates, lemma, self.colloc_measure_var.get(), key="collocates",
+                                  on_done=self.show_collocates)
+
+    def show_collocates(self, result):
+        self.tree_collocates.delete(*self.tree_collocates.get_children())
+        for row in result['rows']:
+            self.tree_collocates.insert("", "end", values=(row['collocate'], row['pair_count'],
+                                                           f"{row['pmi']:.2f}", f"{row['llr']:.1f}"))
+        self.show_collocation_status(result['summary'], result['lemma'], len(result['rows']))
+
+    def show_collocation_status(self, summary, lemma=None, found=None):
+        if summary is None:
+            self.colloc_status_var.set("Collocations have not been computed yet, press 'Rebuild Collocations'.")
+            return
+        status = (f"Built {summary['built_at']} over {summary['tokens']} tokens "
+                  f"(window {summary['window']}, pairs seen at least {summary['min_count']} times).")
+        if summary.get('outdated'):
+            status += " Texts have changed since, rebuild to include the changes."
+        if lemma is not None and not found:
+            status = f"No collocates for '{lemma}'. " + status
+        self.colloc_status_var.set(status)
+
+    def rebuild_collocations(self):
+        self.colloc_rebuild_button.config(state="disabled")
+        self.colloc_status_var.set("Computing collocations...")
+        self.executor.submit_write(self.conn.rebuild_collocations, on_done=self.collocations_rebuilt)
+
+    def collocations_rebuilt(self, summary):
+        self.colloc_rebuild_button.config(state="normal")
+        if summary is not None:
+            self.show_collocation_status(summary)
+            if self.colloc_lemma_var.get().strip():
+                self.load_collocates()
+
     def get_selected_file_id(self, combo_var):
         selected_title_display = combo_var.get()
         if not selected_title_display:
@@ -855,16 +1481,20 @@ class ManagerApp:
 
         if self.current_edit_meta_file_id is not None:
             print(f"Loading metadata for editing file_id: {self.current_edit_meta_file_id}")
-            metadata = self.conn.get_text_metadata(self.current_edit_meta_file_id)
-            if metadata:
-                for field, entry_var in self.edit_meta_entries.items():
-                    entry_var.set(metadata[field] if metadata[field] is not None else "")
-                print("Metadata loaded into fields.")
-            else:
-                messagebox.showerror("Error", f"Could not load metadata for file ID: {self.current_edit_meta_file_id}")
+            self.executor.submit_read(self.conn.get_text_metadata, self.current_edit_meta_file_id,
+                                      key="edit-meta", on_done=self.show_metadata_for_editing)
         else:
+            self.executor.cancel("edit-meta")
             print("No document selected for metadata editing.")
 
+    def show_metadata_for_editing(self, metadata):
+        if metadata:
+            for field, entry_var in self.edit_meta_entries.items():
+                entry_var.set(metadata[field] if metadata[field] is not None else "")
+            print("Metadata loaded into fields.")
+        else:
+            messagebox.showerror("Error", f"Could not load metadata for file ID: {self.current_edit_meta_file_id}")
+
     def save_metadata_changes(self):
         if not hasattr(self, 'current_edit_meta_file_id') or self.current_edit_meta_file_id is None:
             messagebox.showwarning("No Selection", "Please select a text to edit its metadata first.")
@@ -873,21 +1503,24 @@ class ManagerApp:
         print(f"Saving metadata for file_id: {self.current_edit_meta_file_id}")
         data_to_update = {field: entry_var.get() for field, entry_var in self.edit_meta_entries.items()}
 
-        if self.conn.update_text_metadata(self.current_edit_meta_file_id, data_to_update):
+        file_id = self.current_edit_meta_file_id
+
+        def saved(success):
+            if not success:
+                # Error message already shown by DBConnection method
+                print("Metadata save failed.")
+                return
             messagebox.showinfo("Success", "Metadata updated successfully.")
-            self.load_texts_list()
-            # Try to re-select the edited item in the current combobox
-            # (get_text_metadata needed again to find potential new title)
-            updated_metadata = self.conn.get_text_metadata(self.current_edit_meta_file_id)
-            if updated_metadata:
-                new_display_title = updated_metadata['title'] if updated_metadata[
-                    'title'] else f"ID: {updated_metadata['file_id']}"
+            # Re-select the edited item in the current combobox once the list has the new title
+            new_display_title = data_to_update.get('title') or f"ID: {file_id}"
+
+            def reselect():
                 if new_display_title in self.text_titles:
                     self.edit_meta_doc_selector_var.set(new_display_title)
 
-        else:
-            # Error message already shown by DBConnection method
-            print("Metadata save failed.")
+            self.load_texts_list(then=reselect)
+
+        self.executor.submit_write(self.conn.update_text_metadata, file_id, data_to_update, on_done=saved)
 
     def load_text_for_editing(self, event=None):
         self.current_edit_text_file_id = self.get_selected_file_id(self.edit_text_doc_selector_var)
@@ -896,18 +1529,24 @@ class ManagerApp:
 
         if self.current_edit_text_file_id is not None:
             print(f"Loading text content for editing file_id: {self.current_edit_text_file_id}")
-            metadata = self.conn.get_text_metadata(self.current_edit_text_file_id)
-            if metadata and metadata['text'] is not None:
-                self.text_edit_widget.insert('1.0', metadata['text'])
-                print("Text content loaded.")
-            elif metadata:
-                print(f"Text content is empty for file_id: {self.current_edit_text_file_id}")
-            else:
-                messagebox.showerror("Error",
-                                     f"Could not load text content for file ID: {self.current_edit_text_file_id}")
+            self.executor.submit_read(self.conn.get_text_content, self.current_edit_text_file_id,
+                                      key="edit-text", on_done=self.show_text_for_editing)
         else:
+            self.executor.cancel("edit-text")
             print("No document selected for text editing.")
 
+    def show_text_for_editing(self, content):
+        found, text = content
+        if found and text is not None:
+            self.text_edit_widget.insert('1.0', text)
+            self.text_edit_widget.edit_reset()
+            print("Text content loaded.")
+        elif found:
+            print(f"Text content is empty for file_id: {self.current_edit_text_file_id}")
+        else:
+            messagebox.showerror("Error",
+                                 f"Could not load text content for file ID: {self.current_edit_text_file_id}")
+
     def save_and_reanalyze_text(self):
         """Saves edited text content and triggers database update and spaCy re-analysis."""
         if not hasattr(self, 'current_edit_text_file_id') or self.current_edit_text_file_id is None:
@@ -915,30 +1554,38 @@ class ManagerApp:
             return
 
         # Get edited text from the widget
-        new_text = self.text_edit_widget.get('1.0', tk.END).strip()  # Strip trailing whitespace/newlines
+        # 'end-1c' drops only the newline Tk appends, so an untouched text compares equal to the stored one
+        # and re-analysis is limited to the sentences that were actually edited
+        new_text = self.text_edit_widget.get('1.0', 'end-1c')
 
         # Confirm with the user due to destructive nature of re-analysis
         if not messagebox.askyesno("Confirm Re-analysis",
-                                   "Saving this text will DELETE all existing annotations (lemma, POS, etc.) "
-                                   "for this document and generate new ones.\n\n"
+                                   "Saving this text will DELETE the annotations (lemma, POS, etc.) "
+                                   "of the edited sentences and generate new ones. "
+                                   "Annotations of unchanged sentences are kept.\n\n"
                                    "This process might take some time and cannot be undone.\n\n"
                                    "Are you sure you want to continue?"):
             return  # User cancelled
 
-        print(f"Starting save and re-analyze process for file_id: {self.current_edit_text_file_id}")
+        file_id = self.current_edit_text_file_id
+        print(f"Starting save and re-analyze process for file_id: {file_id}")
+        # Re-analysis runs on the writer thread; the window stays usable, the button waits for the result
         self.root.config(cursor="watch")
-        self.root.update_idletasks()
-
-        success, message = self.conn.update_text_content_and_reanalyze(self.current_edit_text_file_id, new_text)
-
-        self.root.config(cursor="")
-        if success:
-            messagebox.showinfo("Success", message)
-            self.text_edit_widget.edit_reset()
-        else:
-            messagebox.showerror("Error", message)
+        self.save_text_button.config(state="disabled")
+
+        def finished(result):
+            success, message = result
+            self.root.config(cursor="")
+            self.save_text_button.config(state="normal")
+            if success:
+                messagebox.showinfo("Success", message)
+                if self.current_edit_text_file_id == file_id:
+                    self.text_edit_widget.edit_reset()
+            else:
+                messagebox.showerror("Error", message)
+            print(f"Save and re-analyze process finished for file_id: {file_id}")
 
-        print(f"Save and re-analyze process finished for file_id: {self.current_edit_text_file_id}")
+        self.executor.submit_write(self.conn.update_text_content_and_reanalyze, file_id, new_text, on_done=finished)
 
     def get_selected_wordform_id(self):
         selected_items = self.tree_search.selection()
@@ -966,7 +1613,10 @@ class ManagerApp:
             return  # Message already shown by helper function
 
         print(f"Opening edit window for wordform_id: {wordform_id}")
-        details = self.conn.get_wordform_details(wordform_id)
+        self.executor.submit_read(self.conn.get_wordform_details, wordform_id, key="wordform-details",
+                                  on_done=lambda details: self.show_wordform_edit_window(wordform_id, details))
+
+    def show_wordform_edit_window(self, wordform_id, details):
         if not details:
             messagebox.showerror("Error", f"Could not load details for wordform ID: {wordform_id}")
             return
@@ -1019,11 +1669,17 @@ class ManagerApp:
 
         new_data['wordform'] = new_data['wordform'].lower()
 
-        if self.conn.update_wordform(wordform_id, new_data):
+        self.executor.submit_write(
+            self.conn.update_wordform, wordform_id, new_data,
+            on_done=lambda updated: self.wordform_edit_saved(wordform_id, new_data, popup_window, updated))
+
+    def wordform_edit_saved(self, wordform_id, new_data, popup_window, updated):
+        if updated:
             print(f"Wordform ID {wordform_id} updated successfully in DB.")
             # Optional: Show success message inside the popup before destroying it
             # messagebox.showinfo("Success", "Entry updated successfully.", parent=popup_window)
-            popup_window.destroy()
+            if popup_window.winfo_exists():
+                popup_window.destroy()
 
             try:
                 current_values = list(self.tree_search.item(wordform_id, 'values'))
@@ -1047,8 +1703,9 @@ class ManagerApp:
                 self.refresh_search_results()
         else:
             print(f"Failed to save changes for wordform_id: {wordform_id}")
-            popup_window.focus_set()
-            popup_window.grab_set()
+            if popup_window.winfo_exists():
+                popup_window.focus_set()
+                popup_window.grab_set()
 
     def delete_selected_wordform(self):
         """Deletes the selected wordform entry from the database and the table."""
@@ -1061,31 +1718,35 @@ class ManagerApp:
         if messagebox.askyesno("Confirm Deletion",
                                f"Are you sure you want to permanently delete wordform entry ID: {wordform_id}?\n"
                                "This action cannot be undone."):
-            # Call DBConnection method to delete from database
-            if self.conn.delete_wordform(wordform_id):
-                print(f"Wordform ID {wordform_id} deleted successfully from DB.")
-                # Remove the row from the Treeview table
-                try:
-                    if self.tree_search.exists(wordform_id):  # Check if item still exists
-                        self.tree_search.delete(wordform_id)  # Use iid to delete
-                        print(f"Treeview row deleted for iid {wordform_id}.")
-                        # Decrement the occurrence counter
-                        try:
-                            current_count = int(self.occ_numb_var.get())
-                            self.occ_numb_var.set(str(max(0, current_count - 1)))  # Avoid going below zero
-                        except ValueError:
-                            self.refresh_search_results()
-                    else:
-                        print(f"Treeview item {wordform_id} already removed or never existed.")
-                        self.refresh_search_results()
+            # Call DBConnection method to delete from database (on the writer thread)
+            self.executor.submit_write(self.conn.delete_wordform, wordform_id,
+                                       on_done=lambda deleted: self.wordform_deleted(wordform_id, deleted))
+        else:
+            print("Deletion cancelled by user.")
 
-                except (tk.TclError, Exception) as e:
-                    print(f"Error deleting Treeview row {wordform_id}: {e}. Refreshing search results.")
+    def wordform_deleted(self, wordform_id, deleted):
+        if deleted:
+            print(f"Wordform ID {wordform_id} deleted successfully from DB.")
+            # Remove the row from the Treeview table
+            try:
+                if self.tree_search.exists(wordform_id):  # Check if item still exists
+                    self.tree_search.delete(wordform_id)  # Use iid to delete
+                    print(f"Treeview row deleted for iid {wordform_id}.")
+                    # Decrement the occurrence counter
+                    try:
+                        current_count = int(self.occ_numb_var.get())
+                        self.occ_numb_var.set(str(max(0, current_count - 1)))  # Avoid going below zero
+                    except ValueError:
+                        self.refresh_search_results()
+                else:
+                    print(f"Treeview item {wordform_id} already removed or never existed.")
                     self.refresh_search_results()
-            else:
-                print(f"Failed to delete wordform_id: {wordform_id}")
+
+            except (tk.TclError, Exception) as e:
+                print(f"Error deleting Treeview row {wordform_id}: {e}. Refreshing search results.")
+                self.refresh_search_results()
         else:
-            print("Deletion cancelled by user.")
+            print(f"Failed to delete wordform_id: {wordform_id}")
 
     def refresh_search_results(self):
         print("Refreshing search results...")
@@ -1095,6 +1756,10 @@ class ManagerApp:
         else:
             self.tree_search.delete(*self.tree_search.get_children())
             self.tree_examples.delete(*self.tree_examples.get_children())
+            for key in ("search", "search-page", "search-count"):
+                self.executor.cancel(key)
+            self.search_next_key = None
+            self.search_count_key = None
             self.occ_numb_var.set("0")
             print("No previous search query found to refresh.")
 
@@ -1104,8 +1769,11 @@ class ManagerApp:
         if selected_iid is None:
             return  # Сообщение уже показано
 
-        # Получаем полные данные из БД и таблицы
-        db_details = self.conn.get_wordform_details(selected_iid)
+        # Получаем полные данные из БД (в фоне), затем из таблицы
+        self.executor.submit_read(self.conn.get_wordform_details, selected_iid, key="wordform-details",
+                                  on_done=lambda details: self.export_wordform_details(selected_iid, details))
+
+    def export_wordform_details(self, selected_iid, db_details):
         print(db_details)
         if not db_details:
             messagebox.showerror("Error", f"Could not fetch details for ID {selected_iid} from database.")
@@ -1198,12 +1866,13 @@ class ManagerApp:
 
     def import_wordforms_from_json(self):
         """
-        Imports wordform data from a JSON file to update existing entries in the database.
-        Reads a JSON file where keys are wordform_ids (as strings) and values
-        are dictionaries containing 'wordform', 'lemma', 'morph', 'pos'.
+        Imports wordform data from a JSON or JSON Lines file to update existing entries in the database.
+        .json: keys are wordform_ids (as strings) and values are dictionaries containing
+        'wordform', 'lemma', 'morph', 'pos'. .jsonl: one such entry per line (see bulk_import).
+        The whole file is validated first on a reader thread, then all updates are applied in one transaction.
         """
         file_path = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("JSON files", "*.json *.jsonl"), ("All files", "*.*")],
             title="Select JSON File to Import Wordform Data"
         )
 
@@ -1214,161 +1883,81 @@ class ManagerApp:
 
         print(f"APP: Attempting to import data from: {file_path}")
 
-        # Инициализация счетчиков для итоговой статистики
-        actually_updated_count = 0  # Счетчик РЕАЛЬНО обновленных строк в БД
-        processed_ok_count = 0  # Счетчик успешно выполненных DB операций (без SQL/Data ошибок)
-        not_found_count = 0  # Счетчик ID, не найденных в БД для обновления
-        error_count = 0  # Счетчик ошибок SQL или данных при попытке обновления
-        skipped_count = 0  # Счетчик записей с неверным форматом/ID в JSON файле
+        # Шаг 1: Проверка всего файла до каких-либо изменений в БД, в фоне: большой .jsonl читается долго
+        self.executor.submit_read(lambda cursor: validate_import_file(file_path), key="import-validate",
+                                  on_done=lambda report: self.confirm_import(file_path, report),
+                                  on_error=lambda e: self.import_validation_failed(file_path, e))
 
-        try:
-            # Шаг 1: Чтение и парсинг JSON файла
-            with open(file_path, 'r', encoding='utf-8') as f:
-                try:
-                    data_to_import = json.load(f)
-                except json.JSONDecodeError as e:
-                    messagebox.showerror("JSON Error",
-                                         f"Failed to decode JSON file:\n{e}\n\nPlease ensure the file contains valid JSON.")
-                    return
-
-            # Шаг 2: Проверка основного формата данных (должен быть словарь)
-            if not isinstance(data_to_import, dict):
-                messagebox.showerror("Format Error",
-                                     "The JSON file must contain a dictionary (key-value pairs representing wordform_id: data) at the top level.")
-                return
-
-            # Шаг 3: Подтверждение перед началом импорта
-            num_entries = len(data_to_import)
-            if num_entries == 0:
-                messagebox.showinfo("Info", "The selected JSON file contains no data entries.")
-                return
+    def confirm_import(self, file_path, report):
+        for problem in report["problems"]:
+            print(f"APP: Skipping {problem}.")
 
-            confirm = messagebox.askyesno(
-                "Confirm Import",
-                f"Found {num_entries} potential entries in the JSON file.\n"
-                f"This will attempt to update existing wordform entries in the database using the IDs from the file.\n\n"
-                f"Proceed with the import?",
-                parent=self.root  # Делаем окно подтверждения модальным относительно главного
-            )
-
-            if not confirm:
-                print("APP: Import cancelled by user confirmation.")
-                return
-
-            # Шаг 4: Итерация по записям из файла и обработка каждой
-            print(f"APP: Starting import process for {num_entries} entries...")
-            for wordform_id_str, entry_data in data_to_import.items():
+        num_entries = report["valid"] + report["skipped"]
+        if num_entries == 0:
+            messagebox.showinfo("Info", "The selected JSON file contains no data entries.")
+            return
+        if report["valid"] == 0:
+            messagebox.showerror("Format Error",
+                                 f"None of the {num_entries} entries in the file can be imported.\n\n"
+                                 + "\n".join(report["problems"]))
+            return
 
-                # 4.1 Валидация ID (должен быть конвертируемым в int)
-                try:
-                    wordform_id = int(wordform_id_str)
-                except (ValueError, TypeError):
-                    print(f"APP: Skipping invalid ID '{wordform_id_str}' (not an integer).")
-                    skipped_count += 1
-                    continue  # Переходим к следующей записи в файле
-
-                # 4.2 Валидация формата данных для записи (должен быть словарем)
-                if not isinstance(entry_data, dict):
-                    print(
-                        f"APP: Skipping invalid data format for ID {wordform_id} (expected dictionary, got {type(entry_data)}).")
-                    skipped_count += 1
-                    continue
-
-                # 4.3 Проверка наличия обязательных полей для обновления
-                required_fields = ['wordform', 'lemma', 'morph', 'pos']
-                missing_fields = [field for field in required_fields if field not in entry_data]
-                if missing_fields:
-                    print(
-                        f"APP: Skipping incomplete data for ID {wordform_id} (missing fields: {', '.join(missing_fields)}).")
-                    skipped_count += 1
-                    continue
+        # Шаг 2: Подтверждение перед началом импорта
+        confirm = messagebox.askyesno(
+            "Confirm Import",
+            f"Found {num_entries} entries in the file, {report['valid']} valid "
+            f"and {report['skipped']} with invalid format/ID.\n"
+            f"This will update existing wordform entries in the database using the IDs from the file "
+            f"in a single transaction.\n\n"
+            f"Proceed with the import?",
+            parent=self.root  # Делаем окно подтверждения модальным относительно главного
+        )
 
-                # 4.4 Подготовка данных (очистка, приведение типов)
-                try:
-                    update_data = {
-                        'wordform': str(entry_data['wordform']).lower().strip(),
-                        'lemma': str(entry_data['lemma']).strip(),
-                        'morph': str(entry_data['morph']).strip(),
-                        'pos': str(entry_data['pos']).strip()
-                    }
-                except Exception as e:
-                    # Ошибка при обработке значений полей (например, если там не строки)
-                    print(f"APP: Error preparing data fields for ID {wordform_id}: {e}. Skipping.")
-                    skipped_count += 1
-                    continue
-
-                # 4.5 Вызов метода обновления/замены в БД и получение результата
-                # (Метод replace_wordform теперь делает SELECT + UPDATE)
-                rows_affected = self.conn.replace_wordform(wordform_id, update_data)
-                print(f"APP: Result (rows affected) from DB operation for ID {wordform_id}: {rows_affected}")
-
-                # 4.6 Интерпретация результата и обновление счетчиков
-                # rows_affected: >0 (обычно 1) = Успешно обновлено; 0 = ID не найден; -1 = Ошибка SQL; -2 = Ошибка данных
-                if rows_affected >= 0:  # Если не было ошибки (-1 или -2)
-                    processed_ok_count += 1  # Считаем, что операция в БД прошла без сбоя
-                    if rows_affected > 0:  # Если реально была обновлена строка
-                        actually_updated_count += 1
-                        # Немедленно обновляем видимую строку в таблице, если она там есть
-                        if self.tree_search.exists(wordform_id):
-                            try:
-                                current_values = list(self.tree_search.item(wordform_id, 'values'))
-                                link_value = current_values[5] if len(current_values) > 5 else "N/A"
-                                updated_values = (
-                                    wordform_id, update_data['wordform'], update_data['lemma'],
-                                    update_data['morph'], update_data['pos'], link_value
-                                )
-                                self.tree_search.item(wordform_id, values=updated_values)
-                                print(f"APP: Treeview row for ID {wordform_id} updated visually.")
-                            except (tk.TclError, IndexError, Exception) as e:
-                                print(
-                                    f"APP: Warning - Could not update Treeview row for ID {wordform_id} after import: {e}")
-                    elif rows_affected == 0:
-                        # ID не был найден в базе данных, считаем это отдельно
-                        not_found_count += 1
-                else:  # Если rows_affected < 0 (была ошибка -1 или -2)
-                    error_count += 1
-                    # Можно добавить опцию остановки импорта при первой ошибке
-                    # print("APP: Stopping import due to database error.")
-                    # break # Раскомментировать для остановки
-
-            # Шаг 5: Показ итогового сообщения пользователю
-            summary_message = (f"Import process finished.\n\n"
-                               f"Entries in JSON file: {num_entries}\n"
-                               f"DB operations attempted: {processed_ok_count}\n"
-                               f"Entries actually updated in DB: {actually_updated_count}\n"
-                               f"Entries not found in DB: {not_found_count}\n"
-                               f"Database/Data errors during update: {error_count}\n"
-                               f"Skipped entries (invalid format/ID): {skipped_count}")
-            print(
-                f"APP: Import Summary - {summary_message.replace('\n\n', ' // ').replace('\n', ' / ')}")  # Логируем итог
-
-            # Выбираем тип сообщения в зависимости от наличия ошибок
-            if error_count > 0:
-                messagebox.showwarning("Import Complete with Errors", summary_message)
-            else:
-                messagebox.showinfo("Import Complete", summary_message)
+        if not confirm:
+            print("APP: Import cancelled by user confirmation.")
+            return
 
-            # Шаг 6: Обновление результатов поиска после импорта
-            # Обновляем, если были реальные изменения, ошибки или ID не были найдены (чтобы убедиться в консистентности)
-            if actually_updated_count > 0 or error_count > 0 or not_found_count > 0:
-                print("APP: Refreshing search results after import.")
-                self.refresh_search_results()
-            else:
-                print("APP: No actual updates, errors, or 'not found' entries occurred; skipping search refresh.")
+        # Шаг 3: Применение (файл читается повторно, поэтому .jsonl не держится в памяти целиком)
+        print(f"APP: Starting import process for {report['valid']} entries...")
+        self.executor.submit_write(
+            self.conn.import_wordforms, iter_valid_rows(iter_import_entries(file_path)), file_path,
+            on_done=lambda result: self.wordforms_imported(num_entries, report['skipped'], result))
 
+    def import_validation_failed(self, file_path, e):
         # Обработка ошибок чтения файла или других непредвиденных исключений
-        except FileNotFoundError:
+        if isinstance(e, ImportFormatError):
+            messagebox.showerror("JSON Error", f"{e}\n\nPlease ensure the file contains valid JSON.")
+        elif isinstance(e, FileNotFoundError):
             messagebox.showerror("File Error", f"The selected file was not found:\n{file_path}")
             print(f"APP: Error - File not found: {file_path}")
-        except IOError as e:
+        elif isinstance(e, IOError):
             messagebox.showerror("File Error", f"An error occurred while reading the file:\n{e}")
             print(f"APP: Error - I/O error reading file: {e}")
-        except Exception as e:
+        else:
             messagebox.showerror("Import Error", f"An unexpected error occurred during the import process:\n{e}")
             import traceback
-            traceback.print_exc()  # Выводим traceback в консоль для полной диагностики
+            traceback.print_exception(e)  # Выводим traceback в консоль для полной диагностики
             print(f"APP: Error - Unexpected exception during import: {e}")
 
+    def wordforms_imported(self, num_entries, skipped_count, result):
+        if result is None:
+            return  # Rolled back, the error was already shown
+        updated_count, not_found_count = result
+
+        # Шаг 4: Показ итогового сообщения пользователю
+        summary_message = (f"Import process finished.\n\n"
+                           f"Entries in file: {num_entries}\n"
+                           f"Entries actually updated in DB: {updated_count}\n"
+                           f"Entries not found in DB: {not_found_count}\n"
+                           f"Skipped entries (invalid format/ID): {skipped_count}")
+        print(f"APP: Import Summary - {summary_message.replace('\n\n', ' // ').replace('\n', ' / ')}")
+        messagebox.showinfo("Import Complete", summary_message)
+
+        # Шаг 5: Одно обновление результатов поиска после импорта
+        if updated_count > 0:
+            print("APP: Refreshing search results after import.")
+            self.refresh_search_results()
+
 
 if __name__ == "__main__":
     load_spacy_model()
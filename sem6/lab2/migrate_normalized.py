@@ -0,0 +1,139 @@
+"""
+Переводит существующую movies.db в нормализованный вид (см. dictionary_schema.py)
+и замеряет размер базы и время прямых запросов к wordforms до и после.
+
+    python migrate_normalized.py [movies.db]
+"""
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+
+from dictionary_schema import is_normalized, migrate_to_normalized
+from pos_stats import ensure_pos_stats
+from corpus_matrices import ensure_doc_versions
+from search_index import ensure_search_index
+
+DB_PATH = "movies.db"
+MAKE_BACKUP = True         # Копия <db>.bak перед миграцией
+TIMING_RUNS = 5            # Прогонов каждого запроса, берётся медиана
+
+
+def database_size(db):
+    """Used pages only, so a database that was never VACUUMed is not penalized."""
+    page_count = db.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = db.execute("PRAGMA freelist_count").fetchone()[0]
+    page_size = db.execute("PRAGMA page_size").fetchone()[0]
+    return (page_count - free_pages) * page_size
+
+
+def sample_values(db):
+    """Самое частое слово, его лемма и самый большой текст - чтобы запросы до и после были одинаковыми."""
+    word, lemma = db.execute("""
+        SELECT wordform, lemma FROM wordforms
+        WHERE wordform = (SELECT wordform FROM wordforms GROUP BY wordform ORDER BY COUNT(*) DESC LIMIT 1)
+        LIMIT 1
+    """).fetchone() or ("", "")
+    file_id = db.execute("SELECT file_id FROM wordforms GROUP BY file_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    return word, lemma, file_id[0] if file_id else None
+
+
+def timing_queries(word, lemma, file_id):
+    # Прямые запросы к wordforms (таблица до миграции, представление после), а не запросы manager.py:
+    # тот ищет через FTS-индекс терминов и постраничные выборки, а статистику берёт из pos_stats.
+    # Замер показывает цену соединения словарных таблиц в представлении, а не задержки менеджера.
+    return {
+        "overall_pos_stats": ("""
+            SELECT pos, COUNT(*) as count FROM wordforms
+            WHERE pos IS NOT NULL AND pos != '' AND pos != 'space'
+            GROUP BY pos ORDER BY count DESC
+        """, ()),
+        "document_pos_stats": ("""
+            SELECT pos, COUNT(*) as count FROM wordforms
+            WHERE file_id = ? AND pos IS NOT NULL AND pos != '' AND pos != 'space'
+            GROUP BY pos ORDER BY count DESC
+        """, (file_id,)),
+        "find_by_wordform": ("""
+            SELECT wf.wordform_id, wf.wordform, wf.lemma, wf.morph, wf.pos, t.title
+            FROM wordforms wf JOIN texts t ON wf.file_id = t.file_id
+            WHERE wf.wordform = ? OR wf.lemma = ?
+            ORDER BY wf.wordform, wf.lemma LIMIT 500
+        """, (word, lemma)),
+        "wordform_details": ("SELECT wordform_id, wordform, lemma, morph, pos FROM wordforms WHERE wordform_id = ?",
+                             (1,)),
+    }
+
+
+def measure_queries(db, queries):
+    results = {}
+    for name, (sql, params) in queries.items():
+        durations = []
+        for _ in range(TIMING_RUNS):
+            start_time = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            durations.append(time.perf_counter() - start_time)
+        results[name] = statistics.median(durations)
+    return results
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    if not os.path.exists(path):
+        print(f"Ошибка: база {path} не найдена.")
+        return
+
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("PRAGMA foreign_keys = ON;")
+    if is_normalized(db.cursor()):
+        print(f"{path} уже в нормализованном виде.")
+        db.close()
+        return
+
+    queries = timing_queries(*sample_values(db))
+    size_before = database_size(db)
+    timings_before = measure_queries(db, queries)
+
+    if MAKE_BACKUP:
+        # analyze.py keeps the database in WAL mode, move everything into the main file first
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.close()
+        shutil.copyfile(path, path + ".bak")
+        print(f"Резервная копия: {path}.bak")
+        db = sqlite3.connect(path, isolation_level=None)
+        db.execute("PRAGMA foreign_keys = ON;")
+
+    print("Миграция...")
+    start_time = time.perf_counter()
+    cursor = db.cursor()
+    cursor.execute("BEGIN")
+    try:
+        migrate_to_normalized(cursor)
+        ensure_search_index(cursor)
+        ensure_pos_stats(cursor)
+        ensure_doc_versions(cursor)
+        cursor.execute("COMMIT")
+    except sqlite3.Error as e:
+        cursor.execute("ROLLBACK")
+        print(f"Ошибка миграции, база не изменена: {e}")
+        db.close()
+        return
+    print("VACUUM...")
+    cursor.execute("VACUUM")
+    cursor.execute("ANALYZE")
+    print(f"Миграция завершена за {time.perf_counter() - start_time:.1f} с.")
+
+    size_after = database_size(db)
+    timings_after = measure_queries(db, queries)
+    db.close()
+
+    print(f"\nРазмер базы: {size_before / 2 ** 20:.1f} MiB -> {size_after / 2 ** 20:.1f} MiB "
+          f"({size_after / size_before:.0%})")
+    print(f"{'Запрос':22} | {'до, мс':>9} | {'после, мс':>9}")
+    for name in queries:
+        print(f"{name:22} | {timings_before[name] * 1000:9.2f} | {timings_after[name] * 1000:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Materialized part-of-speech counts for the statistics tabs.
+
+pos_stats_by_doc holds (file_id, pos, count) and pos_stats_overall holds (pos, count). Triggers on
+the wordforms rows apply +1/-1 deltas on every insert, delete (including ON DELETE CASCADE from
+`texts`) and change of pos/file_id, so ingest, reanalysis, editing and deletion keep them current
+and reading the statistics costs O(number of POS tags).
+"""
+
+from dictionary_schema import is_normalized
+
+
+def _delta_statements(prefix, pos_sql, delta):
+    """Statements adding delta to both tables for the row referenced by prefix (new./old.); rows without a tag are skipped."""
+    statements = f"""
+        INSERT INTO pos_stats_by_doc(file_id, pos, count)
+            SELECT {prefix}file_id, {pos_sql}, {delta} WHERE {prefix}file_id IS NOT NULL AND {pos_sql} IS NOT NULL
+            ON CONFLICT(file_id, pos) DO UPDATE SET count = count + {delta};
+        INSERT INTO pos_stats_overall(pos, count)
+            SELECT {pos_sql}, {delta} WHERE {pos_sql} IS NOT NULL
+            ON CONFLICT(pos) DO UPDATE SET count = count + {delta};
+    """
+    if delta < 0:
+        statements += f"""
+        DELETE FROM pos_stats_by_doc WHERE file_id = {prefix}file_id AND pos = {pos_sql} AND count <= 0;
+        DELETE FROM pos_stats_overall WHERE pos = {pos_sql} AND count <= 0;
+    """
+    return statements
+
+
+def ensure_pos_stats(cursor):
+    """Creates the statistics tables and their triggers if missing, filling them from existing rows."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pos_stats_overall'")
+    already_exists = cursor.fetchone() is not None
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pos_stats_overall (
+        pos TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pos_stats_by_doc (
+        file_id INTEGER,
+        pos TEXT,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (file_id, pos)
+    ) WITHOUT ROWID
+    """)
+
+    if is_normalized(cursor):
+        # `wordforms` is a view: watch the base table and resolve the tag through its dictionary
+        table = "wordforms_data"
+        pos_column = "pos_id"
+        new_pos = "(SELECT pos FROM pos_tags WHERE pos_id = new.pos_id)"
+        old_pos = "(SELECT pos FROM pos_tags WHERE pos_id = old.pos_id)"
+    else:
+        table = "wordforms"
+        pos_column = "pos"
+        new_pos = "new.pos"
+        old_pos = "old.pos"
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_pos_stats_ai AFTER INSERT ON {table} BEGIN
+        {_delta_statements("new.", new_pos, 1)}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_pos_stats_ad AFTER DELETE ON {table} BEGIN
+        {_delta_statements("old.", old_pos, -1)}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_pos_stats_au AFTER UPDATE OF {pos_column}, file_id ON {table}
+    WHEN old.{pos_column} IS NOT new.{pos_column} OR old.file_id IS NOT new.file_id BEGIN
+        {_delta_statements("old.", old_pos, -1)}
+        {_delta_statements("new.", new_pos, 1)}
+    END
+    """)
+
+    if not already_exists:
+        print("Building POS statistics over existing wordforms...")
+        cursor.execute("""
+        INSERT INTO pos_stats_by_doc(file_id, pos, count)
+        SELECT file_id, pos, COUNT(*) FROM wordforms
+        WHERE file_id IS NOT NULL AND pos IS NOT NULL GROUP BY file_id, pos
+        """)
+        cursor.execute("""
+        INSERT INTO pos_stats_overall(pos, count)
+        SELECT pos, COUNT(*) FROM wordforms WHERE pos IS NOT NULL GROUP BY pos
+        """)
+        print("POS statistics built.")
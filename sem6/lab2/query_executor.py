@@ -0,0 +1,184 @@
+"""
+Runs database work of the manager off the Tk thread.
+
+Reads go to a small pool of threads, each with its own read-only connection; the database is in
+WAL mode, so they never wait for the writer. Writes (edits, imports, re-analysis) go to a single
+writer thread, one job after another, so transactions never interleave on the write connection.
+
+submit_read / submit_write return a concurrent.futures.Future. Callbacks are not run by the worker
+thread: finished futures are queued and poll(), rescheduled with root.after, runs on_done/on_error
+on the Tk thread, where widgets may be touched.
+
+A read submitted with a key supersedes the previous read with the same key: a queued one is
+cancelled, a running one is stopped with Connection.interrupt(), and neither reaches its callbacks.
+"""
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+READ_POOL_SIZE = 2
+POLL_INTERVAL = 50  # ms between deliveries of finished futures to the Tk thread
+
+
+class ReadConnection(sqlite3.Connection):
+    """Connection of a reader thread; search_key is the query whose terms its temp tables hold (see DBConnection)."""
+    search_key = None
+
+
+def open_read_connection(path):
+    """A reader connection as used by the pool (also by benchmark.py, to time the same queries)."""
+    # Autocommit: the inserts into temp search tables must not leave a transaction open, it would
+    # pin this reader to an old snapshot of the database
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, factory=ReadConnection, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+class QueryExecutor:
+
+    def __init__(self, root, path, read_pool_size=READ_POOL_SIZE):
+        self.root = root
+        self.path = path
+        self.read_tasks = queue.Queue()
+        self.write_tasks = queue.Queue()
+        self.finished = queue.Queue()  # (callback, args) to run on the Tk thread
+        self.lock = threading.Lock()
+        self.latest = {}  # key -> Future of the newest read with that key
+        self.running = {}  # Future -> ReadConnection executing it, for interrupt()
+        self.closed = False
+
+        self.threads = [threading.Thread(target=self.read_worker, name=f"db-read-{i}", daemon=True)
+                        for i in range(read_pool_size)]
+        self.threads.append(threading.Thread(target=self.write_worker, name="db-write", daemon=True))
+        for thread in self.threads:
+            thread.start()
+        self.root.after(POLL_INTERVAL, self.poll)
+
+    def submit_read(self, fn, *args, key=None, on_done=None, on_error=None, **kwargs):
+        """Runs fn(cursor, *args, **kwargs) on a read-only connection."""
+        future = Future()
+        with self.lock:
+            if key is not None:
+                previous = self.latest.get(key)
+                self.latest[key] = future
+                if previous is not None:
+                    self._cancel(previous)
+        self._deliver(future, key, on_done, on_error)
+        self.read_tasks.put((future, fn, args, kwargs))
+        return future
+
+    def submit_write(self, fn, *args, on_done=None, on_error=None, **kwargs):
+        """Runs fn(*args, **kwargs) on the writer thread, after every write submitted before it."""
+        future = Future()
+        self._deliver(future, None, on_done, on_error)
+        self.write_tasks.put((future, fn, args, kwargs))
+        return future
+
+    def cancel(self, key):
+        """Cancels the newest read submitted with key, queued or running."""
+        with self.lock:
+            future = self.latest.pop(key, None)
+            if future is not None:
+                self._cancel(future)
+
+    def call_in_ui(self, fn, *args):
+        """Runs fn(*args) on the Tk thread at the next poll, e.g. a messagebox from a worker."""
+        self.finished.put((fn, args))
+
+    def _cancel(self, future):
+        # Called with self.lock held
+        if not future.cancel():
+            connection = self.running.get(future)
+            if connection is not None:
+                connection.interrupt()
+
+    def _deliver(self, future, key, on_done, on_error):
+        def done(f):
+            if f.cancelled():
+                return
+            with self.lock:
+                if key is not None and self.latest.get(key) is not f:
+                    return  # Superseded while running: the result is for an old query
+                if key is not None:
+                    del self.latest[key]
+            error = f.exception()
+            if error is None:
+                if on_done is not None:
+                    self.finished.put((on_done, (f.result(),)))
+            elif on_error is not None:
+                self.finished.put((on_error, (error,)))
+            else:
+                print(f"Background database task failed: {error!r}")
+
+        future.add_done_callback(done)
+
+    def read_worker(self):
+        connection = open_read_connection(self.path)
+        cursor = connection.cursor()
+        try:
+            while True:
+                task = self.read_tasks.get()
+                if task is None:
+                    return
+                future, fn, args, kwargs = task
+                with self.lock:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    self.running[future] = connection
+                try:
+                    result = fn(cursor, *args, **kwargs)
+                except BaseException as e:
+                    result, error = None, e
+                else:
+                    error = None
+                with self.lock:
+                    del self.running[future]
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+        finally:
+            connection.close()
+
+    def write_worker(self):
+        while True:
+            task = self.write_tasks.get()
+            if task is None:
+                return
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def poll(self):
+        while True:
+            try:
+                callback, args = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                print(f"Error in database task callback: {e}")
+        if not self.closed:
+            self.root.after(POLL_INTERVAL, self.poll)
+
+    def shutdown(self, timeout=5.0):
+        """Interrupts pending reads, lets all queued writes finish and stops the threads."""
+        self.closed = True
+        with self.lock:
+            for future in list(self.latest.values()):
+                self._cancel(future)
+            self.latest.clear()
+        for _ in range(len(self.threads) - 1):
+            self.read_tasks.put(None)
+        self.write_tasks.put(None)
+        for thread in self.threads[:-1]:
+            thread.join(timeout)
+        self.threads[-1].join()  # The writer may be in the middle of a transaction
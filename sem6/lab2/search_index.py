@@ -0,0 +1,224 @@
+"""
+Full-text index over the distinct wordforms and lemmas of the corpus.
+
+Every wordform and lemma stored in `wordforms` is interned into `search_terms` by triggers,
+and `search_terms_fts` is an FTS5 trigram index over those terms. A search first resolves the
+query to the matching terms (a small table), then fetches wordform rows through the
+idx_wordforms_wordform / idx_wordforms_lemma indexes instead of scanning `wordforms` with LIKE.
+
+Results are paged by the key (wordform, wordform_id). `wordform_lemmas` holds the distinct
+(wordform, lemma) pairs, so the wordforms of the matching lemmas are known up front and a page
+is read in index order from idx_wordforms_wordform instead of sorting every matching row.
+"""
+
+from dictionary_schema import is_normalized
+
+SEARCH_MODES = ("exact", "prefix", "substring")
+DEFAULT_SEARCH_MODE = "substring"
+SEARCH_PAGE_SIZE = 200
+
+# Rows of `wordforms wf` matching the collected terms, in page order
+MATCH_CLAUSE = """wf.wordform IN (SELECT wordform FROM temp.search_wordforms)
+    AND (wf.wordform IN (SELECT term FROM temp.search_matches)
+         OR wf.lemma IN (SELECT term FROM temp.search_matches))"""
+
+
+def ensure_search_index(cursor):
+    """Creates the term tables, the FTS5 index and the sync triggers if missing, backfilling existing rows."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_terms'")
+    already_exists = cursor.fetchone() is not None
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS search_terms (
+        term_id INTEGER PRIMARY KEY,
+        term TEXT UNIQUE NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_terms_fts
+    USING fts5(term, content='search_terms', content_rowid='term_id', tokenize='trigram')
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS search_terms_ai AFTER INSERT ON search_terms BEGIN
+        INSERT INTO search_terms_fts(rowid, term) VALUES (new.term_id, new.term);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS search_terms_ad AFTER DELETE ON search_terms BEGIN
+        INSERT INTO search_terms_fts(search_terms_fts, rowid, term) VALUES ('delete', old.term_id, old.term);
+    END
+    """)
+    # Terms are only ever added: a term left behind by a deleted wordform simply matches no rows
+    if is_normalized(cursor):
+        # `wordforms` is a view: watch the base table and resolve the lemma through its dictionary
+        lemma = "(SELECT lemma FROM lemmas WHERE lemma_id = new.lemma_id)"
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS wordforms_data_terms_ai AFTER INSERT ON wordforms_data BEGIN
+            INSERT OR IGNORE INTO search_terms(term) VALUES (new.wordform), ({lemma});
+        END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS wordforms_data_terms_au AFTER UPDATE OF wordform, lemma_id ON wordforms_data BEGIN
+            INSERT OR IGNORE INTO search_terms(term) VALUES (new.wordform), ({lemma});
+        END
+        """)
+    else:
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS wordforms_terms_ai AFTER INSERT ON wordforms BEGIN
+            INSERT OR IGNORE INTO search_terms(term) VALUES (new.wordform), (new.lemma);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS wordforms_terms_au AFTER UPDATE OF wordform, lemma ON wordforms BEGIN
+            INSERT OR IGNORE INTO search_terms(term) VALUES (new.wordform), (new.lemma);
+        END
+        """)
+
+    if not already_exists:
+        print("Building search index over existing wordforms...")
+        cursor.execute("""
+        INSERT OR IGNORE INTO search_terms(term)
+        SELECT wordform FROM wordforms WHERE wordform IS NOT NULL
+        UNION
+        SELECT lemma FROM wordforms WHERE lemma IS NOT NULL
+        """)
+        print("Search index built.")
+
+    ensure_wordform_lemmas(cursor)
+
+
+def ensure_wordform_lemmas(cursor):
+    """The distinct (wordform, lemma) pairs, kept by triggers like search_terms and never shrunk."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'wordform_lemmas'")
+    already_exists = cursor.fetchone() is not None
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS wordform_lemmas (
+        wordform TEXT NOT NULL,
+        lemma TEXT NOT NULL,
+        PRIMARY KEY (wordform, lemma)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_wordform_lemmas_lemma ON wordform_lemmas(lemma)")
+
+    if is_normalized(cursor):
+        table, lemma = "wordforms_data", "(SELECT lemma FROM lemmas WHERE lemma_id = new.lemma_id)"
+        columns = "wordform, lemma_id"
+    else:
+        table, lemma = "wordforms", "new.lemma"
+        columns = "wordform, lemma"
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_pairs_ai AFTER INSERT ON {table} BEGIN
+        INSERT OR IGNORE INTO wordform_lemmas(wordform, lemma) VALUES (new.wordform, {lemma});
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_pairs_au AFTER UPDATE OF {columns} ON {table} BEGIN
+        INSERT OR IGNORE INTO wordform_lemmas(wordform, lemma) VALUES (new.wordform, {lemma});
+    END
+    """)
+
+    if not already_exists:
+        print("Building wordform/lemma pairs over existing wordforms...")
+        cursor.execute("""
+        INSERT OR IGNORE INTO wordform_lemmas(wordform, lemma)
+        SELECT DISTINCT wordform, lemma FROM wordforms WHERE wordform IS NOT NULL AND lemma IS NOT NULL
+        """)
+        print("Wordform/lemma pairs built.")
+
+
+def _terms_query(query, mode):
+    """
+    SQL and parameters selecting the prefix/substring matches from search_terms_fts. The LIKE must
+    not carry an ESCAPE clause, FTS5 only hands plain LIKE patterns to the trigram index. A % or _
+    in the query therefore stays a wildcard in the pattern, which only widens the match, and the
+    exact comparison afterwards drops the extra terms.
+    """
+    pattern = query + "%" if mode == "prefix" else "%" + query + "%"
+    sql = "SELECT term FROM search_terms_fts WHERE term LIKE ?"
+    params = (pattern,)
+    if "%" in query or "_" in query:
+        # LIKE is case-insensitive for ASCII, so compare in lower case as well
+        if mode == "prefix":
+            sql += " AND substr(lower(term), 1, ?) = ?"
+            params += (len(query), query.lower())
+        else:
+            sql += " AND instr(lower(term), ?) > 0"
+            params += (query.lower(),)
+    return sql, params
+
+
+def terms_query_plan(cursor, query, mode):
+    """EXPLAIN QUERY PLAN details of the term lookup; 'INDEX 0:L' in them means the trigram index is used."""
+    sql, params = _terms_query(query, mode)
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def collect_matching_terms(cursor, query, mode=DEFAULT_SEARCH_MODE):
+    """
+    Fills temp.search_matches with the terms matching the query:
+        exact     - the query itself
+        prefix    - terms starting with the query
+        substring - terms containing the query (same as the old LIKE '%query%')
+    Patterns of 3+ characters are answered by the trigram index, shorter ones scan the term list only.
+    Also fills temp.search_wordforms with every wordform a matching row can have, for MATCH_CLAUSE.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of: {', '.join(SEARCH_MODES)}")
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS search_matches (term TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.search_matches")
+
+    if mode == "exact":
+        cursor.execute("INSERT INTO temp.search_matches(term) VALUES (?)", (query,))
+    else:
+        sql, params = _terms_query(query, mode)
+        cursor.execute(f"INSERT OR IGNORE INTO temp.search_matches(term) {sql}", params)
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS search_wordforms (wordform TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.search_wordforms")
+    cursor.execute("""
+        INSERT OR IGNORE INTO temp.search_wordforms(wordform)
+        SELECT term FROM temp.search_matches
+        UNION
+        SELECT wordform FROM wordform_lemmas WHERE lemma IN (SELECT term FROM temp.search_matches)
+    """)
+
+
+def fetch_search_page(cursor, after=None, page_size=SEARCH_PAGE_SIZE):
+    """
+    Returns the next page of rows matching the collected terms, ordered by (wordform, wordform_id)
+    and starting after the key `after` (None for the first page). The key is split into the rest of
+    the current wordform and the wordforms after it, so both parts are index range scans and each
+    page costs the same however many rows match in total.
+    """
+    select = """
+        SELECT wf.wordform_id, wf.wordform, wf.lemma, wf.morph, wf.pos,
+               ts.title, ts.country, ts.date, ts.file_id
+        FROM wordforms wf
+        JOIN texts ts ON wf.file_id = ts.file_id
+    """
+    rows = []
+    if after:
+        cursor.execute(f"""{select}
+            WHERE wf.wordform = ? AND wf.wordform_id > ? AND ({MATCH_CLAUSE})
+            ORDER BY wf.wordform_id
+            LIMIT ?
+        """, (*after, page_size))
+        rows = cursor.fetchall()
+        if len(rows) == page_size:
+            return rows
+
+    keyset = "AND wf.wordform > ?" if after else ""
+    cursor.execute(f"""{select}
+        WHERE {MATCH_CLAUSE} {keyset}
+        ORDER BY wf.wordform, wf.wordform_id
+        LIMIT ?
+    """, (*after[:1], page_size - len(rows)) if after else (page_size,))
+    return rows + cursor.fetchall()
+
+
+def count_matches(cursor):
+    cursor.execute(f"SELECT count(*) FROM wordforms wf WHERE {MATCH_CLAUSE}")
+    return cursor.fetchone()[0]
@@ -0,0 +1,60 @@
+"""
+Reading the corpus written by generate.py.
+
+sources.jsonl holds one JSON object per text, so it is read one line at a time and memory does not
+grow with the corpus. While generate.py is still running, a sidecar file sources.jsonl.writing exists
+next to it; with follow=True the reader tails sources.jsonl and stops once the sidecar is gone and the
+end of the file is reached, so ingestion can start before generation finishes. The file being read is
+never renamed or deleted: on Windows that fails while another process has it open.
+The old single-object sources.json is still accepted, but is loaded whole.
+"""
+import json
+import os
+import time
+
+WRITING_SUFFIX = ".writing"  # sidecar that exists while generate.py writes the file
+FOLLOW_POLL_INTERVAL = 1.0  # seconds between checks for new lines in follow mode
+
+
+def sources_exist(path):
+    return os.path.exists(path) or os.path.exists(path + WRITING_SUFFIX)
+
+
+def sources_complete(path):
+    return os.path.exists(path) and not os.path.exists(path + WRITING_SUFFIX)
+
+
+def iter_sources(path, follow=False, poll_interval=FOLLOW_POLL_INTERVAL):
+    """Yields source dicts one by one. Raises FileNotFoundError / json.JSONDecodeError like json.load did."""
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as file:
+            yield from json.load(file).values()
+        return
+
+    writing_path = path + WRITING_SUFFIX
+    while follow and not os.path.exists(path):
+        time.sleep(poll_interval)
+
+    with open(path, encoding="utf-8") as file:
+        pending = ""
+        writer_done = not follow
+        while True:
+            line = file.readline()
+            if line.endswith("\n"):
+                line, pending = pending + line, ""
+                if line.strip():
+                    yield json.loads(line)
+                continue
+
+            # End of file: either a complete file without a trailing newline, or the writer is mid-line
+            pending += line
+            if not writer_done:
+                if os.path.exists(writing_path):
+                    time.sleep(poll_interval)
+                else:
+                    # generate.py removed the sidecar, so everything is written: read to the end once more
+                    writer_done = True
+                continue
+            if pending.strip():
+                yield json.loads(pending)
+            return
@@ -0,0 +1,157 @@
+"""
+Compressed storage for the full texts.
+
+The screenplay texts make up most of movies.db, and every page holding a piece of them competes
+with the index pages for the page cache. In the compressed layout `texts.text` is NULL and each text
+is kept compressed in `text_blobs`, a separate table that metadata queries never read. A text is
+decompressed only when it is needed (concordance examples, the editor, re-analysis), and the last
+TEXT_CACHE_SIZE decompressed texts are kept in an LRU shared by all threads of the process.
+
+Databases without `text_blobs` keep the plain layout; read_text / write_text / write_texts work for both.
+"""
+import lzma
+import threading
+import zlib
+from collections import OrderedDict
+
+CODECS = ("zlib", "lzma")
+DEFAULT_CODEC = "zlib"      # lzma is ~20% smaller but several times slower to decompress
+ZLIB_LEVEL = 6
+TEXT_CACHE_SIZE = 16        # Decompressed texts kept in memory
+
+INSERT_TEXT_BLOB_SQL = """
+    INSERT OR REPLACE INTO text_blobs (file_id, codec, size, checksum, data) VALUES (?, ?, ?, ?, ?)
+"""
+
+
+class TextCache:
+    """Thread-safe LRU of decompressed texts, keyed by (file_id, checksum, size) so a changed text is never served."""
+
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            text = self.items.get(key)
+            if text is not None:
+                self.items.move_to_end(key)
+            return text
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def put(self, key, text):
+        with self.lock:
+            self.items[key] = text
+            self.items.move_to_end(key)
+            while len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+
+
+TEXT_CACHE = TextCache()
+
+
+def is_compressed(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'text_blobs'")
+    return cursor.fetchone() is not None
+
+
+def create_text_blobs(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS text_blobs (
+        file_id INTEGER PRIMARY KEY,
+        codec TEXT NOT NULL,
+        size INTEGER NOT NULL,      -- length of the text in characters
+        checksum INTEGER NOT NULL,  -- crc32 of the UTF-8 text, part of the cache key
+        data BLOB NOT NULL,
+        FOREIGN KEY (file_id) REFERENCES texts(file_id) ON DELETE CASCADE
+    )
+    """)
+
+
+def compress_text(text, codec=DEFAULT_CODEC):
+    """Returns (codec, size, checksum, data) for INSERT_TEXT_BLOB_SQL without the file_id."""
+    raw = text.encode("utf-8")
+    if codec == "zlib":
+        data = zlib.compress(raw, ZLIB_LEVEL)
+    elif codec == "lzma":
+        data = lzma.compress(raw)
+    else:
+        raise ValueError(f"Unknown codec '{codec}', expected one of: {', '.join(CODECS)}")
+    return codec, len(text), zlib.crc32(raw), data
+
+
+def decompress_text(codec, data):
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec == "lzma":
+        return lzma.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown codec '{codec}' in text_blobs")
+
+
+def read_text(cursor, file_id):
+    """The full text of file_id, or None if there is none."""
+    if not is_compressed(cursor):
+        cursor.execute("SELECT text FROM texts WHERE file_id = ?", (file_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    cursor.execute("SELECT size, checksum FROM text_blobs WHERE file_id = ?", (file_id,))
+    row = cursor.fetchone()
+    if row is None:
+        # Not moved yet (written by something unaware of the layout)
+        cursor.execute("SELECT text FROM texts WHERE file_id = ?", (file_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    key = (file_id, row[1], row[0])
+    text = TEXT_CACHE.get(key)
+    if text is None:
+        cursor.execute("SELECT codec, data FROM text_blobs WHERE file_id = ?", (file_id,))
+        codec, data = cursor.fetchone()
+        text = decompress_text(codec, data)
+        TEXT_CACHE.put(key, text)
+    return text
+
+
+def write_text(cursor, file_id, text, codec=DEFAULT_CODEC):
+    """Replaces the text of an existing texts row."""
+    if not is_compressed(cursor):
+        cursor.execute("UPDATE texts SET text = ? WHERE file_id = ?", (text, file_id))
+        return
+    cursor.execute("UPDATE texts SET text = NULL WHERE file_id = ?", (file_id,))
+    if text is None:
+        cursor.execute("DELETE FROM text_blobs WHERE file_id = ?", (file_id,))
+    else:
+        cursor.execute(INSERT_TEXT_BLOB_SQL, (file_id, *compress_text(text, codec)))
+
+
+def write_texts(cursor, insert_sql, rows, codec=DEFAULT_CODEC):
+    """
+    executemany of insert_sql for texts rows whose last value is the text. In the compressed
+    layout the rows are inserted with a NULL text and the texts go to text_blobs.
+    """
+    if not is_compressed(cursor):
+        cursor.executemany(insert_sql, rows)
+        return
+    cursor.executemany(insert_sql, [(*row[:-1], None) for row in rows])
+    cursor.executemany(INSERT_TEXT_BLOB_SQL, [(row[0], *compress_text(row[-1], codec))
+                                              for row in rows if row[-1] is not None])
+
+
+def migrate_to_compressed(cursor, codec=DEFAULT_CODEC):
+    """
+    Moves every texts.text into text_blobs. Must run inside a transaction; the caller commits
+    and VACUUMs afterwards, otherwise the freed pages stay in the file.
+    """
+    if is_compressed(cursor):
+        return False
+    create_text_blobs(cursor)
+    select = cursor.connection.execute("SELECT file_id, text FROM texts WHERE text IS NOT NULL")
+    for file_id, text in select:
+        cursor.execute(INSERT_TEXT_BLOB_SQL, (file_id, *compress_text(text, codec)))
+    cursor.execute("UPDATE texts SET text = NULL WHERE text IS NOT NULL")
+    return True